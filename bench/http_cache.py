@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Benchmark the per-request overhead of the HTTP cache backends.
+
+Usage:
+    python bench/http_cache.py [-n REQUESTS] [-k OBJECTS] [-s SIZE]
+
+A local stand-in server answers GetObject with an ETag (and a 304 for a
+matching If-None-Match), so the numbers are client-side overhead: signing,
+httplib2 and the cache's get/set ("in-cache" is the time spent in the
+latter, per request). Backends compared: httplib2's unbounded
+FileCache (the previous default), "none", "memory" and "disk".
+"""
+
+import sys
+import os
+from os.path import join, dirname, abspath
+import time
+import shutil
+import tempfile
+import hashlib
+import threading
+import optparse
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import manta
+from manta.auth import Signer
+import httplib2
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+
+#---- stand-in server
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1   # one write per response, else Nagle adds ~40ms
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.body
+        etag = '"%s"' % hashlib.md5(self.path.encode('utf-8')).hexdigest()
+        if self.headers.get("if-none-match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class NoopSigner(Signer):
+    """Keep RSA signing out of the numbers."""
+    def sign(self, s):
+        return ("rsa-sha256", "00:00", "c2lnbmF0dXJl")
+
+
+
+class TimedCache(object):
+    """Wrap a cache to measure the time spent in it."""
+    def __init__(self, cache):
+        self.cache = cache
+        self.elapsed = 0.0
+
+    def _timed(self, method, *args):
+        start = time.time()
+        try:
+            return method(*args)
+        finally:
+            self.elapsed += time.time() - start
+
+    def get(self, key):
+        return self._timed(self.cache.get, key)
+
+    def set(self, key, value):
+        return self._timed(self.cache.set, key, value)
+
+    def delete(self, key):
+        return self._timed(self.cache.delete, key)
+
+
+
+#---- mainline
+
+def make_cache(name, cache_dir):
+    if name == "filecache":
+        return TimedCache(httplib2.FileCache(cache_dir))
+    elif name == "memory":
+        return TimedCache(manta.MemoryCache())
+    elif name == "disk":
+        return TimedCache(manta.DiskCache(cache_dir))
+    return "none"
+
+def bench(url, cache, cache_dir, n, k):
+    client = manta.MantaClient(url, "bench", NoopSigner(),
+        cache_dir=cache_dir, http_cache=cache)
+    times = []
+    for i in range(n):
+        start = time.time()
+        client.get_object("/bench/stor/obj%d" % (i % k))
+        times.append(time.time() - start)
+    times.sort()
+    return (sum(times) / n, times[n // 2], times[int(n * 0.99)])
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [OPTIONS]")
+    parser.add_option("-n", dest="n", type="int", default=2000,
+        help="number of requests per backend (default 2000)")
+    parser.add_option("-k", dest="k", type="int", default=200,
+        help="number of distinct objects (default 200)")
+    parser.add_option("-s", dest="size", type="int", default=4096,
+        help="object size in bytes (default 4096)")
+    opts, args = parser.parse_args(argv[1:])
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.body = b"x" * opts.size
+    t = threading.Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    url = "http://127.0.0.1:%d" % server.server_address[1]
+
+    print("%d GETs over %d objects of %d bytes"
+        % (opts.n, opts.k, opts.size))
+    print("%-10s %10s %10s %10s %12s %8s" % ("cache", "mean(us)",
+        "p50(us)", "p99(us)", "in-cache(us)", "files"))
+    for name in ("filecache", "none", "memory", "disk"):
+        cache_dir = tempfile.mkdtemp(prefix="bench-http-cache-")
+        try:
+            cache = make_cache(name, cache_dir)
+            mean, p50, p99 = bench(url, cache, cache_dir, opts.n, opts.k)
+            in_cache = getattr(cache, "elapsed", 0.0) / opts.n
+            nfiles = sum(len(files) for _, _, files in os.walk(cache_dir))
+        finally:
+            shutil.rmtree(cache_dir)
+        print("%-10s %10.1f %10.1f %10.1f %12.1f %8d" % (name, mean * 1e6,
+            p50 * 1e6, p99 * 1e6, in_cache * 1e6, nfiles))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
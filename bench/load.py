@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""A throughput load generator for Manta, using `manta.MantaClient`.
+
+Usage:
+    python bench/load.py [OPTIONS]                 # against $MANTA_URL
+    python bench/load.py --fake [OPTIONS]          # against a local server
+
+Runs a mix of operations from concurrent workers, for a duration or a
+number of operations, then reports ops/s, MB/s and latency percentiles per
+operation. Examples:
+
+    # 32 workers, 60s, mostly small reads
+    python bench/load.py -c 32 -d 60 --mix get=80,put=15,delete=5 -s 4K
+
+    # uploads with a size distribution: 70% 4K, 25% 1M, 5% 16M
+    python bench/load.py -c 8 -n 1000 --mix put=1 -s 4K:70,1M:25,16M:5
+
+Operations:
+    put     PutObject of a new object (of a size from '-s')
+    get     GetObject of an object created by this run
+    head    HeadObject of an object created by this run
+    list    ListDirectory of the run's dir (one page)
+    delete  DeleteObject of an object created by this run
+A get/head/delete with no objects yet to work on is done as a put.
+
+Objects go in a "manta-load-*" dir under /ACCOUNT/stor, which is removed
+at the end (unless '--keep'). The HTTP cache is off so every GET goes to
+the server.
+"""
+
+import sys
+import os
+from os.path import dirname, abspath
+import re
+import time
+import json
+import random
+import threading
+import optparse
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import manta
+from manta.auth import Signer
+
+
+
+#---- globals
+
+OPS = ("put", "get", "head", "list", "delete")
+UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+
+#---- support
+
+class NoopSigner(Signer):
+    """For a local stand-in server that doesn't check signatures."""
+    def sign(self, s):
+        return ("rsa-sha256", "00:00", "c2lnbmF0dXJl")
+
+def parse_size(s):
+    match = re.match(r'^(\d+(?:\.\d+)?)([BKMG]?)$', s.strip().upper())
+    if not match:
+        raise ValueError("invalid size: %r" % s)
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+def parse_weights(s, parse_key=str):
+    """Parse 'KEY:WEIGHT,...' (or 'KEY=WEIGHT,...') into a list of
+    (key, weight). A missing weight is 1.
+    """
+    weights = []
+    for item in s.split(","):
+        key, _, weight = item.replace("=", ":").partition(":")
+        weights.append((parse_key(key), float(weight or 1)))
+    return weights
+
+class SizeDist(object):
+    """An object size distribution, from a spec:
+        4K              fixed
+        1K-1M           log-uniform between the bounds
+        4K:70,1M:30     weighted choice
+    """
+    def __init__(self, spec):
+        self.spec = spec
+        self.range = None
+        self.choices = None
+        if "-" in spec:
+            lo, hi = spec.split("-", 1)
+            self.range = (parse_size(lo), parse_size(hi))
+            self.max = self.range[1]
+        else:
+            self.choices = WeightedChoice(parse_weights(spec, parse_size))
+            self.max = max(size for size, _ in self.choices.items)
+
+    def sample(self, rng):
+        if self.range:
+            lo, hi = self.range
+            return int(round(lo * (float(hi) / max(lo, 1)) ** rng.random()))
+        return self.choices.sample(rng)
+
+class WeightedChoice(object):
+    def __init__(self, items):
+        self.items = items
+        self.total = sum(weight for _, weight in items)
+
+    def sample(self, rng):
+        x = rng.random() * self.total
+        for item, weight in self.items:
+            x -= weight
+            if x < 0:
+                return item
+        return self.items[-1][0]
+
+class Stats(object):
+    """Latencies and byte counts, per operation."""
+    def __init__(self):
+        self.latencies = dict((op, []) for op in OPS)
+        self.bytes = dict((op, 0) for op in OPS)
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, op, latency, nbytes):
+        self.lock.acquire()
+        try:
+            self.latencies[op].append(latency)
+            self.bytes[op] += nbytes
+        finally:
+            self.lock.release()
+
+    def error(self, op, ex):
+        key = "%s: %s" % (op, getattr(ex, "code", None)
+            or ex.__class__.__name__)
+        self.lock.acquire()
+        try:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        finally:
+            self.lock.release()
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1,
+        int(len(sorted_values) * p / 100.0))]
+
+
+
+#---- the load
+
+class Load(object):
+    def __init__(self, client, mdir, mix, sizes, stats, seed=None):
+        self.client = client
+        self.mdir = mdir
+        self.mix = mix
+        self.sizes = sizes
+        self.stats = stats
+        self.objects = []       # (mpath, size) of objects that exist
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.seed = seed
+        self.payload = os.urandom(sizes.max)
+
+    def _take(self, rng, remove=False):
+        self.lock.acquire()
+        try:
+            if not self.objects:
+                return None
+            i = rng.randrange(len(self.objects))
+            if remove:
+                self.objects[i], self.objects[-1] = \
+                    self.objects[-1], self.objects[i]
+                return self.objects.pop()
+            return self.objects[i]
+        finally:
+            self.lock.release()
+
+    def do_op(self, op, rng):
+        client = self.client
+        target = None
+        if op in ("get", "head", "delete"):
+            target = self._take(rng, remove=(op == "delete"))
+            if target is None:
+                op = "put"
+        start = time.time()
+        try:
+            if op == "put":
+                size = self.sizes.sample(rng)
+                self.lock.acquire()
+                try:
+                    self.counter += 1
+                    mpath = "%s/o%08d" % (self.mdir, self.counter)
+                finally:
+                    self.lock.release()
+                offset = rng.randrange(self.sizes.max - size + 1)
+                client.put_object(mpath,
+                    content=self.payload[offset:offset+size])
+                nbytes = size
+                self.lock.acquire()
+                try:
+                    self.objects.append((mpath, size))
+                finally:
+                    self.lock.release()
+            elif op == "get":
+                nbytes = len(client.get_object(target[0]))
+            elif op == "head":
+                client.head_object(target[0])
+                nbytes = 0
+            elif op == "list":
+                nbytes = len(client.list_directory(self.mdir))
+            elif op == "delete":
+                client.delete_object(target[0])
+                nbytes = 0
+        except Exception:
+            _, ex, _ = sys.exc_info()
+            self.stats.error(op, ex)
+            if op == "delete":
+                self.lock.acquire()
+                try:
+                    self.objects.append(target)
+                finally:
+                    self.lock.release()
+            return
+        self.stats.record(op, time.time() - start, nbytes)
+
+    def worker(self, idx, deadline, ops_left):
+        rng = random.Random(self.seed is not None and self.seed + idx or None)
+        while time.time() < deadline:
+            if ops_left is not None:
+                self.lock.acquire()
+                try:
+                    if ops_left[0] <= 0:
+                        return
+                    ops_left[0] -= 1
+                finally:
+                    self.lock.release()
+            self.do_op(self.mix.sample(rng), rng)
+
+    def run(self, concurrency, duration=None, nops=None):
+        deadline = time.time() + (duration or 1e9)
+        ops_left = nops is not None and [nops] or None
+        threads = []
+        for i in range(concurrency):
+            t = threading.Thread(target=self.worker,
+                args=(i, deadline, ops_left))
+            t.daemon = True
+            threads.append(t)
+        start = time.time()
+        for t in threads:
+            t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(0.1)
+        except KeyboardInterrupt:
+            pass   # report what we have
+        return time.time() - start
+
+    def cleanup(self, concurrency):
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(concurrency)
+        try:
+            pool.map(lambda o: self.client.delete_object(o[0]), self.objects)
+        finally:
+            pool.close()
+        self.client.delete_directory(self.mdir)
+
+
+
+#---- mainline
+
+def report(stats, elapsed, concurrency):
+    print("%-7s %8s %9s %9s %9s %9s %9s %9s %9s" % ("op", "count",
+        "ops/s", "MB/s", "p50(ms)", "p90(ms)", "p99(ms)", "max(ms)",
+        "mean(ms)"))
+    result = {"elapsed": elapsed, "concurrency": concurrency, "ops": {},
+        "errors": stats.errors}
+    all_latencies = []
+    total_bytes = 0
+    for op in OPS + ("all",):
+        if op == "all":
+            latencies = sorted(all_latencies)
+            nbytes = total_bytes
+        else:
+            latencies = sorted(stats.latencies[op])
+            nbytes = stats.bytes[op]
+            all_latencies += latencies
+            total_bytes += nbytes
+        if not latencies:
+            continue
+        r = {
+            "count": len(latencies),
+            "ops_per_sec": len(latencies) / elapsed,
+            "mb_per_sec": nbytes / elapsed / 1024 / 1024,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1],
+            "mean": sum(latencies) / len(latencies),
+        }
+        result["ops"][op] = r
+        print("%-7s %8d %9.1f %9.2f %9.1f %9.1f %9.1f %9.1f %9.1f" % (op,
+            r["count"], r["ops_per_sec"], r["mb_per_sec"], r["p50"] * 1e3,
+            r["p90"] * 1e3, r["p99"] * 1e3, r["max"] * 1e3,
+            r["mean"] * 1e3))
+    for key, count in sorted(stats.errors.items()):
+        print("error: %s (%d)" % (key, count))
+    return result
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [OPTIONS]",
+        description="Run a load of Manta operations and report throughput "
+            "and latencies.")
+    parser.add_option("-u", "--url", default=os.environ.get("MANTA_URL"),
+        help="Manta URL (default $MANTA_URL)")
+    parser.add_option("-a", "--account", default=os.environ.get("MANTA_USER"),
+        help="Manta account (default $MANTA_USER)")
+    parser.add_option("-k", "--keyId", dest="key_id",
+        default=os.environ.get("MANTA_KEY_ID"),
+        help="SSH key fingerprint or private key path (default "
+            "$MANTA_KEY_ID)")
+    parser.add_option("-i", "--insecure", action="store_true",
+        help="don't validate the server's TLS certificate")
+    parser.add_option("--fake", action="store_true",
+        help="run against a local stand-in server (manta.fakemanta)")
+    parser.add_option("--latency", type="float", default=0.0,
+        metavar="SECONDS",
+        help="with '--fake', the server's per-request delay")
+    parser.add_option("-c", "--concurrency", type="int", default=8,
+        help="number of concurrent workers (default 8)")
+    parser.add_option("-d", "--duration", type="float", metavar="SECONDS",
+        help="how long to run (default 10s, unless '-n')")
+    parser.add_option("-n", "--ops", type="int", metavar="N",
+        help="stop after N operations")
+    parser.add_option("-m", "--mix", default="put=20,get=50,head=15,list=5,"
+        "delete=10", help="operation weights (default %default)")
+    parser.add_option("-s", "--size", default="4K",
+        help="object sizes: fixed (4K), log-uniform range (1K-1M) or "
+            "weighted (4K:70,1M:30) (default %default)")
+    parser.add_option("--seed", type="int", help="random seed")
+    parser.add_option("--keep", action="store_true",
+        help="don't delete the objects created")
+    parser.add_option("--json", dest="json_path", metavar="FILE",
+        help="also write the results as JSON to FILE")
+    opts, args = parser.parse_args(argv[1:])
+
+    mix = WeightedChoice(parse_weights(opts.mix))
+    for op, _ in mix.items:
+        if op not in OPS:
+            parser.error("unknown operation in '--mix': %r" % op)
+    sizes = SizeDist(opts.size)
+    if opts.duration is None and opts.ops is None:
+        opts.duration = 10.0
+
+    server = None
+    if opts.fake:
+        from manta.fakemanta import FakeManta
+        server = FakeManta(latency=opts.latency)
+        server.start()
+        url, account, signer = server.url, opts.account or "load", \
+            NoopSigner()
+    else:
+        if not (opts.url and opts.account and opts.key_id):
+            parser.error("need a Manta URL, account and key ID (or '--fake')")
+        url, account = opts.url, opts.account
+        signer = manta.CLISigner(opts.key_id)
+    client = manta.MantaClient(url, account, signer, http_cache="none",
+        disable_ssl_certificate_validation=opts.insecure)
+
+    mdir = "/%s/stor/manta-load-%d-%d" % (account, time.time(), os.getpid())
+    client.mkdirp(mdir)
+    stats = Stats()
+    load = Load(client, mdir, mix, sizes, stats, seed=opts.seed)
+    print("%s: %d workers, %s, mix %s, sizes %s" % (url, opts.concurrency,
+        opts.ops and "%d ops" % opts.ops or "%gs" % opts.duration,
+        opts.mix, opts.size))
+    try:
+        elapsed = load.run(opts.concurrency, opts.duration, opts.ops)
+        result = report(stats, elapsed, opts.concurrency)
+        result.update(url=url, mix=opts.mix, size=opts.size)
+        if opts.json_path:
+            f = open(opts.json_path, "w")
+            try:
+                json.dump(result, f, indent=2, sort_keys=True)
+            finally:
+                f.close()
+    finally:
+        if not opts.keep:
+            load.cleanup(opts.concurrency)
+        if server is not None:
+            server.stop()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""CPU microbenchmarks of client hot paths. No network is used.
+
+Usage:
+    python bench/micro.py [-r REPEAT] [-o RESULTS.json] [-c BASELINE.json]
+                          [BENCHMARK-SUBSTRING ...]
+
+Benchmarks:
+    list_directory2     parsing of a 1000-entry listing (plain and gzip),
+                        via `list_directory2` over a canned response
+    sign                `CLISigner.sign` with a 2048-bit RSA key file
+    http_date           `manta.client.http_date()`
+    put_object md5      `put_object` Content-MD5 (4K and 1M), canned response
+    get_object2 md5     `get_object2` Content-MD5 check (4K and 1M)
+    _ls_path glob       `Mantash._ls_path` glob over a 20x200 entry tree
+    cmdln help          mantash 'help' (command table) and 'help ls'
+
+Each benchmark is run REPEAT times, each run timing enough iterations to
+take ~0.2s, and the best per-iteration time is reported. Save results with
+'-o' (they include the git commit) and compare a later run against them
+with '-c':
+
+    python bench/micro.py -o /tmp/before.json
+    ... change ...
+    python bench/micro.py -c /tmp/before.json
+"""
+
+import sys
+import os
+from os.path import join, dirname, abspath
+import time
+import json
+import gzip
+import shutil
+import tempfile
+import datetime
+import platform
+import subprocess
+import optparse
+from io import BytesIO
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+TOP = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, TOP)
+import manta
+from manta.auth import Signer
+from manta.client import MantaStream, http_date
+
+
+
+#---- canned responses
+
+class NoopSigner(Signer):
+    def sign(self, s):
+        return ("rsa-sha256", "00:00", "c2lnbmF0dXJl")
+
+class CannedResponse(object):
+    """Enough of `httplib.HTTPResponse` for a `MantaStream`."""
+    will_close = False
+    def __init__(self, body, headers):
+        self._f = BytesIO(body)
+        self._headers = headers
+    def read(self, size=None):
+        if size is None:
+            return self._f.read()
+        return self._f.read(size)
+    def getheader(self, name, default=None):
+        return self._headers.get(name, default)
+    def isclosed(self):
+        return True
+    def close(self):
+        pass
+
+class CannedClient(manta.MantaClient):
+    """A `MantaClient` answering requests with a canned response, so that
+    only the client-side work is measured.
+    """
+    canned = ({"status": "200"}, "", {})   # (res, body, response headers)
+
+    def __init__(self):
+        manta.MantaClient.__init__(self, "http://127.0.0.1:1", "bench",
+            NoopSigner(), http_cache="none")
+
+    def _request(self, path, method="GET", query=None, body=None,
+                 headers=None, op=None):
+        res, content, _ = self.canned
+        return res, content
+
+    def _stream_request(self, path, method="GET", query=None, body=None,
+                        headers=None, op=None):
+        res, content, response_headers = self.canned
+        return res, MantaStream(None,
+            CannedResponse(content, response_headers),
+            on_release=lambda conn: None)
+
+
+
+#---- benchmarks
+# Each is a generator function: set up, then yield the function to time.
+
+def bench_list_directory2(gzipped):
+    lines = []
+    for i in range(1000):
+        if i % 10 == 0:
+            lines.append(json.dumps({"name": "dir%04d" % i,
+                "type": "directory", "mtime": "2013-05-22T17:39:43.714Z"}))
+        else:
+            lines.append(json.dumps({"name": "object-%04d.log" % i,
+                "etag": "b0c1ee6b-4c1f-4cfd-8bf5-1dbbd2a9d6b5",
+                "size": 12345 + i, "type": "object",
+                "mtime": "2013-05-22T17:39:43.714Z",
+                "durability": 2}))
+    body = ('\n'.join(lines) + '\n').encode('utf-8')
+    headers = {}
+    if gzipped:
+        buf = BytesIO()
+        f = gzip.GzipFile(fileobj=buf, mode="wb")
+        f.write(body)
+        f.close()
+        body = buf.getvalue()
+        headers["content-encoding"] = "gzip"
+    client = CannedClient()
+    client.canned = ({"status": "200"}, body, headers)
+    def f():
+        client.list_directory2("/bench/stor/dir")
+    yield f
+
+def bench_sign():
+    from Crypto.PublicKey import RSA
+    tmp = tempfile.mkdtemp(prefix="manta-micro-")
+    try:
+        key_path = join(tmp, "id_rsa")
+        key = RSA.generate(2048)
+        open(key_path, "wb").write(key.exportKey())
+        open(key_path + ".pub", "wb").write(
+            key.publickey().exportKey("OpenSSH") + b"\n")
+        os.environ.pop("SSH_AUTH_SOCK", None)   # don't use an agent key
+        signer = manta.CLISigner(key_path)
+        signer.sign("date: " + http_date())   # load the key
+        sigstr = "date: Wed, 22 May 2013 17:39:43 GMT"
+        def f():
+            signer.sign(sigstr)
+        yield f
+    finally:
+        shutil.rmtree(tmp)
+
+def bench_http_date():
+    yield http_date
+
+def bench_put_object_md5(size):
+    client = CannedClient()
+    client.canned = ({"status": "204"}, "", {})
+    content = os.urandom(size)
+    def f():
+        client.put_object("/bench/stor/obj", content)
+    yield f
+
+def bench_get_object2_md5(size):
+    import base64, hashlib
+    content = os.urandom(size)
+    client = CannedClient()
+    client.canned = ({"status": "200", "content-length": str(size),
+        "content-md5": base64.b64encode(hashlib.md5(content).digest())},
+        content, {})
+    def f():
+        client.get_object2("/bench/stor/obj")
+    yield f
+
+class TreeClient(object):
+    """Just `ls()` over a synthetic tree: /bench/stor/logs/<20 dirs>/<200
+    objects each>.
+    """
+    def __init__(self):
+        dirent = {"type": "object", "size": 1234,
+            "mtime": "2013-05-22T17:39:43.714Z"}
+        self.dirs = {
+            "/bench/stor": {"logs": {"name": "logs", "type": "directory"}},
+            "/bench/stor/logs": {},
+        }
+        for i in range(20):
+            name = "2013-05-%02d" % (i + 1)
+            self.dirs["/bench/stor/logs"][name] = {"name": name,
+                "type": "directory"}
+            objects = self.dirs["/bench/stor/logs/" + name] = {}
+            for j in range(200):
+                ext = (j % 4 == 0) and "gz" or "log"
+                oname = "host%03d.%s" % (j, ext)
+                objects[oname] = dict(dirent, name=oname)
+    def ls(self, mdir):
+        return self.dirs[mdir]
+
+def _load_mantash():
+    import imp
+    mantash = imp.load_source("mantash", join(TOP, "bin", "mantash"))
+    for name in ("mantash", "manta.client", "manta.cmdln"):
+        import logging
+        logging.getLogger(name).setLevel(logging.WARN)
+    return mantash
+
+def bench_ls_path_glob():
+    mantash = _load_mantash()
+    shell = mantash.Mantash()
+    shell.account = "bench"
+    shell.home = shell.cwd = "/bench/stor"
+    shell._known_users = {"bench": True}
+    shell._visited_known_mpath = lambda mpath: None
+    shell.client = TreeClient()
+    def f():
+        shell._ls_path("logs/2013-05-1*/host0*.log", False)
+    yield f
+
+def bench_cmdln_help(argv):
+    mantash = _load_mantash()
+    shell = mantash.Mantash()
+    shell.optparser = shell.get_optparser()
+    shell.stdout = StringIO()
+    def f():
+        shell.stdout.seek(0)
+        shell.stdout.truncate()
+        shell.do_help(argv)
+    yield f
+
+BENCHMARKS = [
+    ("list_directory2 (1000 entries)", bench_list_directory2, (False,)),
+    ("list_directory2 (1000 entries, gzip)", bench_list_directory2, (True,)),
+    ("CLISigner.sign (RSA 2048 key file)", bench_sign, ()),
+    ("http_date", bench_http_date, ()),
+    ("put_object md5 (4K)", bench_put_object_md5, (4096,)),
+    ("put_object md5 (1M)", bench_put_object_md5, (1024 * 1024,)),
+    ("get_object2 md5 (4K)", bench_get_object2_md5, (4096,)),
+    ("get_object2 md5 (1M)", bench_get_object2_md5, (1024 * 1024,)),
+    ("_ls_path glob (20x200 tree)", bench_ls_path_glob, ()),
+    ("cmdln help (command table)", bench_cmdln_help, (["help"],)),
+    ("cmdln help ls", bench_cmdln_help, (["help", "ls"],)),
+]
+
+
+
+#---- mainline
+
+def time_it(f, repeat, min_time=0.2):
+    """Return the best per-call time (in seconds) of `f` over `repeat` runs,
+    each of enough calls to take `min_time`.
+    """
+    number = 1
+    while True:
+        start = time.time()
+        for i in range(number):
+            f()
+        elapsed = time.time() - start
+        if elapsed >= min_time / 10 or number >= 10 ** 7:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = None
+    for r in range(repeat):
+        start = time.time()
+        for i in range(number):
+            f()
+        per_call = (time.time() - start) / number
+        if best is None or per_call < best:
+            best = per_call
+    return best, number
+
+def format_time(t):
+    if t < 1e-6:
+        return "%.1f ns" % (t * 1e9)
+    elif t < 1e-3:
+        return "%.2f us" % (t * 1e6)
+    elif t < 1:
+        return "%.2f ms" % (t * 1e3)
+    return "%.2f s" % t
+
+def git_commit():
+    try:
+        p = subprocess.Popen(["git", "describe", "--always", "--dirty"],
+            cwd=TOP, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, _ = p.communicate()
+    except OSError:
+        return None
+    return p.returncode == 0 and stdout.strip().decode('ascii') or None
+
+def main(argv):
+    parser = optparse.OptionParser(
+        usage="%prog [OPTIONS] [BENCHMARK-SUBSTRING ...]",
+        description="Run CPU microbenchmarks of client hot paths.")
+    parser.add_option("-r", "--repeat", type="int", default=5,
+        help="runs per benchmark, the best is reported (default 5)")
+    parser.add_option("-o", "--output", metavar="FILE",
+        help="save the results as JSON to FILE")
+    parser.add_option("-c", "--compare", metavar="FILE",
+        help="compare with results saved (with '-o') in FILE")
+    parser.add_option("-l", "--list", action="store_true",
+        help="list the benchmarks and exit")
+    opts, args = parser.parse_args(argv[1:])
+
+    if opts.list:
+        for name, _, _ in BENCHMARKS:
+            print(name)
+        return
+    baseline = {}
+    if opts.compare:
+        f = open(opts.compare)
+        try:
+            saved = json.load(f)
+        finally:
+            f.close()
+        baseline = saved["results"]
+        print("baseline: %s (%s)" % (opts.compare,
+            saved.get("commit") or "unknown commit"))
+
+    results = {}
+    for name, func, func_args in BENCHMARKS:
+        if args and not [a for a in args if a in name]:
+            continue
+        gen = func(*func_args)
+        f = next(gen)
+        try:
+            t, number = time_it(f, opts.repeat)
+        finally:
+            gen.close()
+        results[name] = t
+        line = "%-38s %12s  (%d loops)" % (name, format_time(t), number)
+        if name in baseline:
+            line += "  %+6.1f%% vs %s" % (
+                (t - baseline[name]) / baseline[name] * 100,
+                format_time(baseline[name]))
+        print(line)
+
+    if opts.output:
+        f = open(opts.output, "w")
+        try:
+            json.dump({
+                "commit": git_commit(),
+                "time": datetime.datetime.utcnow().strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        finally:
+            f.close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Compare request signing throughput of the crypto backends.
+
+Usage:
+    python bench/sign.py [-d SECONDS] [-b BITS,...] [-a ALGORITHM,...]
+                         [-e CURVE-BITS,...] [-t THREADS] [-p]
+
+For each installed backend (see `manta.crypto`), key and algorithm,
+signs "date: ..." strings with a `PrivateKeySigner` (as the client does for
+each request) for the given time and reports signatures per second,
+relative to the first case. Each backend's signatures are checked to verify
+with the other backends. ECDSA keys (P-256, P-384, P-521) need the
+"cryptography" backend.
+
+With '-t', THREADS threads sign concurrently. With '-p', each backend is
+also run with a `ProcessPoolSigner` (one worker process per CPU), e.g. to
+compare threaded signing throughput on a many-core host:
+
+    python bench/sign.py -t 32 -p -b 2048 -e ''
+"""
+
+import sys
+import os
+from os.path import join, dirname, abspath
+import time
+import base64
+import threading
+import shutil
+import tempfile
+import optparse
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import manta
+from manta import crypto
+from manta.auth import fingerprint_from_ssh_pub_key
+from manta.client import http_date
+
+
+
+#---- support
+
+def write_key(path, priv_key, pub_key):
+    for p, data in ((path, priv_key), (path + ".pub", pub_key + b"\n")):
+        f = open(p, "wb")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+    return path, pub_key
+
+def generate_rsa_key(bits, dir):
+    """Generate an RSA key, returning (private key path, public key data)."""
+    from Crypto.PublicKey import RSA
+    key = RSA.generate(bits)
+    return write_key(join(dir, "id_rsa_%d" % bits), key.exportKey(),
+        key.publickey().exportKey("OpenSSH"))
+
+def generate_ecdsa_key(bits, dir):
+    """Generate an ECDSA key on the NIST curve of the given size, returning
+    (private key path, public key data).
+    """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    curve = {256: ec.SECP256R1, 384: ec.SECP384R1, 521: ec.SECP521R1}[bits]
+    key = ec.generate_private_key(curve(), default_backend())
+    return write_key(join(dir, "id_ecdsa_%d" % bits),
+        key.private_bytes(serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()),
+        key.public_key().public_bytes(serialization.Encoding.OpenSSH,
+            serialization.PublicFormat.OpenSSH))
+
+def rate(signer, duration, threads=1):
+    sigstr = "date: " + http_date()
+    counts = []
+    start = time.time()
+    end = start + duration
+    def sign_until_end():
+        n = 0
+        while True:
+            for i in range(10):
+                signer.sign(sigstr)
+            n += 10
+            if time.time() >= end:
+                counts.append(n)
+                return
+    workers = [threading.Thread(target=sign_until_end)
+        for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(counts) / (time.time() - start)
+
+
+
+#---- mainline
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [OPTIONS]",
+        description="Compare signatures per second of the crypto backends.")
+    parser.add_option("-d", "--duration", type="float", default=2.0,
+        help="seconds to sign for, per case (default %default)")
+    parser.add_option("-b", "--bits", default="2048,4096",
+        help="RSA key sizes (default %default)")
+    parser.add_option("-a", "--algorithms", default="rsa-sha256",
+        help="RSA signing algorithms, of rsa-sha1, rsa-sha256 and "
+            "rsa-sha512 (default %default)")
+    parser.add_option("-e", "--ecdsa", default="256,384",
+        help="ECDSA curve sizes, of 256, 384 and 521 (default %default, "
+            "'' for none)")
+    parser.add_option("-t", "--threads", type="int", default=1,
+        help="threads signing concurrently (default %default)")
+    parser.add_option("-p", "--pool", action="store_true",
+        help="also sign with a ProcessPoolSigner for each backend")
+    opts, args = parser.parse_args(argv[1:])
+
+    backends = crypto.available_backends()
+    print("backends: %s" % ", ".join(backends))
+    signer_classes = [("", manta.PrivateKeySigner)]
+    if opts.pool:
+        signer_classes.append(("+pool", manta.ProcessPoolSigner))
+    tmp = tempfile.mkdtemp(prefix="manta-bench-sign-")
+    try:
+        cases = []   # (key type, bits, key path, pub key, algorithms)
+        for bits in [int(b) for b in opts.bits.split(",") if b]:
+            cases.append(("rsa", bits) + generate_rsa_key(bits, tmp)
+                + (opts.algorithms.split(","),))
+        if opts.ecdsa and "cryptography" in backends:
+            for bits in [int(b) for b in opts.ecdsa.split(",") if b]:
+                cases.append(("ecdsa", bits) + generate_ecdsa_key(bits, tmp)
+                    + ([None],))
+
+        print("%-18s %-5s %5s %-13s %12s %9s" % ("backend", "key", "bits",
+            "algorithm", "signs/s", "relative"))
+        base = None
+        for key_type, bits, key_path, pub_key, algorithms in cases:
+            fingerprint = fingerprint_from_ssh_pub_key(pub_key)
+            verifiers = []
+            for name in backends:
+                try:
+                    verifiers.append(
+                        crypto.get_backend(name).load_public_key(pub_key))
+                except manta.MantaError:
+                    pass   # e.g. pycrypto with an ECDSA key
+            for algorithm in algorithms:
+                for name, (suffix, signer_class) in [(n, c)
+                        for n in backends for c in signer_classes]:
+                    try:
+                        # A ProcessPoolSigner loads the key on creation.
+                        signer = signer_class(key_path, backend=name)
+                        key_info = signer._get_key_info()
+                    except manta.MantaError:
+                        continue
+                    if algorithm:
+                        key_info["algorithm"] = algorithm
+                    algo, fp, signed = signer.sign("date: check")
+                    assert fp == fingerprint
+                    hash_name = algo.split("-", 1)[1]
+                    for verifier in verifiers:
+                        assert verifier.verify("date: check",
+                            base64.b64decode(signed), hash_name), \
+                            "%s signature does not verify" % name
+                    r = rate(signer, opts.duration, opts.threads)
+                    if hasattr(signer, "close"):
+                        signer.close()
+                    base = base or r
+                    print("%-18s %-5s %5d %-13s %12.1f %8.2fx" % (
+                        name + suffix, key_type, bits, algo, r, r / base))
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
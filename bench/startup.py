@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Benchmark startup: `import manta`, and time to first request.
+
+Usage:
+    python bench/startup.py [-n RUNS] [-b BACKEND]
+
+Each case is run as a new process, RUNS times, and the wall time (from
+spawn to exit) is reported as the min and median:
+
+    python          `python -c pass`, the interpreter startup baseline
+    import manta    `python -c 'import manta'`
+    first request   import manta, create a `MantaClient` (with a key file
+                    signer) and list a directory
+    mantash help    the command table, no request
+    mantash ls      a one-shot `mantash ls` of a directory
+
+Requests go to a local stand-in server (manta.fakemanta), which checks the
+request signatures. The ssh-agent isn't used (SSH_AUTH_SOCK is unset).
+"""
+
+import sys
+import os
+from os.path import join, dirname, abspath
+import time
+import shutil
+import tempfile
+import subprocess
+import optparse
+
+TOP = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, TOP)
+from manta.fakemanta import FakeManta
+
+
+
+#---- support
+
+FIRST_REQUEST = """
+import sys
+sys.path.insert(0, %(top)r)
+import manta
+client = manta.MantaClient(%(url)r, "bench", manta.CLISigner(%(key)r),
+    http_cache="none")
+client.ls("/bench/stor")
+"""
+
+def generate_key(dir):
+    from Crypto.PublicKey import RSA
+    key = RSA.generate(2048)
+    path = join(dir, "id_rsa")
+    f = open(path, "wb")
+    try:
+        f.write(key.exportKey())
+    finally:
+        f.close()
+    pub_key = key.publickey().exportKey("OpenSSH")
+    f = open(path + ".pub", "wb")
+    try:
+        f.write(pub_key + b"\n")
+    finally:
+        f.close()
+    return path, pub_key
+
+def run(argv, env, runs):
+    times = []
+    for i in range(runs):
+        start = time.time()
+        p = subprocess.Popen(argv, env=env, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        times.append(time.time() - start)
+        if p.returncode != 0:
+            raise RuntimeError("%s failed (%d): %s" % (argv, p.returncode,
+                stderr.strip()))
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+
+#---- mainline
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [OPTIONS]",
+        description="Benchmark 'import manta' and time to first request.")
+    parser.add_option("-n", "--runs", type="int", default=10,
+        help="runs per case (default %default)")
+    parser.add_option("-b", "--backend",
+        help="crypto backend (MANTA_CRYPTO_BACKEND) for the children")
+    opts, args = parser.parse_args(argv[1:])
+
+    tmp = tempfile.mkdtemp(prefix="manta-bench-startup-")
+    key_path, pub_key = generate_key(tmp)
+    server = FakeManta(keys=[pub_key])
+    server.start()
+    server.ensure_account("bench")
+    try:
+        env = dict(os.environ, MANTA_URL=server.url, MANTA_USER="bench",
+            MANTA_KEY_ID=key_path, XDG_CACHE_HOME=join(tmp, "cache"),
+            PYTHONDONTWRITEBYTECODE="")
+        env.pop("SSH_AUTH_SOCK", None)
+        env.pop("PYTHONPATH", None)
+        if opts.backend:
+            env["MANTA_CRYPTO_BACKEND"] = opts.backend
+        mantash = [sys.executable, join(TOP, "bin", "mantash"),
+            "--http-cache", "none"]
+        cases = [
+            ("python", [sys.executable, "-c", "pass"]),
+            ("import manta", [sys.executable, "-c",
+                "import sys; sys.path.insert(0, %r); import manta" % TOP]),
+            ("first request", [sys.executable, "-c", FIRST_REQUEST
+                % {"top": TOP, "url": server.url, "key": key_path}]),
+            ("mantash help", mantash + ["help"]),
+            ("mantash ls", mantash + ["ls", "/bench/stor"]),
+        ]
+        print("%-16s %10s %10s" % ("case", "min(ms)", "median(ms)"))
+        for name, case_argv in cases:
+            best, median = run(case_argv, env, opts.runs)
+            print("%-16s %10.1f %10.1f" % (name, best * 1e3, median * 1e3))
+    finally:
+        server.stop()
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
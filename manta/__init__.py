@@ -3,6 +3,12 @@
 """A Python client/CLI/shell/SDK for Joyent Manta."""
 
 from .version import __version__
-from .client import MantaClient
-from .auth import PrivateKeySigner, SSHAgentSigner, CLISigner
+from .client import MantaClient, HedgePolicy, RetryPolicy
+from .blobcache import BlobCache
+from .httpcache import MemoryCache, DiskCache
+from .manifest import ChecksumManifest
+from .journal import UploadJournal
+from .metrics import ClientMetrics
+from .auth import PrivateKeySigner, SSHAgentSigner, CLISigner, \
+    ProcessPoolSigner
 from .errors import *
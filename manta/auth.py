@@ -6,27 +6,20 @@ import sys
 import os
 from os.path import exists, expanduser, join, dirname, abspath
 import logging
+import json
 import base64
 import hashlib
 from getpass import getpass
 import re
 import struct
+import tempfile
+import threading
+import time
 from glob import glob
 
-try:
-    from Crypto.PublicKey import RSA
-    from Crypto.Signature import PKCS1_v1_5
-    from Crypto.Hash import SHA256, SHA, SHA512
-except ImportError:
-    sys.stderr.write(
-        "* * *\n"
-        "See <https://github.com/joyent/python-manta#1-pycrypto-dependency>\n"
-        "for help installing PyCrypto (the Python 'Crypto' package)\n"
-        "* * *\n")
-    raise
-import paramiko
-
+from manta import appdirs
 from manta.errors import MantaError
+from manta.crypto import get_backend
 
 
 
@@ -36,6 +29,23 @@ log = logging.getLogger('manta.auth')
 
 FINGERPRINT_RE = re.compile(r'^([a-f0-9]{2}:){15}[a-f0-9]{2}$');
 
+# The http-signature algorithm for signing with an ssh-agent key of the
+# given type. The agent picks the hash: SHA-1 for RSA, and by curve size for
+# ECDSA.
+AGENT_KEY_ALGORITHMS = {
+    "ssh-rsa": "rsa-sha1",
+    "ecdsa-sha2-nistp256": "ecdsa-sha256",
+    "ecdsa-sha2-nistp384": "ecdsa-sha384",
+    "ecdsa-sha2-nistp521": "ecdsa-sha512",
+}
+
+# The key index: the fingerprints of "~/.ssh/*.pub" keys (each checked
+# against the file's mtime and size before use), and the key source
+# ("agent" or "ssh_key") that last worked for each `CLISigner` key id. Set
+# to None to not use an index.
+KEY_INDEX_PATH = join(appdirs.user_cache_dir("python-manta", "Joyent"),
+    "key-index.json")
+
 
 
 #---- internal support stuff
@@ -57,8 +67,10 @@ def fingerprint_from_ssh_pub_key(data):
     #   'AAAAB3NzaC1yc2EAAAABIwAA...2l24uq9Lfw=='
     # - the full ssh pub key file content, e.g.:
     #   'ssh-rsa AAAAB3NzaC1yc2EAAAABIwAA...2l24uq9Lfw== my comment'
-    if (re.search(r'^ssh-(?:rsa|dss) ', data)):
-        data = data.split(None, 1)[1]
+    #   'ecdsa-sha2-nistp256 AAAAE2VjZHNhLXNoYTItbmlzdHAy...Y= my comment'
+    parts = data.split()
+    if len(parts) > 1:
+        data = parts[1]
 
     key = base64.b64decode(data)
     fp_plain = hashlib.md5(key).hexdigest()
@@ -115,16 +127,8 @@ def load_ssh_key(key_id, skip_priv_key=False):
 
     # Else, look at all pub/priv keys in "~/.ssh" for a matching fingerprint.
     fingerprint = key_id
-    pub_key_glob = expanduser('~/.ssh/*.pub')
-    for pub_key_path in glob(pub_key_glob):
-        f = open(pub_key_path)
-        try:
-            pub_key = f.read()
-        finally:
-            f.close()
-        if fingerprint_from_ssh_pub_key(pub_key) == fingerprint:
-            break
-    else:
+    pub_key_path = find_pub_key_path(fingerprint)
+    if pub_key_path is None:
         raise MantaError(
             "no '~/.ssh/*.pub' key found with fingerprint '%s'"
             % fingerprint)
@@ -142,6 +146,107 @@ def load_ssh_key(key_id, skip_priv_key=False):
         priv_key=priv_key)
 
 
+def find_pub_key_path(fingerprint):
+    """Find the "~/.ssh/*.pub" key with the given fingerprint.
+
+    The fingerprints are kept in the key index (`KEY_INDEX_PATH`), so that
+    a key file is only read and fingerprinted again if it has changed.
+
+    @returns {str} The public key path, or None if not found.
+    """
+    index = _load_key_index()
+    pub_keys = index.setdefault("pub_keys", {})
+    for path, entry in pub_keys.items():
+        if (entry["fingerprint"] == fingerprint
+            and entry["stamp"] == _file_stamp(path)):
+            return path
+
+    # Not indexed (or changed): index all the keys.
+    found = None
+    changed = False
+    paths = sorted(glob(expanduser('~/.ssh/*.pub')))
+    for path in paths:
+        stamp = _file_stamp(path)
+        entry = pub_keys.get(path)
+        if entry is None or entry["stamp"] != stamp:
+            try:
+                f = open(path)
+                try:
+                    pub_key = f.read()
+                finally:
+                    f.close()
+                entry = {"fingerprint": fingerprint_from_ssh_pub_key(pub_key),
+                    "stamp": stamp}
+            except (IOError, OSError, TypeError, ValueError):
+                continue   # unreadable or not a public key
+            pub_keys[path] = entry
+            changed = True
+        if found is None and entry["fingerprint"] == fingerprint:
+            found = path
+    for path in set(pub_keys) - set(paths):
+        del pub_keys[path]
+        changed = True
+    if changed:
+        _save_key_index(index)
+    return found
+
+def _file_stamp(path):
+    """[mtime, size] of the given file, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+def _load_key_index():
+    if not KEY_INDEX_PATH:
+        return {}
+    try:
+        f = open(KEY_INDEX_PATH)
+        try:
+            index = json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get("version") != 1:
+        return {}
+    return index
+
+def _save_key_index(index):
+    """Write the key index (atomically). Failure to write is only logged:
+    the index is just a cache.
+    """
+    if not KEY_INDEX_PATH:
+        return
+    index["version"] = 1
+    try:
+        d = dirname(KEY_INDEX_PATH)
+        if not exists(d):
+            os.makedirs(d)
+        fd, tmp_path = tempfile.mkstemp(dir=d, prefix=".key-index-")
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(index, f)
+        finally:
+            f.close()
+        os.rename(tmp_path, KEY_INDEX_PATH)
+    except (IOError, OSError):
+        _, ex, _ = sys.exc_info()
+        log.debug("could not save key index '%s': %s", KEY_INDEX_PATH, ex)
+
+def _get_key_source(key_id):
+    """The key source ("agent" or "ssh_key") that last worked for the given
+    key id, if known.
+    """
+    return _load_key_index().get("sources", {}).get(key_id)
+
+def _set_key_source(key_id, source):
+    index = _load_key_index()
+    index.setdefault("sources", {})[key_id] = source
+    _save_key_index(index)
+
+
 def unpack_agent_response(d):
     parts = []
     while d:
@@ -155,19 +260,82 @@ def signature_from_agent_sign_response(d):
     """h/t <https://github.com/atl/py-http-signature/blob/master/http_signature/sign.py>"""
     return unpack_agent_response(d)[1]
 
-def ssh_key_info_from_key_data(key_id, priv_key=None):
+def _der_length(n):
+    if n < 0x80:
+        return struct.pack('B', n)
+    b = b''
+    while n:
+        b = struct.pack('B', n & 0xff) + b
+        n >>= 8
+    return struct.pack('B', 0x80 | len(b)) + b
+
+def _der_integer(b):
+    b = b.lstrip(b'\x00') or b'\x00'
+    if struct.unpack('B', b[:1])[0] & 0x80:
+        b = b'\x00' + b   # keep it positive
+    return b'\x02' + _der_length(len(b)) + b
+
+def ecdsa_signature_to_der(sig):
+    """Convert an SSH ECDSA signature (the r and s mpints) to the ASN.1 DER
+    encoding (a SEQUENCE of two INTEGERs) used by http-signature.
+    """
+    r, s = unpack_agent_response(sig)
+    ints = _der_integer(r) + _der_integer(s)
+    return b'\x30' + _der_length(len(ints)) + ints
+
+def agent_sign(key_info, data):
+    """Sign `data` with the ssh-agent key in the given key info (from
+    `agent_key_info_from_key_id`).
+
+    @returns {bytes} The raw signature.
+    """
+    import inspect
+    agent_key = key_info["agent_key"]
+    # Older paramiko versions take an (unused) random pool first.
+    getargspec = (getattr(inspect, "getfullargspec", None)
+        or inspect.getargspec)
+    if getargspec(agent_key.sign_ssh_data).args[1:2] == ["rng"]:
+        args = (None, data)
+    else:
+        args = (data,)
+    # The agent connection carries one request and response at a time:
+    # interleaved requests from several threads garble the protocol.
+    lock = key_info.get("agent_lock")
+    if lock is None:
+        response = agent_key.sign_ssh_data(*args)
+    else:
+        lock.acquire()
+        try:
+            response = agent_key.sign_ssh_data(*args)
+        finally:
+            lock.release()
+    signed_raw = signature_from_agent_sign_response(response)
+    if key_info["algorithm"].startswith("ecdsa-"):
+        signed_raw = ecdsa_signature_to_der(signed_raw)
+    return signed_raw
+
+def ssh_key_info_from_key_data(key_id, priv_key=None, backend=None,
+                               prompt=True):
     """Get/load SSH key info necessary for signing.
 
     @param key_id {str} Either a private ssh key fingerprint, e.g.
         'b3:f0:a1:6c:18:3b:42:63:fd:6e:57:42:74:17:d4:bc', or the path to
         an ssh private key file (like ssh's IdentityFile config option).
     @param priv_key {str} Optional. SSH private key file data (PEM format).
+    @param backend {str} Optional. The crypto backend name. See
+        `manta.crypto.get_backend`.
+    @param prompt {bool} Optional. Default true. Whether to prompt for the
+        passphrase of an encrypted key. If false, an encrypted key is an
+        error.
     @return {dict} with these keys:
-        - type: "agent"
-        - signer: Crypto signer class (a PKCS#1 v1.5 signer for RSA keys)
+        - type: "ssh_key"
+        - signer: the key loaded by the crypto backend, with a
+          `sign(data, hash_name)` method
+        - backend: the crypto backend name
         - fingerprint: key fingerprint
-        - algorithm: 'rsa-sha256'  DSA not current supported. Hash algorithm
-          selection is not exposed.
+        - algorithm: 'rsa-sha256' for an RSA key, 'ecdsa-sha256',
+          'ecdsa-sha384' or 'ecdsa-sha512' for an ECDSA key (by curve). DSA
+          is not supported.
         - ... some others added by `load_ssh_key()`
     """
     if FINGERPRINT_RE.match(key_id) and priv_key:
@@ -179,21 +347,25 @@ def ssh_key_info_from_key_data(key_id, priv_key=None):
         # Otherwise, we attempt to load necessary details from ~/.ssh.
         key_info = load_ssh_key(key_id)
 
-    # Load an RSA key signer.
+    # Load a key signer.
+    backend = get_backend(backend)
     key = None
     try:
-        key = RSA.importKey(key_info["priv_key"])
+        key = backend.load_private_key(key_info["priv_key"])
     except ValueError:
+        if not prompt:
+            raise MantaError("could not import key without a passphrase")
         if "priv_key_path" in key_info:
-            prompt = "Passphrase [%s]: " % key_info["priv_key_path"]
+            prompt_str = "Passphrase [%s]: " % key_info["priv_key_path"]
         else:
-            prompt = "Passphrase: "
+            prompt_str = "Passphrase: "
         for i in range(3):
-            passphrase = getpass(prompt)
+            passphrase = getpass(prompt_str)
             if not passphrase:
                 break
             try:
-                key = RSA.importKey(key_info["priv_key"], passphrase)
+                key = backend.load_private_key(key_info["priv_key"],
+                    passphrase)
             except ValueError:
                 continue
             else:
@@ -203,10 +375,11 @@ def ssh_key_info_from_key_data(key_id, priv_key=None):
             if "priv_key_path" in key_info:
                 details = " (%s)" % key_info["priv_key_path"]
             raise MantaError("could not import key" + details)
-    key_info["signer"] = PKCS1_v1_5.new(key)
+    key_info["signer"] = key
+    key_info["backend"] = backend.name
 
     key_info["type"] = "ssh_key"
-    key_info["algorithm"] = "rsa-sha256"
+    key_info["algorithm"] = key.algorithm
     return key_info
 
 
@@ -219,9 +392,17 @@ def agent_key_info_from_key_id(key_id):
     @return {dict} with these keys:
         - type: "agent"
         - agent_key: paramiko AgentKey
+        - agent_lock: a lock to hold while using the agent connection
         - fingerprint: key fingerprint
-        - algorithm: "rsa-sha1"  Currently don't support DSA agent signing.
+        - algorithm: "rsa-sha1" for an RSA key, "ecdsa-sha256",
+          "ecdsa-sha384" or "ecdsa-sha512" for an ECDSA key (by curve). DSA
+          agent signing isn't supported.
     """
+    # Without an agent there is nothing to find. Checking first saves
+    # importing paramiko (which is slow to import).
+    if not os.environ.get("SSH_AUTH_SOCK"):
+        raise MantaError("no ssh-agent: SSH_AUTH_SOCK is not set")
+
     # Need the fingerprint of the key we're using for signing. If it
     # is a path to a priv key, then we need to load it.
     if not FINGERPRINT_RE.match(key_id):
@@ -240,17 +421,94 @@ def agent_key_info_from_key_id(key_id):
         raise MantaError(
             'no ssh-agent key with fingerprint "%s"' % fingerprint)
 
-    # TODO:XXX DSA support possible with paramiko?
-    algorithm = 'rsa-sha1'
+    algorithm = AGENT_KEY_ALGORITHMS.get(key.get_name())
+    if algorithm is None:
+        raise MantaError('unsupported ssh-agent key type for signing: %s '
+            '(fingerprint "%s")' % (key.get_name(), fingerprint))
 
     return {
         "type": "agent",
         "agent_key": key,
+        "agent_lock": threading.Lock(),
         "fingerprint": fingerprint,
         "algorithm": algorithm
     }
 
 
+# The key for `ProcessPoolSigner` workers: set around forking them.
+_worker_key_info = None
+
+def _init_sign_worker(key_id, priv_key, backend):
+    """Initialize a `ProcessPoolSigner` worker process."""
+    global _worker_key_info
+    if _worker_key_info is None:
+        # Not forked: load the key (there is no terminal for a passphrase).
+        _worker_key_info = ssh_key_info_from_key_data(key_id, priv_key,
+            backend, prompt=False)
+    elif backend == "pycrypto":
+        # PyCrypto's RNG refuses to be used in a forked process until this.
+        from Crypto import Random
+        Random.atfork()
+
+def _sign_batch(strings, hash_algo):
+    """Sign strings in a `ProcessPoolSigner` worker.
+
+    @returns (error, signatures) {2-tuple} `error` is None, or a string
+        describing why the batch couldn't be signed.
+    """
+    try:
+        signer = _worker_key_info["signer"]
+        return None, [base64.b64encode(signer.sign(s, hash_algo))
+            for s in strings]
+    except Exception:
+        _, ex, _ = sys.exc_info()
+        return "%s: %s" % (ex.__class__.__name__, ex), None
+
+class _PendingSignature(object):
+    """A `ProcessPoolSigner` signature that is being made."""
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = self._error = None
+
+    def set(self, result):
+        self._result = result
+        self._event.set()
+
+    def set_error(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self, timeout):
+        """Wait up to `timeout` seconds. Returns true if done."""
+        self._event.wait(timeout)
+        return self._event.is_set()
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+def _pool_pids(pool):
+    """Return the set of pids of a `multiprocessing.Pool`'s workers. The
+    pool replaces a worker that dies, so this changes if one does.
+    """
+    return set(p.pid for p in list(pool._pool))
+
+def _terminate_pool(pool):
+    """Terminate a `multiprocessing.Pool`. `Pool.terminate()` can hang if a
+    worker died holding the task queue lock: then the workers are killed so
+    that it can finish.
+    """
+    t = threading.Thread(target=pool.terminate, name="manta-pool-terminate")
+    t.daemon = True
+    t.start()
+    t.join(1.0)
+    if t.is_alive():
+        for p in list(pool._pool):
+            p.terminate()
+        t.join(1.0)
+
+
 
 #---- exports
 
@@ -266,6 +524,14 @@ class Signer(object):
         """
         raise NotImplementedError("this is a virtual base class")
 
+    def sign_many(self, strings):
+        """Sign each of the given strings.
+
+        @param strings {list} The strings to be signed.
+        @returns {list} A `sign()` 3-tuple for each string, in order.
+        """
+        return [self.sign(s) for s in strings]
+
 class PrivateKeySigner(Signer):
     """Sign Manta requests with the given ssh private key.
 
@@ -273,23 +539,32 @@ class PrivateKeySigner(Signer):
         'b3:f0:a1:6c:18:3b:42:63:fd:6e:57:42:74:17:d4:bc', or the path to
         an ssh private key file (like ssh's IdentityFile config option).
     @param priv_key {str} Optional. SSH private key file data (PEM format).
+    @param backend {str} Optional. The crypto backend to sign with:
+        "cryptography" or "pycrypto". By default the MANTA_CRYPTO_BACKEND
+        envvar, else the first installed. See `manta.crypto`.
 
     If a *fingerprint* is provided for `key_id` *and* `priv_key` is specified,
     then this is all the data required. Otherwise, this class will attempt
     to load required key data (both public and private key files) from
     keys in "~/.ssh/".
     """
-    def __init__(self, key_id, priv_key=None):
+    def __init__(self, key_id, priv_key=None, backend=None):
         self.key_id = key_id
         self.priv_key = priv_key
+        self.backend = backend
+        self._key_info_lock = threading.Lock()
 
     _key_info_cache = None
     def _get_key_info(self):
         """Get key info appropriate for signing."""
-        if self._key_info_cache is None:
-            self._key_info_cache = ssh_key_info_from_key_data(
-                self.key_id, self.priv_key)
-        return self._key_info_cache
+        self._key_info_lock.acquire()
+        try:
+            if self._key_info_cache is None:
+                self._key_info_cache = ssh_key_info_from_key_data(
+                    self.key_id, self.priv_key, self.backend)
+            return self._key_info_cache
+        finally:
+            self._key_info_lock.release()
 
     def sign(self, s):
         assert isinstance(s, str)   # for now, not unicode. Python 3?
@@ -298,14 +573,7 @@ class PrivateKeySigner(Signer):
 
         assert key_info["type"] == "ssh_key"
         hash_algo = key_info["algorithm"].split('-')[1]
-        hash_class = {
-            "sha1": SHA,
-            "sha256": SHA256,
-            "sha512": SHA512
-        }[hash_algo]
-        hasher = hash_class.new()
-        hasher.update(s)
-        signed_raw = key_info["signer"].sign(hasher)
+        signed_raw = key_info["signer"].sign(s, hash_algo)
         signed = base64.b64encode(signed_raw)
 
         return (key_info["algorithm"], key_info["fingerprint"], signed)
@@ -319,61 +587,100 @@ class SSHAgentSigner(Signer):
     """
     def __init__(self, key_id):
         self.key_id = key_id
+        self._key_info_lock = threading.Lock()
 
     _key_info_cache = None
     def _get_key_info(self):
         """Get key info appropriate for signing."""
-        if self._key_info_cache is None:
-            self._key_info_cache = agent_key_info_from_key_id(self.key_id)
-        return self._key_info_cache
+        self._key_info_lock.acquire()
+        try:
+            if self._key_info_cache is None:
+                self._key_info_cache = agent_key_info_from_key_id(
+                    self.key_id)
+            return self._key_info_cache
+        finally:
+            self._key_info_lock.release()
 
     def sign(self, s):
         assert isinstance(s, str)   # for now, not unicode. Python 3?
 
         key_info = self._get_key_info()
         assert key_info["type"] == "agent"
-        response = key_info["agent_key"].sign_ssh_data(None, s)
-        signed_raw = signature_from_agent_sign_response(response)
-        signed = base64.b64encode(signed_raw)
+        signed = base64.b64encode(agent_sign(key_info, s))
 
         return (key_info["algorithm"], key_info["fingerprint"], signed)
 
 class CLISigner(Signer):
     """Sign Manta requests using the SSH agent (if available and has the
     required key) or loading keys from "~/.ssh/*".
+
+    The source that worked is remembered (in the key index, see
+    `KEY_INDEX_PATH`): if it was a key file, the next `CLISigner` for the
+    same key id loads the key file first (without asking for a passphrase)
+    rather than asking the agent.
+
+    @param key_id {str} Either a private ssh key fingerprint or the path to
+        an ssh private key file.
+    @param backend {str} Optional. The crypto backend for signing with a
+        key file. See `PrivateKeySigner`.
     """
-    def __init__(self, key_id):
+    def __init__(self, key_id, backend=None):
         self.key_id = key_id
+        self.backend = backend
+        self._key_info_lock = threading.Lock()
 
     _key_info_cache = None
     def _get_key_info(self):
         """Get key info appropriate for signing: either from the ssh agent
         or from a private key.
         """
-        if self._key_info_cache is not None:
+        # Only one thread looks for the key (perhaps asking for a
+        # passphrase): the others wait for it.
+        self._key_info_lock.acquire()
+        try:
+            if self._key_info_cache is None:
+                self._key_info_cache = self._find_key_info()
             return self._key_info_cache
+        finally:
+            self._key_info_lock.release()
 
+    def _find_key_info(self):
         errors = []
+        last_source = _get_key_source(self.key_id)
+
+        # A key file worked last time: try it first. An encrypted one is
+        # left until after the agent, which may have the key.
+        if last_source == "ssh_key":
+            try:
+                key_info = ssh_key_info_from_key_data(self.key_id,
+                    backend=self.backend, prompt=False)
+            except (MantaError, EnvironmentError):
+                pass
+            else:
+                return key_info
 
-        # First try the agent.
+        # Try the agent.
         try:
             key_info = agent_key_info_from_key_id(self.key_id)
         except MantaError:
             _, ex, _ = sys.exc_info()
             errors.append(ex)
         else:
-            self._key_info_cache = key_info
-            return self._key_info_cache
+            if last_source != "agent":
+                _set_key_source(self.key_id, "agent")
+            return key_info
 
         # Try loading from "~/.ssh/*".
         try:
-            key_info = ssh_key_info_from_key_data(self.key_id)
+            key_info = ssh_key_info_from_key_data(self.key_id,
+                backend=self.backend)
         except MantaError:
             _, ex, _ = sys.exc_info()
             errors.append(ex)
         else:
-            self._key_info_cache = key_info
-            return self._key_info_cache
+            if last_source != "ssh_key":
+                _set_key_source(self.key_id, "ssh_key")
+            return key_info
 
         raise MantaError("could not find key info for signing: %s"
             % "; ".join(map(unicode, errors)))
@@ -382,26 +689,206 @@ class CLISigner(Signer):
         assert isinstance(sigstr, str)   # for now, not unicode. Python 3?
 
         key_info = self._get_key_info()
-        log.debug("sign %r with %s key (algo %s, fp %s)", sigstr,
-            key_info["type"], key_info["algorithm"], key_info["fingerprint"])
+        log.debug("sign %r with %s key (algo %s, fp %s, backend %s)", sigstr,
+            key_info["type"], key_info["algorithm"], key_info["fingerprint"],
+            key_info.get("backend"))
 
         if key_info["type"] == "agent":
-            response = key_info["agent_key"].sign_ssh_data(None, sigstr)
-            signed_raw = signature_from_agent_sign_response(response)
-            signed = base64.b64encode(signed_raw)
+            signed = base64.b64encode(agent_sign(key_info, sigstr))
         elif key_info["type"] == "ssh_key":
             hash_algo = key_info["algorithm"].split('-')[1]
-            hash_class = {
-                "sha1": SHA,
-                "sha256": SHA256,
-                "sha512": SHA512
-            }[hash_algo]
-            hasher = hash_class.new()
-            hasher.update(sigstr)
-            signed_raw = key_info["signer"].sign(hasher)
+            signed_raw = key_info["signer"].sign(sigstr, hash_algo)
             signed = base64.b64encode(signed_raw)
         else:
             raise MantaError("internal error: unknown key type: %r"
                 % key_info["type"])
 
         return (key_info["algorithm"], key_info["fingerprint"], signed)
+
+class ProcessPoolSigner(Signer):
+    """Sign Manta requests with an ssh private key in a pool of worker
+    processes, so that signing by many threads isn't limited to one core
+    by the GIL.
+
+    The key is loaded (asking for a passphrase if necessary) in this
+    process and the workers are forked with it when the signer is created,
+    so create it before starting any threads (forking a process with
+    running threads can leave locks held in the child). Signing requests
+    from concurrent threads are batched: while all the workers are busy,
+    waiting requests are collected and sent to the next free worker
+    together, so that there is one round trip per batch rather than per
+    signature. With a single thread, `sign()` is slower than
+    `PrivateKeySigner` (a round trip to a worker per signature). Use
+    `sign_many()` to sign many strings at once. It pays off for RSA keys on
+    a many-core host; ECDSA signing is cheap enough that the round trips
+    cost more than they save. See "bench/sign.py -t THREADS -p".
+
+    @param key_id {str} Either a private ssh key fingerprint or the path to
+        an ssh private key file. See `PrivateKeySigner`.
+    @param priv_key {str} Optional. SSH private key file data (PEM format).
+    @param backend {str} Optional. The crypto backend. See
+        `PrivateKeySigner`.
+    @param processes {int} Optional. The number of worker processes.
+        Default is the number of CPUs.
+    @param batch_size {int} Optional. Default 64. The maximum number of
+        strings sent to a worker at once.
+    @param timeout {float} Optional. Default 60. Seconds to wait for a
+        signature before giving up with a `MantaError`.
+    """
+    def __init__(self, key_id, priv_key=None, backend=None, processes=None,
+                 batch_size=64, timeout=60.0):
+        self.key_id = key_id
+        self.priv_key = priv_key
+        self.backend = backend
+        if processes is None:
+            import multiprocessing
+            processes = multiprocessing.cpu_count()
+        self.processes = max(1, processes)
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pids = None     # the worker pids, to notice a dead worker
+        self._waiting = []    # [(string, _PendingSignature), ...]
+        self._in_flight = {}  # id(batch) -> batch sent to a worker
+        self._free = self.processes   # workers without a batch
+        self.start()
+
+    _key_info_cache = None
+    def _get_key_info(self):
+        """Get key info appropriate for signing."""
+        if self._key_info_cache is None:
+            self._key_info_cache = ssh_key_info_from_key_data(
+                self.key_id, self.priv_key, self.backend)
+        return self._key_info_cache
+
+    def start(self):
+        """Start the worker processes. This is done on creation, and again
+        after `close()` if the signer is to be used again.
+        """
+        global _worker_key_info
+        self._lock.acquire()
+        try:
+            if self._pool is not None:
+                return
+            from multiprocessing import Pool
+            key_info = self._get_key_info()
+            # Forked workers get the loaded key from this global.
+            _worker_key_info = key_info
+            try:
+                self._pool = Pool(self.processes, _init_sign_worker,
+                    (self.key_id, self.priv_key, key_info["backend"]))
+            finally:
+                _worker_key_info = None
+            self._pids = _pool_pids(self._pool)
+            log.debug("started %d signing processes (fp %s)",
+                self.processes, key_info["fingerprint"])
+        finally:
+            self._lock.release()
+
+    def sign(self, s):
+        assert isinstance(s, str)   # for now, not unicode. Python 3?
+        return self._wait(self._submit([s])[0])
+
+    def sign_many(self, strings):
+        return [self._wait(p) for p in self._submit(strings)]
+
+    def _submit(self, strings):
+        pending = [_PendingSignature() for s in strings]
+        self._lock.acquire()
+        try:
+            if self._pool is None:
+                raise MantaError("ProcessPoolSigner is closed")
+            self._waiting += zip(strings, pending)
+            self._dispatch()
+        finally:
+            self._lock.release()
+        return pending
+
+    def _wait(self, pending):
+        deadline = time.time() + self.timeout
+        # With a timeout, so that a Ctrl+C isn't blocked on Python 2.
+        while not pending.wait(1.0):
+            self._check_workers()
+            if time.time() >= deadline:
+                raise MantaError("timed out waiting for a signing process "
+                    "(%ss)" % self.timeout)
+        return pending.result()
+
+    def _check_workers(self):
+        """Close the signer if a worker process has died: the batch it was
+        signing is lost, and it isn't known which one that was.
+        """
+        self._lock.acquire()
+        try:
+            if self._pool is None or _pool_pids(self._pool) == self._pids:
+                return
+        finally:
+            self._lock.release()
+        log.warning("a signing process died: closing ProcessPoolSigner")
+        self.close(MantaError("a signing process died"))
+
+    def _dispatch(self):
+        """Send waiting strings to free workers, in batches. Called with
+        `_lock` held.
+        """
+        key_info = self._get_key_info()
+        hash_algo = key_info["algorithm"].split('-')[1]
+        while self._waiting and self._free:
+            # Spread what's waiting over the free workers.
+            size = -(-len(self._waiting) // self._free)
+            batch = self._waiting[:min(size, self.batch_size)]
+            del self._waiting[:len(batch)]
+            self._free -= 1
+            self._in_flight[id(batch)] = batch
+            def done(result, batch=batch):
+                self._batch_done(batch, result)
+            self._pool.apply_async(_sign_batch,
+                ([s for s, _ in batch], hash_algo), callback=done)
+
+    def _batch_done(self, batch, result):
+        self._lock.acquire()
+        try:
+            if self._in_flight.pop(id(batch), None) is None:
+                return   # already failed by `close()`
+        finally:
+            self._lock.release()
+        key_info = self._get_key_info()
+        error, signatures = result
+        for i, (s, pending) in enumerate(batch):
+            if error:
+                pending.set_error(MantaError(
+                    "signing process error: %s" % error))
+            else:
+                pending.set((key_info["algorithm"], key_info["fingerprint"],
+                    signatures[i]))
+        self._lock.acquire()
+        try:
+            self._free += 1
+            self._dispatch()
+        finally:
+            self._lock.release()
+
+    def close(self, error=None):
+        """Stop the worker processes. Signatures still being made fail with
+        a `MantaError`.
+
+        @param error {MantaError} Optional. The error to fail them with.
+        """
+        self._lock.acquire()
+        try:
+            pool = self._pool
+            self._pool = self._pids = None
+            pending = [p for _, p in self._waiting]
+            for batch in self._in_flight.values():
+                pending += [p for _, p in batch]
+            self._waiting = []
+            self._in_flight = {}
+            self._free = self.processes
+        finally:
+            self._lock.release()
+        if pool is not None:
+            _terminate_pool(pool)
+        error = error or MantaError("ProcessPoolSigner was closed")
+        for p in pending:
+            p.set_error(error)
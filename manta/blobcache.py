@@ -0,0 +1,339 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""A local, content-addressed cache of Manta objects.
+
+Usage:
+
+    cache = manta.BlobCache(max_size=10 * 1024 * 1024 * 1024)
+    client = manta.MantaClient(url, account, signer, blob_cache=cache)
+    client.get_object('/trent/stor/ref.dat', path='ref.dat')  # 200: cached
+    client.get_object('/trent/stor/ref.dat', path='ref.dat')  # 304: from disk
+
+Objects are stored once per distinct content (keyed by Content-MD5, else by
+ETag), with a small index entry per Manta path recording the ETag to
+revalidate with ("If-None-Match"). A 304 response is served from the cached
+blob: copied when writing to a local path, or hard linked with `link=True`
+so the bytes are never copied through Python. Copying is the default
+because a linked file *is* the cached blob: editing it in place would
+change what the cache serves for every path with that content.
+
+Layout of the cache dir:
+
+    blobs/ab/abcdef...      # read-only blob files, named by content hash
+    index/12/12345....json  # one entry per Manta URL
+    tmp/                    # in-progress writes, renamed into place
+
+All updates are write-to-temp-then-rename, so several processes can share
+one cache dir. The cache is kept under `max_size` bytes by evicting the
+least recently used blobs (by mtime, which is touched on every hit).
+"""
+
+import sys
+import os
+from os.path import exists, join, dirname
+import logging
+import json
+import hashlib
+import base64
+import errno
+import tempfile
+import threading
+import binascii
+
+from . import appdirs
+from . import errors
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None   # Windows: eviction isn't serialized across processes
+
+
+
+#---- globals
+
+log = logging.getLogger("manta.blobcache")
+DEFAULT_BLOB_CACHE_DIR = appdirs.user_cache_dir(
+    "python-manta", "Joyent", "blobs")
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024   # 1 GiB
+
+# The response headers kept in an index entry, to rebuild a response
+# for a 304.
+_KEPT_HEADERS = ("content-type", "content-md5", "content-length", "etag",
+    "last-modified", "durability-level")
+
+
+
+#---- exports
+
+class BlobCache(object):
+    """A local object cache for `RawMantaClient.get_object2()`.
+
+    @param cache_dir {str} Optional. Default is a "python-manta/blobs" dir
+        in the user cache dir.
+    @param max_size {int} Optional. Default 1 GiB. Max total size (in
+        bytes) of cached blobs.
+    @param link {bool} Optional. Default false. Hard link cached blobs into
+        place for `get_object(..., path=...)` (falling back to a copy where
+        hard links aren't possible) instead of copying them. The linked file
+        is read-only and *is* the cached blob: if it is made writable and
+        edited in place, later reads from the cache get the edited content.
+        Only use this if the files are never modified.
+    """
+    chunk_size = 65536
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_MAX_SIZE, link=False):
+        self.cache_dir = cache_dir or DEFAULT_BLOB_CACHE_DIR
+        self.max_size = max_size
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        self._size = None   # lazily computed estimate of total blob size
+        for d in ("blobs", "index", "tmp"):
+            _mkdirp(join(self.cache_dir, d))
+
+    def _index_path(self, url):
+        h = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return join(self.cache_dir, "index", h[:2], h + ".json")
+
+    def blob_path(self, entry):
+        name = entry["blob"]
+        return join(self.cache_dir, "blobs", name[:2], name)
+
+    def lookup(self, url):
+        """Return the index entry for the given object URL if its blob is
+        still cached, else None.
+        """
+        try:
+            f = open(self._index_path(url))
+            try:
+                entry = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return None
+        if not exists(self.blob_path(entry)):
+            return None
+        return entry
+
+    def response_headers(self, entry):
+        """Return the cached response headers (as for a 200) for `entry`."""
+        headers = dict(entry["headers"])
+        headers["status"] = "200"
+        return headers
+
+    def hit(self, entry):
+        """Mark the entry's blob as recently used."""
+        self.hits += 1
+        try:
+            os.utime(self.blob_path(entry), None)
+        except OSError:
+            pass
+
+    def store(self, url, res, stream):
+        """Store a 200 response body from `stream` (a `MantaStream`) for
+        the given object URL. The body is written straight to disk.
+
+        @returns {dict} The index entry, or None if the response can't be
+            cached (it has neither Content-MD5 nor ETag).
+        """
+        self.misses += 1
+        decoded = "-content-encoding" in res
+        fd, tmp_path = tempfile.mkstemp(dir=join(self.cache_dir, "tmp"))
+        f = os.fdopen(fd, 'wb')
+        try:
+            try:
+                md5 = hashlib.md5()
+                size = 0
+                for chunk in stream.iter_chunks():
+                    f.write(chunk)
+                    md5.update(chunk)
+                    size += len(chunk)
+            finally:
+                f.close()
+            if not decoded:
+                if size != int(res.get("content-length", size)):
+                    raise errors.MantaError("content-length mismatch for "
+                        "%s: expected %s, got %d"
+                        % (url, res["content-length"], size))
+                content_md5 = base64.b64encode(md5.digest())
+                if (res.get("content-md5")
+                    and content_md5 != res["content-md5"]):
+                    raise errors.MantaError("content-md5 mismatch for %s: "
+                        "expected %s, got %s"
+                        % (url, res["content-md5"], content_md5))
+
+            if res.get("content-md5") and not decoded:
+                blob = binascii.hexlify(base64.b64decode(res["content-md5"]))
+            elif res.get("etag"):
+                blob = "etag-" + hashlib.sha1(res["etag"]).hexdigest()
+            else:
+                return None
+            entry = {
+                "url": url,
+                "etag": res.get("etag"),
+                "blob": blob,
+                "size": size,
+                "headers": dict((k, res[k]) for k in _KEPT_HEADERS
+                    if k in res),
+            }
+            if decoded:
+                entry["headers"]["-content-encoding"] = \
+                    res["-content-encoding"]
+                entry["headers"]["content-length"] = str(size)
+
+            blob_path = self.blob_path(entry)
+            _mkdirp(dirname(blob_path))
+            os.chmod(tmp_path, 0o444)
+            if exists(blob_path):
+                os.utime(blob_path, None)  # same content already cached
+            else:
+                _rename(tmp_path, blob_path)
+                tmp_path = None
+                self._added(size)
+            self._write_entry(url, entry)
+            return entry
+        finally:
+            if tmp_path is not None:
+                _unlink(tmp_path)
+
+    def _write_entry(self, url, entry):
+        index_path = self._index_path(url)
+        _mkdirp(dirname(index_path))
+        fd, tmp_path = tempfile.mkstemp(dir=join(self.cache_dir, "tmp"))
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(entry, f)
+        finally:
+            f.close()
+        _rename(tmp_path, index_path)
+
+    def read(self, entry):
+        """Return the content of the entry's blob."""
+        f = open(self.blob_path(entry), 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def copy_to(self, entry, path):
+        """Put the entry's blob content at the given local path: a hard
+        link if `self.link` and possible, else a copy.
+        """
+        blob_path = self.blob_path(entry)
+        # Unique per thread, as threads may copy to the same path. (Not
+        # `mkstemp()`: `os.link()` needs a name that doesn't exist.)
+        tmp_path = join(dirname(os.path.abspath(path)),
+            ".%s.%d.%d.tmp" % (os.path.basename(path), os.getpid(),
+                threading.current_thread().ident))
+        linked = False
+        if self.link and hasattr(os, "link"):
+            try:
+                os.link(blob_path, tmp_path)
+                linked = True
+            except OSError:
+                _, ex, _ = sys.exc_info()
+                if ex.errno == errno.ENOENT:
+                    raise   # evicted
+                log.debug("could not link %s (%s), copying", blob_path, ex)
+        if not linked:
+            src = open(blob_path, 'rb')
+            try:
+                dst = open(tmp_path, 'wb')
+                try:
+                    while True:
+                        chunk = src.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                finally:
+                    dst.close()
+            finally:
+                src.close()
+        _rename(tmp_path, path)
+        if linked and exists(tmp_path):
+            # `path` was already a link to the blob: rename() is then a
+            # no-op that leaves `tmp_path` in place.
+            _unlink(tmp_path)
+
+    def _added(self, size):
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += size
+        if self._size > self.max_size:
+            self.evict()
+
+    def _scan(self):
+        """Return (blobs, total_size) where `blobs` is a list of
+        (mtime, size, path) for all cached blobs.
+        """
+        blobs = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(
+                join(self.cache_dir, "blobs")):
+            for name in filenames:
+                p = join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue   # concurrently evicted
+                blobs.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+        return blobs, total
+
+    def evict(self, target=None):
+        """Evict least recently used blobs until the total size is at most
+        `target` (default 90% of `max_size`). Index entries for evicted
+        blobs are left to be ignored (see `lookup`).
+        """
+        if target is None:
+            target = int(self.max_size * 0.9)
+        lock = open(join(self.cache_dir, "lock"), 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            blobs, total = self._scan()
+            blobs.sort()
+            for mtime, size, p in blobs:
+                if total <= target:
+                    break
+                log.debug("evict %s (%d bytes)", p, size)
+                _unlink(p)
+                total -= size
+            self._size = total
+        finally:
+            lock.close()   # releases the flock
+
+    def stats(self):
+        """Return a dict of the cache counters."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+
+#---- internal support stuff
+
+def _mkdirp(d):
+    if not exists(d):
+        try:
+            os.makedirs(d)
+        except OSError:
+            if not exists(d):   # lost a race is fine
+                raise
+
+def _unlink(p):
+    try:
+        os.remove(p)
+    except OSError:
+        pass
+
+def _rename(src, dst):
+    """Atomic (on POSIX) rename, overwriting `dst`."""
+    try:
+        os.rename(src, dst)
+    except OSError:
+        if sys.platform != "win32" or not exists(dst):
+            raise
+        # Windows can't rename over an existing file.
+        _unlink(dst)
+        os.rename(src, dst)
@@ -13,25 +13,35 @@ from operator import itemgetter
 import hashlib
 import datetime
 import base64
+import zlib
+import errno
+import threading
+import time
+from io import BytesIO
+import random
+import socket
+from collections import deque
 
 from . import appdirs
 from .version import __version__
 from . import errors
-
-import httplib2
-
-
+from .httpcache import http_cache_from_spec
 
 #---- Python version compat
 
 try:
     # Python 3
-    from urllib.parse import urlencode
+    from urllib.parse import urlencode, urlsplit
     from urllib.parse import quote as urlquote
+    from queue import Queue, Empty, Full
+    import http.client as httplib
 except ImportError:
     # Python 2
     from urllib import urlencode
     from urllib import quote as urlquote
+    from urlparse import urlsplit
+    from Queue import Queue, Empty, Full
+    import httplib
 
 
 
@@ -42,6 +52,10 @@ DEFAULT_HTTP_CACHE_DIR = appdirs.user_cache_dir(
     "python-manta", "Joyent", "http")
 DEFAULT_USER_AGENT = "python-manta/%s (%s) Python/%s" % (
     __version__, sys.platform, sys.version.split(None, 1)[0])
+# Connection-level errors on which a request may be retried.
+RETRYABLE_ERRORS = (socket.error, httplib.HTTPException)
+# Seconds for which a signed URL (see `sign_url`) is valid by default.
+DEFAULT_SIGNED_URL_EXPIRY = 3600
 
 
 
@@ -62,6 +76,17 @@ elif sys.version_info[0] >= 3:
     base_string_type = str
     unichr = chr
 
+if py3:
+    def _reraise(exc_info):
+        """Re-raise an exception from `sys.exc_info()` with its traceback."""
+        raise exc_info[1].with_traceback(exc_info[2])
+else:
+    # The three-arg raise is a syntax error in Py3.
+    exec("""def _reraise(exc_info):
+        \"""Re-raise an exception from `sys.exc_info()` with its traceback.\"""
+        raise exc_info[0], exc_info[1], exc_info[2]
+""")
+
 
 
 #---- internal support stuff
@@ -80,32 +105,444 @@ def http_date(d=None):
 def _indent(s, indent='    '):
     return indent + indent.join(s.splitlines(True))
 
-class MantaHttp(httplib2.Http):
-    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey):
-        if log.isEnabledFor(logging.DEBUG):
-            body_str = body or '(none)'
-            if body and len(body) > 1024:
-                body_str = body[:1021] + '...'
-            log.debug("req: %s %s\n%s", method, request_uri,
-                '\n'.join([
-                    _indent("host: " + host),
-                    _indent("headers: " + pformat(headers)),
-                    #_indent("cachekey: " + pformat(cachekey)), #XXX
-                    _indent("body: " + body_str)
-                ]))
-        res, content = httplib2.Http._request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey)
-        if log.isEnabledFor(logging.DEBUG):
-            log.debug("res: %s %s\n%s\n%s", method, request_uri,
-                _indent(pformat(res)),
-                (len(content) < 1024 and _indent(content)
-                 or _indent(content[:1021]+'...')))
-        return (res, content)
+def _content_range_start(content_range):
+    """Return the first byte position of a "Content-Range: bytes A-B/N"
+    header value, or None if it can't be parsed.
+    """
+    try:
+        unit, spec = (content_range or "").split(None, 1)
+        if unit != "bytes":
+            return None
+        return int(spec.split("-", 1)[0])
+    except ValueError:
+        return None
+
+def _md5_file(path, chunk_size=65536):
+    """Return an md5 object updated with the content of the given file."""
+    md5 = hashlib.md5()
+    f = open(path, 'rb')
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            md5.update(chunk)
+    finally:
+        f.close()
+    return md5
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _dirent_from_head(mpath, res):
+    """Return a dirent, as in a directory listing, from the response to a
+    HEAD of the given Manta path.
+    """
+    dirent = {"name": ubasename(mpath)}
+    if "last-modified" in res:
+        import email.utils
+        t = email.utils.parsedate(res["last-modified"])
+        if t:
+            dirent["mtime"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", t)
+    if "type=directory" in res.get("content-type", ""):
+        dirent["type"] = "directory"
+    else:
+        dirent["type"] = "object"
+        dirent["size"] = int(res.get("content-length", 0))
+        for header in ("etag", "content-md5", "content-type"):
+            if header in res:
+                dirent[header] = res[header]
+    return dirent
+
+def _gzip_chunks(read, level=6, chunk_size=1024*1024):
+    """Generate gzip-compressed chunks of the data from `read(size)`.
+
+    Reading and compression happen in a worker thread, a few chunks ahead
+    of the consumer, so that (GIL-releasing) compression overlaps with the
+    consumer sending the chunks on the network. Closing the generator stops
+    the worker thread and waits for it, so that `read` isn't used after.
+    """
+    q = Queue(maxsize=4)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, True, 0.1)
+            except Full:
+                continue
+            else:
+                return
+
+    def produce():
+        try:
+            z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            while not stop.is_set():
+                data = read(chunk_size)
+                if not data:
+                    put(("data", z.flush()))
+                    break
+                data = z.compress(data)
+                if data:
+                    put(("data", data))
+            put(("end", None))
+        except Exception:
+            put(("error", sys.exc_info()[1]))
+
+    t = threading.Thread(target=produce, name="manta-gzip")
+    t.daemon = True
+    t.start()
+    try:
+        while True:
+            kind, item = q.get()
+            if kind == "end":
+                break
+            elif kind == "error":
+                raise item
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+def _error_code(content_type, content):
+    """Return the Manta error code (e.g. "ResourceNotFound") from an error
+    response body, or None.
+    """
+    if content_type != "application/json":
+        return None
+    try:
+        return json.loads(content).get("code")
+    except (ValueError, AttributeError):
+        return None
+
+def _path_class(path):
+    """Return the class of a Manta path, for grouping requests: the
+    top-level dir under the account (e.g. "stor", "public", "jobs"), or
+    "account".
+    """
+    parts = path.split('/', 3)
+    return len(parts) > 2 and parts[2] or "account"
 
+# The record (see `RawMantaClient.add_request_hook`) of the request being
+# made on this thread, if it is being timed.
+_timing = threading.local()
+
+class MantaStream(object):
+    """A response body being read incrementally from an open connection.
+    See `RawMantaClient._stream_request`.
+
+    A gzip "Content-Encoding" is decoded incrementally as the body is read.
+    `wire_bytes` and `bytes` count the body bytes read off the connection
+    and returned to the caller, respectively.
+
+    The stream owns its connection: call `close()` when done (reading to
+    the end does *not* close it).
+    """
+    chunk_size = 65536
+    record = None   # the request's timing record, if any
+    # The body read so far of an error (>= 400) response being timed.
+    error_content = None
+
+    def __init__(self, conn, response, on_close=None, on_release=None):
+        self.conn = conn
+        self.response = response
+        self.on_close = on_close
+        self.on_release = on_release
+        self.wire_bytes = 0
+        self.bytes = 0
+        self.gzipped = (response.getheader("content-encoding") == "gzip")
+        if self.gzipped:
+            # 16 + MAX_WBITS: expect a gzip header and trailer.
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            self._decompressor = None
+        self._buf = ''
+        self._eof = False
+        self._closed = False
+
+    def _read_raw(self, size=None):
+        if size is None:
+            data = self.response.read()
+        else:
+            data = self.response.read(size)
+        self.wire_bytes += len(data)
+        return data
+
+    def read(self, size=None):
+        if self._decompressor is None:
+            data = self._read_raw(size)
+            self.bytes += len(data)
+            if self.error_content is not None:
+                self.error_content.append(data)
+            return data
+
+        chunks = [self._buf]
+        have = len(self._buf)
+        while not self._eof and (size is None or have < size):
+            raw = self._read_raw(self.chunk_size)
+            if raw:
+                data = self._decompressor.decompress(raw)
+            else:
+                data = self._decompressor.flush()
+                self._eof = True
+            chunks.append(data)
+            have += len(data)
+        data = ''.join(chunks)
+        if size is None or len(data) <= size:
+            self._buf = ''
+        else:
+            data, self._buf = data[:size], data[size:]
+        self.bytes += len(data)
+        if self.error_content is not None:
+            self.error_content.append(data)
+        return data
+
+    def iter_chunks(self):
+        """Generate raw chunks of the body until EOF."""
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def iter_lines(self):
+        """Generate the non-empty lines of the body, without the trailing
+        '\r\n' or '\n'. Only one chunk (plus a partial line) is held in
+        memory at a time.
+        """
+        partial = ''
+        for chunk in self.iter_chunks():
+            lines = (partial + chunk).split('\n')
+            partial = lines.pop()
+            for line in lines:
+                line = line.rstrip('\r')
+                if line:
+                    yield line
+        partial = partial.rstrip('\r')
+        if partial:
+            yield partial
+
+    def close(self):
+        """Close the stream. If the body was read to the end and the
+        server allows it, the connection is handed to the `on_release`
+        callback for reuse, else it is closed.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        reusable = (self.response.isclosed() and not self.response.will_close
+                    and self.on_release is not None)
+        try:
+            self.response.close()
+        finally:
+            if reusable:
+                self.on_release(self.conn)
+            else:
+                self.conn.close()
+            if self.on_close is not None:
+                self.on_close(self)
 
 
 
 #---- exports
 
+class HedgePolicy(object):
+    """An opt-in policy for "hedging" idempotent reads (GetObject,
+    ListDirectory) to cut tail latency.
+
+    If the first attempt has not produced response headers within a
+    deadline, a second identical request is sent. Whichever produces
+    headers first is used and the other is discarded. The deadline is the
+    `percentile` of recently observed time-to-headers latencies, so only
+    roughly `100 - percentile` percent of requests are hedged.
+
+    Usage:
+        policy = HedgePolicy(percentile=95)
+        client = MantaClient(url, account, signer, hedge_policy=policy)
+        ...
+        print(policy.stats())
+
+    @param percentile {float} Optional. Default 95. The latency percentile
+        used as the hedging deadline.
+    @param min_samples {int} Optional. Default 20. No hedging is done until
+        this many latencies have been observed.
+    @param window {int} Optional. Default 200. The number of most recent
+        latencies from which the percentile is computed.
+    @param min_delay {float} Optional. Default 0.005. A floor (in seconds)
+        on the hedging deadline.
+    @param max_delay {float} Optional. A cap (in seconds) on the hedging
+        deadline.
+    """
+    def __init__(self, percentile=95, min_samples=20, window=200,
+                 min_delay=0.005, max_delay=None):
+        assert 0 < percentile < 100, "bogus percentile: %r" % percentile
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.hedges_issued = 0
+        self.hedges_won = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Return the current hedging deadline in seconds, or None if
+        there isn't yet enough data to hedge.
+        """
+        self._lock.acquire()
+        try:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        finally:
+            self._lock.release()
+        idx = min(len(latencies) - 1,
+                  int(len(latencies) * self.percentile / 100.0))
+        d = max(latencies[idx], self.min_delay)
+        if self.max_delay is not None:
+            d = min(d, self.max_delay)
+        return d
+
+    def record(self, latency):
+        """Record a time-to-headers latency (in seconds)."""
+        self._lock.acquire()
+        try:
+            self._latencies.append(latency)
+        finally:
+            self._lock.release()
+
+    def count(self, hedged=False, won=False):
+        self._lock.acquire()
+        try:
+            self.requests += 1
+            if hedged:
+                self.hedges_issued += 1
+            if won:
+                self.hedges_won += 1
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dict of the hedging counters."""
+        return {
+            "requests": self.requests,
+            "hedges_issued": self.hedges_issued,
+            "hedges_won": self.hedges_won,
+            "delay": self.delay(),
+        }
+
+
+class RetryPolicy(object):
+    """A policy for retrying failed Manta requests.
+
+    A request is retried (as a whole, with a fresh signature) if it fails
+    with a connection-level error (reset, refused, timeout, ...) or one of
+    the `retry_statuses`, *and* the operation is idempotent, *and* attempts
+    and the retry budget remain. Delays between attempts use capped
+    exponential backoff with "full jitter".
+
+    The retry budget limits retries to about `budget_ratio` of all
+    requests (plus a small reserve of `budget_reserve`), so that retries
+    don't multiply load on a service that is already overloaded.
+
+    Usage:
+        policy = RetryPolicy(max_attempts=4)
+        client = MantaClient(url, account, signer, retry_policy=policy)
+
+    @param max_attempts {int} Optional. Default 4. Total attempts per
+        request, including the first.
+    @param base_delay {float} Optional. Default 0.1. Seconds. The backoff
+        cap before the first retry; doubled for each subsequent retry.
+    @param max_delay {float} Optional. Default 10. Seconds. The maximum
+        backoff delay.
+    @param budget_ratio {float} Optional. Default 0.1.
+    @param budget_reserve {int} Optional. Default 10.
+    """
+    # Operations that are safe to repeat. Notably *not* CreateJob (a retry
+    # could create a second job) and AddJobInputs (could add duplicate
+    # inputs).
+    idempotent_ops = set([
+        "PutDirectory", "ListDirectory", "HeadDirectory", "DeleteDirectory",
+        "PutObject", "GetObject", "HeadObject", "DeleteObject", "PutSnapLink",
+        "ListJobs", "GetJob", "GetJobOutput", "GetJobInput",
+        "GetJobFailures", "GetJobErrors", "EndJobInput", "CancelJob",
+    ])
+    # Used for requests without a known operation name.
+    idempotent_methods = set(["GET", "HEAD", "PUT", "DELETE"])
+    retry_statuses = set(["500", "502", "503", "504"])
+
+    def __init__(self, max_attempts=4, base_delay=0.1, max_delay=10.0,
+                 budget_ratio=0.1, budget_reserve=10):
+        assert max_attempts >= 1, "bogus max_attempts: %r" % max_attempts
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_reserve = budget_reserve
+        self.retries = 0
+        self.budget_exhausted = 0
+        self._tokens = float(budget_reserve)
+        self._lock = threading.Lock()
+
+    def is_idempotent(self, op, method):
+        if op is not None:
+            return op in self.idempotent_ops
+        return method in self.idempotent_methods
+
+    def deposit(self):
+        """Called once per request to add to the retry budget."""
+        self._lock.acquire()
+        try:
+            self._tokens = min(self._tokens + self.budget_ratio,
+                               self.budget_reserve)
+        finally:
+            self._lock.release()
+
+    def should_retry(self, op, method, attempt):
+        """Return true if the given failed `attempt` (1-based) should be
+        retried. Takes a token from the retry budget if so.
+        """
+        if attempt >= self.max_attempts or not self.is_idempotent(op, method):
+            return False
+        self._lock.acquire()
+        try:
+            if self._tokens < 1:
+                self.budget_exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+            return True
+        finally:
+            self._lock.release()
+
+    def backoff(self, attempt, retry_after=None):
+        """Return the delay (in seconds) before the next attempt.
+
+        @param attempt {int} The 1-based number of the attempt that failed.
+        @param retry_after {str} Optional. A "Retry-After" response header
+            value. If it is a number of seconds it is used as a minimum.
+        """
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, cap)
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_delay))
+            except ValueError:
+                pass  # HTTP-date form: ignore
+        return delay
+
+    def stats(self):
+        """Return a dict of the retry counters."""
+        return {
+            "retries": self.retries,
+            "budget_exhausted": self.budget_exhausted,
+        }
+
+
 class RawMantaClient(object):
     """A raw client for accessing the Manta REST API. Here "raw" means that
     the API is limited to the strict set of endpoints in the REST API. No
@@ -122,14 +559,38 @@ class RawMantaClient(object):
     @param user_agent {str} Optional. User-Agent header string.
     @param cache_dir {str} Optional. A dir to use for HTTP caching. It will
         be created as needed.
+    @param http_cache {str|object} Optional. Default "disk". The HTTP cache
+        backend: "none", "memory" (a bounded in-process LRU), "disk" (a
+        bounded `DiskCache` in `cache_dir`) or a cache object with
+        httplib2's cache interface. See `manta.httpcache`.
     @param disable_ssl_certificate_validation {bool} Default false.
     @param verbose {bool} Optional. Default false. If true, then will log
         debugging info.
+    @param hedge_policy {HedgePolicy} Optional. If given, GetObject and
+        ListDirectory requests are hedged. See `HedgePolicy`. Note that
+        hedged requests bypass the HTTP cache.
+    @param retry_policy {RetryPolicy} Optional. If given, requests that
+        fail with a connection error or a transient status (e.g. 503) are
+        retried per the policy. See `RetryPolicy`. Default is no retries.
+    @param gzip {bool} Optional. Default true. Ask for gzip-encoded
+        directory listings and job input/output/error/failure streams. They
+        are decoded incrementally. See `transfer_stats()` for the savings.
+    @param blob_cache {manta.blobcache.BlobCache} Optional. A local object
+        cache for GetObject. Cached objects are revalidated by ETag and a
+        304 is served from the cache.
+    @param manifest {manta.manifest.ChecksumManifest} Optional. Recorded
+        Content-MD5 values for local files, used by `put_object(...,
+        path=...)` to skip hashing unchanged files.
+    @param metrics {manta.metrics.ClientMetrics} Optional. If given,
+        request latencies, errors, bytes and cache hit rates are
+        aggregated in it.
     """
     def __init__(self, url, account, sign=None, signer=None,
             user_agent=None, cache_dir=None,
             disable_ssl_certificate_validation=False,
-            verbose=False):
+            verbose=False, hedge_policy=None, retry_policy=None,
+            gzip=True, blob_cache=None, http_cache="disk", manifest=None,
+            metrics=None):
         assert account, 'account'
         # Prefer 'signer', but accept 'sign' a la node-manta.
         assert signer or sign, 'signer'
@@ -138,8 +599,29 @@ class RawMantaClient(object):
         self.account = account
         self.signer = signer or sign
         self.cache_dir = cache_dir or DEFAULT_HTTP_CACHE_DIR
+        self.http_cache = http_cache_from_spec(http_cache, self.cache_dir)
         self.user_agent = user_agent or DEFAULT_USER_AGENT
         self.disable_ssl_certificate_validation = disable_ssl_certificate_validation
+        self.hedge_policy = hedge_policy
+        self.retry_policy = retry_policy
+        self.gzip = gzip
+        self.blob_cache = blob_cache
+        self.manifest = manifest
+        self._transfer_stats = {
+            "responses": 0,
+            "gzip_responses": 0,
+            "wire_bytes": 0,
+            "bytes": 0,
+        }
+        self._transfer_stats_lock = threading.Lock()
+        self._idle_connections = {}
+        self._idle_connections_lock = threading.Lock()
+        self._request_hooks = []
+        self.metrics = metrics
+        if metrics is not None:
+            self.add_request_hook(metrics.record_request)
+            metrics.add_cache("http", self.http_cache)
+            metrics.add_cache("blob", self.blob_cache)
         if verbose:
             # TODO: log should be `self.log`
             global log
@@ -147,20 +629,107 @@ class RawMantaClient(object):
             import manta.auth
             manta.auth.log.setLevel(logging.DEBUG)
 
-    _http_cache = None
+    _http_local = None
     def _get_http(self):
-        if not self._http_cache:
-            if not exists(self.cache_dir):
-                os.makedirs(self.cache_dir)
-            self._http_cache = MantaHttp(self.cache_dir,
+        """Get the `MantaHttp` for the current thread. `httplib2.Http`
+        objects are not thread-safe, so each thread gets its own (sharing
+        the same HTTP cache).
+        """
+        if self._http_local is None:
+            self._http_local = threading.local()
+        http = getattr(self._http_local, "http", None)
+        if http is None:
+            from .mantahttp import MantaHttp
+            http = self._http_local.http = MantaHttp(self.http_cache,
                 disable_ssl_certificate_validation=self.disable_ssl_certificate_validation)
-        return self._http_cache
+        return http
+
+    def add_request_hook(self, hook):
+        """Register a function to be called with a record of each request
+        (each attempt, if retried or hedged) when it completes.
+
+        The record is a dict with:
+            method, op, path  The request method, Manta operation name
+                    (e.g. "GetObject") and path.
+            path_class  The top-level dir under the account, e.g. "stor",
+                    "public" or "jobs".
+            status  The response status (an int), or None if the request
+                    failed with an exception...
+            error   ... which is then given here.
+            error_code  For an error response, the Manta error code (e.g.
+                    "ResourceNotFound") if the body gives one, else None.
+            from_cache  True if the response was served from the HTTP
+                    cache (possibly after a 304 revalidation).
+            bytes_out, bytes_in  Request and response body sizes. For a
+                    streamed response `bytes_in` is the bytes read off the
+                    wire before it was closed.
+            start   The start time, a la `time.time()`.
+            sign    Seconds spent signing the request.
+            connect Seconds spent connecting (including any TLS handshake),
+                    or None if a kept-alive connection was reused.
+            ttfb    Seconds from `start` to the response headers, or None.
+            total   Seconds from `start` to completion. For a streamed
+                    response that is when the stream was closed.
+
+        Hooks are called on the thread that made the request (or, for a
+        streamed response, that closed it). With no hooks registered,
+        requests aren't timed.
+
+        @param hook {callable} Called as `hook(record)`. Exceptions from it
+            are logged and ignored.
+        """
+        self._request_hooks = self._request_hooks + [hook]
 
-    def _request(self, path, method="GET", query=None, body=None, headers=None):
-        """Make a Manta request
+    def remove_request_hook(self, hook):
+        """Unregister a hook added with `add_request_hook`."""
+        self._request_hooks = [h for h in self._request_hooks
+            if h != hook]
 
-        ...
-        @returns (res, content)
+    def _new_request_record(self, method, path, op):
+        """Return a new timing record for a request if there are request
+        hooks, else None.
+        """
+        if not self._request_hooks:
+            return None
+        return {
+            "method": method,
+            "op": op,
+            "path": path,
+            "path_class": _path_class(path),
+            "status": None,
+            "error": None,
+            "error_code": None,
+            "from_cache": False,
+            "bytes_out": 0,
+            "bytes_in": 0,
+            "start": time.time(),
+            "sign": 0.0,
+            "connect": None,
+            "ttfb": None,
+            "total": None,
+        }
+
+    def _emit_request_record(self, record, res=None, error=None):
+        if res is not None:
+            record["status"] = res.status
+            record["from_cache"] = bool(getattr(res, "fromcache", False))
+        record["error"] = error
+        record["total"] = time.time() - record["start"]
+        for hook in self._request_hooks:
+            try:
+                hook(record)
+            except Exception:
+                _, ex, _ = sys.exc_info()
+                log.warning("error in request hook %r: %s", hook, ex)
+
+    def _prepare_request(self, path, query=None, body=None, headers=None,
+                         record=None):
+        """Build the URL, body and (signed) headers for a Manta request.
+
+        @param record {dict} Optional. A timing record (see
+            `add_request_hook`) in which to note the signing time and
+            body size.
+        @returns (url, body, headers)
         """
         assert path.startswith('/'), "bogus path: %r" % path
 
@@ -168,7 +737,6 @@ class RawMantaClient(object):
         if query:
             qpath += '?' + urlencode(query)
         url = self.url + qpath
-        http = self._get_http()
 
         ubody = body
         if body is not None and isinstance(body, dict):
@@ -181,12 +749,346 @@ class RawMantaClient(object):
         if "Date" not in headers:
             headers["Date"] = http_date()
         sigstr = 'date: ' + headers["Date"]
-        algorithm, fingerprint, signature = self.signer.sign(sigstr)
+        if record is None:
+            algorithm, fingerprint, signature = self.signer.sign(sigstr)
+        else:
+            start = time.time()
+            algorithm, fingerprint, signature = self.signer.sign(sigstr)
+            record["sign"] = time.time() - start
+            record["bytes_out"] = ubody and len(ubody) or 0
         headers["Authorization"] = \
             'Signature keyId="/%s/keys/%s",algorithm="%s",signature="%s"' % (
                 self.account, fingerprint, algorithm, signature)
+        return url, ubody, headers
+
+    def _request(self, path, method="GET", query=None, body=None, headers=None,
+                 op=None):
+        """Make a Manta request
+
+        ...
+        @param op {str} Optional. The Manta API operation name, e.g.
+            "GetObject". Used for retry decisions (see `RetryPolicy`).
+        @returns (res, content)
+        """
+        def send(headers):
+            record = self._new_request_record(method, path, op)
+            url, ubody, headers = self._prepare_request(path, query=query,
+                body=body, headers=headers, record=record)
+            if record is None:
+                return self._get_http().request(url, method, ubody, headers)
+            _timing.record = record
+            try:
+                res, content = self._get_http().request(url, method, ubody,
+                    headers)
+            except Exception:
+                _, ex, _ = sys.exc_info()
+                self._emit_request_record(record, error=ex)
+                raise
+            finally:
+                _timing.record = None
+            record["bytes_in"] = len(content)
+            if res.status >= 400:
+                record["error_code"] = _error_code(res.get("content-type"),
+                    content)
+            self._emit_request_record(record, res)
+            return res, content
+        return self._send_with_retries(send, method, op, headers)
+
+    def _stream_request(self, path, method="GET", query=None, body=None,
+                        headers=None, op=None, body_chunks=None):
+        """Make a Manta request, returning as soon as the response headers
+        are in. The response body is *not* read.
+
+        This bypasses httplib2 (and hence the HTTP cache). Connections are
+        kept alive and reused between streamed requests (see
+        `_get_connection`). It is intended for potentially huge responses
+        (e.g. job input/output streams, directory listings) that should be
+        processed incrementally.
+
+        @param body_chunks {callable} Optional. Instead of `body`, a
+            function returning an iterable of body chunks to send with
+            "Transfer-Encoding: chunked". It is called once per attempt.
+        @returns (res, stream) {2-tuple} `res` is an httplib2 Response (a
+            dict of the headers, plus "status"), `stream` is a `MantaStream`
+            from which to read the body. The caller must close `stream`.
+            As with httplib2, if the body is gzip-decoded then the
+            "content-encoding" header is renamed to "-content-encoding".
+        """
+        from httplib2 import Response, urlnorm
+
+        def send_on(conn, request_uri, ubody, headers, record):
+            if body_chunks is None:
+                conn.request(method, request_uri, ubody, headers)
+            else:
+                conn.putrequest(method, request_uri)
+                for name, value in headers.items():
+                    conn.putheader(name, value)
+                conn.putheader("Transfer-Encoding", "chunked")
+                conn.endheaders()
+                for chunk in body_chunks():
+                    if chunk:
+                        conn.send("%x\r\n%s\r\n" % (len(chunk), chunk))
+                        if record is not None:
+                            record["bytes_out"] += len(chunk)
+                conn.send("0\r\n\r\n")
+            return conn.getresponse()
+
+        def send(headers):
+            record = self._new_request_record(method, path, op)
+            url, ubody, headers = self._prepare_request(path, query=query,
+                body=body, headers=headers, record=record)
+            scheme, authority, request_uri, _ = urlnorm(url)
+            conn, reused = self._get_connection(scheme, authority)
+            if record is not None:
+                _timing.record = record
+            try:
+                try:
+                    response = send_on(conn, request_uri, ubody, headers,
+                        record)
+                except RETRYABLE_ERRORS:
+                    if not reused:
+                        raise
+                    # The server may have closed an idle kept-alive
+                    # connection. Try once more on a new one.
+                    conn.close()
+                    conn = self._get_http().new_connection(scheme, authority)
+                    response = send_on(conn, request_uri, ubody, headers,
+                        record)
+            except:
+                _, ex, _ = sys.exc_info()
+                conn.close()
+                if record is not None:
+                    _timing.record = None
+                    self._emit_request_record(record, error=ex)
+                raise
+            if record is not None:
+                _timing.record = None
+            stream = MantaStream(conn, response,
+                on_close=self._record_transfer,
+                on_release=lambda c: self._release_connection(
+                    scheme, authority, c))
+            res = Response(response)
+            if stream.gzipped:
+                res["-content-encoding"] = res.pop("content-encoding")
+            if record is not None:
+                record["status"] = res.status
+                stream.record = record
+                if res.status >= 400:
+                    stream.error_content = []
+            log.debug("res (streaming): %s %s\n%s", method, request_uri,
+                _indent(pformat(res)))
+            return res, stream
+        return self._send_with_retries(send, method, op, headers)
+
+    max_idle_connections = 8
+    def _get_connection(self, scheme, authority):
+        """Get an idle kept-alive connection for a streamed request, or a
+        new one.
+
+        @returns (conn, reused) {2-tuple}
+        """
+        self._idle_connections_lock.acquire()
+        try:
+            idle = self._idle_connections.get((scheme, authority))
+            if idle:
+                return idle.pop(), True
+        finally:
+            self._idle_connections_lock.release()
+        return self._get_http().new_connection(scheme, authority), False
+
+    def _release_connection(self, scheme, authority, conn):
+        """Return a connection (with no outstanding response) for reuse."""
+        self._idle_connections_lock.acquire()
+        try:
+            idle = self._idle_connections.setdefault((scheme, authority), [])
+            if len(idle) < self.max_idle_connections:
+                idle.append(conn)
+                return
+        finally:
+            self._idle_connections_lock.release()
+        conn.close()
+
+    def _send_with_retries(self, send, method, op, headers):
+        """Call `send(headers)` -- which makes a single request attempt and
+        returns `(res, content-or-stream)` -- retrying per `retry_policy`.
+
+        Each attempt gets a fresh copy of `headers` so it is signed anew.
+        """
+        policy = self.retry_policy
+        if policy is None:
+            return send(headers)
+        policy.deposit()
+        attempt = 1
+        while True:
+            try:
+                result = send(dict(headers or {}))
+            except RETRYABLE_ERRORS:
+                _, ex, _ = sys.exc_info()
+                if not policy.should_retry(op, method, attempt):
+                    raise
+                log.debug("retry %s %s (attempt %d): %s", method,
+                    op or "request", attempt, ex)
+                delay = policy.backoff(attempt)
+            else:
+                res = result[0]
+                if (res["status"] not in policy.retry_statuses
+                    or not policy.should_retry(op, method, attempt)):
+                    return result
+                if isinstance(result[1], MantaStream):
+                    result[1].close()
+                log.debug("retry %s %s (attempt %d): status %s", method,
+                    op or "request", attempt, res["status"])
+                delay = policy.backoff(attempt, res.get("retry-after"))
+            time.sleep(delay)
+            attempt += 1
+
+    def _record_transfer(self, stream):
+        """`MantaStream.on_close` callback to tally transfer stats (and
+        complete the request's timing record, if any).
+        """
+        if stream.record is not None:
+            stream.record["bytes_in"] = stream.wire_bytes
+            if stream.error_content is not None:
+                stream.record["error_code"] = _error_code(
+                    stream.response.getheader("content-type"),
+                    ''.join(stream.error_content))
+            self._emit_request_record(stream.record)
+        stats = self._transfer_stats
+        self._transfer_stats_lock.acquire()
+        try:
+            stats["responses"] += 1
+            if stream.gzipped:
+                stats["gzip_responses"] += 1
+            stats["wire_bytes"] += stream.wire_bytes
+            stats["bytes"] += stream.bytes
+        finally:
+            self._transfer_stats_lock.release()
+
+    def transfer_stats(self):
+        """Return counters for streamed responses (directory listings and
+        job streams): the number of responses (and how many of those were
+        gzip-encoded), and the body bytes received on the wire vs. after
+        decoding.
+        """
+        self._transfer_stats_lock.acquire()
+        try:
+            return dict(self._transfer_stats)
+        finally:
+            self._transfer_stats_lock.release()
+
+    def _encoding_headers(self, headers=None):
+        """Return `headers` plus content-coding negotiation for a
+        streamed response, per `self.gzip`.
+        """
+        headers = dict(headers or {})
+        headers["Accept-Encoding"] = self.gzip and "gzip" or "identity"
+        return headers
+
+    def _read_request(self, path, query=None, headers=None, op=None):
+        """A GET for an idempotent read. This is a plain `_request` unless
+        there is a `hedge_policy`, in which case see
+        `_hedged_stream_request`.
+
+        @returns (res, content)
+        """
+        if self.hedge_policy is None:
+            return self._request(path, "GET", query=query, headers=headers,
+                op=op)
+        res, stream = self._hedged_stream_request(path, query=query,
+            headers=headers, op=op)
+        try:
+            content = stream.read()
+        finally:
+            stream.close()
+        return res, content
+
+    def _read_stream_request(self, path, query=None, headers=None, op=None):
+        """A streaming version of `_read_request`.
+
+        @returns (res, stream)
+        """
+        if self.hedge_policy is None:
+            return self._stream_request(path, "GET", query=query,
+                headers=headers, op=op)
+        return self._hedged_stream_request(path, query=query,
+            headers=headers, op=op)
+
+    def _hedged_stream_request(self, path, query=None, headers=None, op=None):
+        """A hedged GET: if the first attempt hasn't produced headers
+        within `hedge_policy.delay()` a second attempt is started. The first
+        to produce headers wins and the other's connection is closed.
+
+        @returns (res, stream)
+        """
+        policy = self.hedge_policy
+        results = Queue()
+        lock = threading.Lock()
+        state = {"winner": None}
+
+        def attempt(idx):
+            start = time.time()
+            try:
+                res, stream = self._stream_request(path, "GET", query=query,
+                    headers=dict(headers or {}), op=op)
+            except Exception:
+                results.put((idx, None, None, sys.exc_info()))
+                return
+            policy.record(time.time() - start)
+            lock.acquire()
+            try:
+                if state["winner"] is None:
+                    state["winner"] = idx
+                lost = state["winner"] != idx
+            finally:
+                lock.release()
+            if lost:
+                stream.close()
+            else:
+                results.put((idx, res, stream, None))
 
-        return http.request(url, method, ubody, headers)
+        def start_attempt(idx):
+            t = threading.Thread(target=attempt, args=(idx,),
+                name="manta-hedge-%d" % idx)
+            t.daemon = True
+            t.start()
+
+        start_attempt(0)
+        delay = policy.delay()
+        pending = 1
+        try:
+            result = results.get(True, delay)
+        except Empty:
+            log.debug("hedge GET %r after %.3fs", path, delay)
+            start_attempt(1)
+            pending = 2
+            result = results.get()
+        hedged = (pending == 2)
+
+        # A failed attempt doesn't win: wait on the other one (if any).
+        first_error = None
+        while result[3] is not None and pending > 1:
+            first_error = first_error or result[3]
+            pending -= 1
+            result = results.get()
+        idx, res, stream, exc_info = result
+        policy.count(hedged=hedged, won=(idx == 1 and exc_info is None))
+        if exc_info is not None:
+            _reraise(first_error or exc_info)
+        return res, stream
+
+    def _iter_stream_lines(self, path, query=None, op=None):
+        """Generate the lines of a (line-oriented) GET response body
+        incrementally. See `_stream_request`.
+        """
+        res, stream = self._stream_request(path, "GET", query=query,
+            headers=self._encoding_headers(), op=op)
+        try:
+            if res["status"] != "200":
+                raise errors.MantaAPIError(res, stream.read())
+            for line in stream.iter_lines():
+                yield line
+        finally:
+            stream.close()
 
     def put_directory(self, mdir):
         """PutDirectory
@@ -198,7 +1100,8 @@ class RawMantaClient(object):
         headers = {
             "Content-Type": "application/json; type=directory"
         }
-        res, content = self._request(mdir, "PUT", headers=headers)
+        res, content = self._request(mdir, "PUT", headers=headers,
+            op="PutDirectory")
         if res["status"] != "204":
             raise errors.MantaAPIError(res, content)
 
@@ -232,18 +1135,22 @@ class RawMantaClient(object):
         if marker:
             query["marker"] = marker
 
-        res, content = self._request(mdir, "GET", query=query)
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        lines = content.split('\n')
-        dirents = []
-        for line in lines:
-            if not line.strip():
-                continue
-            try:
-                dirents.append(json.loads(line))
-            except ValueError:
-                raise errors.MantaError('invalid directory entry: %r' % line)
+        res, stream = self._read_stream_request(mdir, query=query,
+            headers=self._encoding_headers(), op="ListDirectory")
+        try:
+            if res["status"] != "200":
+                raise errors.MantaAPIError(res, stream.read())
+            dirents = []
+            for line in stream.iter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    dirents.append(json.loads(line))
+                except ValueError:
+                    raise errors.MantaError(
+                        'invalid directory entry: %r' % line)
+        finally:
+            stream.close()
         return res, dirents
 
     def head_directory(self, mdir):
@@ -257,8 +1164,12 @@ class RawMantaClient(object):
         @returns The response object, which acts as a dict with the headers.
         """
         log.debug('HEAD ListDirectory %r', mdir)
-        res, content = self._request(mdir, "HEAD")
-        if res["status"] != "200":
+        res, content = self._request(mdir, "HEAD", op="HeadDirectory")
+        if res["status"] == "404":
+            # A HEAD response has no body for `MantaAPIError` to parse.
+            raise errors.MantaResourceNotFoundError(
+                "%s: no such directory" % mdir)
+        elif res["status"] != "200":
             raise errors.MantaAPIError(res, content)
         return res
 
@@ -269,14 +1180,14 @@ class RawMantaClient(object):
         @param mdir {str} A manta path, e.g. '/trent/stor/mydir'.
         """
         log.debug('DeleteDirectory %r', mdir)
-        res, content = self._request(mdir, "DELETE")
+        res, content = self._request(mdir, "DELETE", op="DeleteDirectory")
         if res["status"] != "204":
             raise errors.MantaAPIError(res, content)
 
     def put_object(self, mpath, content=None, path=None, file=None,
                    content_length=None,
                    content_type="application/octet-stream",
-                   durability_level=None):
+                   durability_level=None, compress=False):
         """PutObject
         http://apidocs.joyent.com/manta/manta/#PutObject
 
@@ -285,6 +1196,8 @@ class RawMantaClient(object):
             client.put_object('/trent/stor/foo', path='path/to/foo.txt')
             client.put_object('/trent/stor/foo', file=open('path/to/foo.txt'),
                               size=11)
+            client.put_object('/trent/stor/big.log', path='big.log',
+                              content_type='text/plain', compress=True)
 
         One of `content`, `path` or `file` is required.
 
@@ -296,6 +1209,10 @@ class RawMantaClient(object):
             'application/octet-stream'.
         @param durability_level {int} Optional. Default is 2. This tells
             Manta the number of copies to keep.
+        @param compress {bool} Optional. Default false. If true, the content
+            is gzipped as it is streamed up and stored with
+            "Content-Encoding: gzip" (and the given `content_type`). See
+            `_put_object_compressed`.
         """
         log.debug('PutObject %r', mpath)
         headers = {
@@ -308,11 +1225,18 @@ class RawMantaClient(object):
         if len(methods) != 1:
             raise errors.MantaError("exactly one of 'content', 'path' or "
                 "'file' must be provided")
+        if compress:
+            return self._put_object_compressed(mpath, headers,
+                content=content, path=path, file=file)
+        content_md5 = None
         if content is not None:
             pass
         elif path:
             f = open(path)
             try:
+                if self.manifest is not None:
+                    st = os.fstat(f.fileno())
+                    content_md5 = self.manifest.get(path, st)
                 content = f.read()
             finally:
                 f.close()
@@ -322,13 +1246,85 @@ class RawMantaClient(object):
             raise errors.MantaError("'content' must be bytes, not unicode")
 
         headers["Content-Length"] = str(len(content))
-        md5 = hashlib.md5(content)
-        headers["Content-MD5"] = base64.b64encode(md5.digest())
+        if content_md5 is None:
+            md5 = hashlib.md5(content)
+            content_md5 = base64.b64encode(md5.digest())
+            if path and self.manifest is not None:
+                self.manifest.set(path, content_md5, st)
+        headers["Content-MD5"] = content_md5
         res, content = self._request(mpath, "PUT", body=content,
-                                     headers=headers)
+                                     headers=headers, op="PutObject")
         if res["status"] != "204":
             raise errors.MantaAPIError(res, content)
 
+    def _put_object_compressed(self, mpath, headers, content=None,
+                               path=None, file=None):
+        """PutObject, gzipping the content on the fly.
+
+        The source is read once, in chunks, and compressed in a worker
+        thread (see `_gzip_chunks`) while already-compressed chunks are
+        sent with chunked transfer-encoding. The compressed size isn't known
+        up front, so no Content-Length or Content-MD5 is sent. Instead the
+        MD5 of the sent bytes is checked against Manta's "computed-md5"
+        response header.
+
+        A retry (see `RetryPolicy`) restarts from the beginning of the
+        source, so a `file` source must be seekable to be retried.
+        """
+        if content is not None:
+            if not isinstance(content, bytes):
+                raise errors.MantaError(
+                    "'content' must be bytes, not unicode")
+            file = BytesIO(content)
+        elif path:
+            file = open(path, 'rb')
+        md5s = []
+        producers = []   # the `_gzip_chunks` of each attempt
+        try:
+            try:
+                start = file.tell()
+            except (AttributeError, IOError):
+                start = None
+            def body_chunks():
+                if producers:
+                    # The previous attempt's worker may still be reading
+                    # `file`: stop it before rewinding.
+                    producers[-1].close()
+                    if start is None:
+                        raise errors.MantaError("cannot retry compressed "
+                            "upload of unseekable file to %s" % mpath)
+                    file.seek(start)
+                md5 = hashlib.md5()
+                md5s.append(md5)
+                chunks = _gzip_chunks(file.read)
+                producers.append(chunks)
+                for chunk in chunks:
+                    md5.update(chunk)
+                    yield chunk
+
+            headers["Content-Encoding"] = "gzip"
+            res, stream = self._stream_request(mpath, "PUT", headers=headers,
+                body_chunks=body_chunks, op="PutObject")
+            try:
+                content = stream.read()
+            finally:
+                stream.close()
+        finally:
+            for chunks in producers:
+                chunks.close()
+            if path:
+                file.close()
+        if res["status"] != "204":
+            raise errors.MantaAPIError(res, content)
+        computed_md5 = res.get("computed-md5")
+        if computed_md5:
+            content_md5 = base64.b64encode(md5s[-1].digest())
+            if computed_md5 != content_md5:
+                raise errors.MantaError("content-md5 mismatch on compressed "
+                    "upload to %s: sent %s, Manta computed %s"
+                    % (mpath, content_md5, computed_md5))
+        return res
+
     def get_object(self, mpath, path=None, accept="*/*"):
         """GetObject
         http://apidocs.joyent.com/manta/manta/#GetObject
@@ -357,14 +1353,20 @@ class RawMantaClient(object):
         headers = {
             "Accept": accept
         }
+        if self.blob_cache is not None:
+            return self._get_object_cached(mpath, path, headers)
 
-        res, content = self._request(mpath, "GET", headers=headers)
+        res, content = self._read_request(mpath, headers=headers,
+            op="GetObject")
         if res["status"] not in ("200", "304"):
             raise errors.MantaAPIError(res, content)
-        if len(content) != int(res["content-length"]):
+        if ("-content-encoding" not in res
+            and len(content) != int(res["content-length"])):
             raise errors.MantaError("content-length mismatch: expected %d, "
                 "got %s" % (res["content-length"], content))
-        if res.get("content-md5"):
+        if res.get("content-md5") and "-content-encoding" not in res:
+            # Note: If the content was decoded (e.g. an object stored with
+            # "Content-Encoding: gzip") then the MD5 is of the encoded bytes.
             md5 = hashlib.md5(content)
             content_md5 = base64.b64encode(md5.digest())
             if content_md5 != res["content-md5"]:
@@ -380,6 +1382,177 @@ class RawMantaClient(object):
         else:
             return (res, content)
 
+    def _get_object_cached(self, mpath, path, headers):
+        """GetObject via `self.blob_cache`: a conditional GET if the object
+        is cached, with a 304 served from the cache.
+        """
+        cache = self.blob_cache
+        url = self.url + mpath
+        for attempt in range(2):
+            entry = cache.lookup(url)
+            req_headers = dict(headers)
+            if entry is not None and entry.get("etag"):
+                req_headers["If-None-Match"] = entry["etag"]
+            res, stream = self._read_stream_request(mpath,
+                headers=req_headers, op="GetObject")
+            try:
+                if res["status"] == "304" and "If-None-Match" in req_headers:
+                    cache.hit(entry)
+                    from httplib2 import Response
+                    res = Response(cache.response_headers(entry))
+                    res.fromcache = True
+                elif res["status"] == "200":
+                    entry = cache.store(url, res, stream)
+                    if entry is None:
+                        raise errors.MantaError("cannot cache %s: response "
+                            "has no content-md5 or etag" % mpath)
+                else:
+                    raise errors.MantaAPIError(res, stream.read())
+            finally:
+                stream.close()
+            try:
+                if path is not None:
+                    cache.copy_to(entry, path)
+                    return (res, None)
+                else:
+                    return (res, cache.read(entry))
+            except (IOError, OSError):
+                _, ex, _ = sys.exc_info()
+                if ex.errno != errno.ENOENT or attempt > 0:
+                    raise
+                log.debug("cached blob for %s evicted, refetching", mpath)
+
+    def get_object_resumable(self, mpath, path, max_attempts=3):
+        """GetObject to a local file, resuming a partial download.
+
+        The object is written to "PATH.part" (with its etag and content-md5
+        in "PATH.part.json") and renamed to `path` once complete and its
+        content-md5 verified. If a part file is left from an interrupted
+        download, only the rest of the object is fetched: a Range request
+        with "If-Range", so that an object changed since is fetched from
+        the start. A connection error while reading the body is resumed
+        the same way, up to `max_attempts` times in all.
+
+        Objects stored with a "Content-Encoding" (e.g. from
+        `put_object(..., compress=True)`) are decoded as they are read, so
+        they are always fetched from the start.
+
+        @param mpath {str} Required. A manta path, e.g. '/trent/stor/myobj'.
+        @param path {str} Required. The local file path.
+        @param max_attempts {int} Optional. Default 3.
+        @returns The response object (of the last request).
+        """
+        log.debug('GetObject %r (resumable)', mpath)
+        part_path = path + ".part"
+        meta_path = part_path + ".json"
+        attempt = 0
+        while True:
+            meta = None
+            offset = 0
+            if exists(part_path):
+                try:
+                    f = open(meta_path)
+                    try:
+                        meta = json.load(f)
+                    finally:
+                        f.close()
+                except (IOError, OSError, ValueError):
+                    meta = None
+                if meta and meta.get("etag") and not meta.get("encoded"):
+                    offset = os.path.getsize(part_path)
+            headers = {"Accept": "*/*"}
+            if offset:
+                headers["Range"] = "bytes=%d-" % offset
+                headers["If-Range"] = meta["etag"]
+
+            attempt += 1
+            res, stream = self._read_stream_request(mpath, headers=headers,
+                op="GetObject")
+            try:
+                if res["status"] == "416" and offset:
+                    # The part file is already complete (or bogus). Start
+                    # over to get the full response headers.
+                    log.debug("GetObject %r: range not satisfiable, "
+                        "restarting", mpath)
+                    _unlink(part_path)
+                    attempt -= 1
+                    continue
+                elif res["status"] == "206":
+                    start = _content_range_start(res.get("content-range"))
+                    if start != offset:
+                        log.debug("GetObject %r: unexpected Content-Range "
+                            "%r for offset %d, restarting", mpath,
+                            res.get("content-range"), offset)
+                        _unlink(part_path)
+                        attempt -= 1
+                        continue
+                    md5 = _md5_file(part_path)
+                    f = open(part_path, 'ab')
+                elif res["status"] == "200":
+                    # The full body (the object changed, or the server
+                    # ignored the Range): truncate the part file and
+                    # start over.
+                    md5 = hashlib.md5()
+                    meta = {"etag": res.get("etag"),
+                        "content-md5": res.get("content-md5"),
+                        "encoded": "-content-encoding" in res}
+                    f = open(meta_path, 'w')
+                    try:
+                        json.dump(meta, f)
+                    finally:
+                        f.close()
+                    f = open(part_path, 'wb')
+                else:
+                    raise errors.MantaAPIError(res, stream.read())
+                try:
+                    for chunk in stream.iter_chunks():
+                        f.write(chunk)
+                        md5.update(chunk)
+                finally:
+                    f.close()
+            except RETRYABLE_ERRORS:
+                _, ex, _ = sys.exc_info()
+                if attempt >= max_attempts:
+                    raise
+                log.debug("GetObject %r interrupted (%s), resuming",
+                    mpath, ex)
+                continue
+            finally:
+                stream.close()
+
+            if meta.get("content-md5") and not meta.get("encoded"):
+                content_md5 = base64.b64encode(md5.digest())
+                if content_md5 != meta["content-md5"]:
+                    _unlink(part_path)
+                    raise errors.MantaError("content-md5 mismatch for %s: "
+                        "expected %s, got %s"
+                        % (mpath, meta["content-md5"], content_md5))
+            if sys.platform == "win32" and exists(path):
+                os.remove(path)
+            os.rename(part_path, path)
+            _unlink(meta_path)
+            return res
+
+    def head_object(self, mpath):
+        """HEAD method on GetObject
+        http://apidocs.joyent.com/manta/manta/#GetObject
+
+        Useful to get an object's 'content-md5', 'content-length' and
+        'etag' without downloading it.
+
+        @param mpath {str} Required. A manta path, e.g. '/trent/stor/myobj'.
+        @returns The response object, which acts as a dict with the headers.
+        """
+        log.debug('HEAD GetObject %r', mpath)
+        res, content = self._request(mpath, "HEAD", op="HeadObject")
+        if res["status"] == "404":
+            # A HEAD response has no body for `MantaAPIError` to parse.
+            raise errors.MantaResourceNotFoundError(
+                "%s: no such object" % mpath)
+        elif res["status"] != "200":
+            raise errors.MantaAPIError(res, content)
+        return res
+
     def delete_object(self, mpath):
         """DeleteObject
         http://apidocs.joyent.com/manta/manta/#DeleteObject
@@ -387,7 +1560,7 @@ class RawMantaClient(object):
         @param mpath {str} Required. A manta path, e.g. '/trent/stor/myobj'.
         """
         log.debug('DeleteObject %r', mpath)
-        res, content = self._request(mpath, "DELETE")
+        res, content = self._request(mpath, "DELETE", op="DeleteObject")
         if res["status"] != "204":
             raise errors.MantaAPIError(res, content)
         return res
@@ -407,10 +1580,80 @@ class RawMantaClient(object):
             #"Content-Length": "0",   #XXX Needed?
             "Location": object_path
         }
-        res, content = self._request(link_path, "PUT", headers=headers)
+        res, content = self._request(link_path, "PUT", headers=headers,
+            op="PutSnapLink")
         if res["status"] != "204":
             raise errors.MantaAPIError(res, content)
 
+    def sign_url(self, mpath, method="GET", expires=None):
+        """Create a signed URL for a Manta path: one that can be used to GET
+        (or HEAD) it without credentials until it expires, e.g. by curl or
+        a browser. This is node-manta's `msign`.
+
+        @param mpath {str} Required. A manta path, e.g. '/trent/stor/myobj'.
+        @param method {str} Optional. "GET" (the default) or "HEAD".
+        @param expires {int} Optional. When the URL expires, in seconds
+            since the epoch. Default is `DEFAULT_SIGNED_URL_EXPIRY` seconds
+            from now.
+        @returns {str} The signed URL.
+        """
+        return self.sign_urls([mpath], method=method, expires=expires)[0]
+
+    def sign_urls(self, mpaths, method="GET", expires=None):
+        """Create signed URLs (see `sign_url`) for many Manta paths at once.
+
+        The strings to sign are given to the signer's `sign_many()`
+        together, so that e.g. a `ProcessPoolSigner` spreads them over its
+        worker processes.
+
+        @param mpaths {list} Required. Manta paths.
+        @param method {str} Optional. "GET" (the default) or "HEAD".
+        @param expires {int} Optional. See `sign_url`.
+        @returns {list} The signed URLs, in the order of `mpaths`.
+        """
+        if method not in ("GET", "HEAD"):
+            raise errors.MantaError("cannot sign a URL for %s: only GET and "
+                "HEAD are supported" % method)
+        if expires is None:
+            expires = int(time.time()) + DEFAULT_SIGNED_URL_EXPIRY
+        host = urlsplit(self.url).netloc
+        qpaths = [urlquote(isinstance(p, unicode) and p.encode('utf-8') or p)
+            for p in mpaths]
+        for attempt in range(2):
+            # The key's algorithm and fingerprint are part of what is
+            # signed, so they must be known first.
+            algorithm, fingerprint = self._signing_key()
+            # The query params are sorted and encoded as by JavaScript's
+            # `encodeURIComponent`, as Manta expects.
+            params = "algorithm=%s&expires=%d&keyId=%s" % (
+                algorithm.upper(), expires, urlquote(
+                    "/%s/keys/%s" % (self.account, fingerprint), safe=""))
+            signed = self.signer.sign_many(["%s\n%s\n%s\n%s"
+                % (method, host, qpath, params) for qpath in qpaths])
+            if all((algo, fp) == (algorithm, fingerprint)
+                   for algo, fp, _ in signed):
+                break
+            self._signing_key_cache = None   # the signer's key changed
+        else:
+            raise errors.MantaError("could not sign URLs: the signer's key "
+                "keeps changing")
+        return ["%s%s?%s&signature=%s" % (self.url, qpath, params,
+                    urlquote(signature, safe=""))
+                for qpath, (_, _, signature) in zip(qpaths, signed)]
+
+    _signing_key_cache = None
+    def _signing_key(self):
+        """Return (algorithm, fingerprint) for the signer's key, as given
+        with a signature.
+        """
+        cache = self._signing_key_cache
+        if cache is None or cache[0] is not self.signer:
+            algorithm, fingerprint, _ = self.signer.sign(
+                "date: " + http_date())
+            cache = self._signing_key_cache = (self.signer, algorithm,
+                fingerprint)
+        return cache[1:]
+
     def create_job(self, phases, name=None, input=None):
         """CreateJob
         http://apidocs.joyent.com/manta/manta/#CreateJob
@@ -424,7 +1667,7 @@ class RawMantaClient(object):
             "Content-Type": "application/json"
         }
         res, content = self._request(path, "POST", body=json.dumps(body),
-            headers=headers)
+            headers=headers, op="CreateJob")
         if res["status"] != '201':
             raise errors.MantaAPIError(res, content)
         location = res["location"]
@@ -443,7 +1686,8 @@ class RawMantaClient(object):
             "Content-Type": "text/plain",
             "Content-Length": str(len(body))
         }
-        res, content = self._request(path, "POST", body=body, headers=headers)
+        res, content = self._request(path, "POST", body=body, headers=headers,
+            op="AddJobInputs")
         if res["status"] != '204':
             raise errors.MantaAPIError(res, content)
 
@@ -456,7 +1700,8 @@ class RawMantaClient(object):
         headers = {
             # "Content-Length": "0"   #XXX needed?
         }
-        res, content = self._request(path, "POST", headers=headers)
+        res, content = self._request(path, "POST", headers=headers,
+            op="EndJobInput")
         if res["status"] != '202':
             raise errors.MantaAPIError(res, content)
 
@@ -469,7 +1714,8 @@ class RawMantaClient(object):
         headers = {
             "Content-Length": "0"
         }
-        res, content = self._request(path, "POST", headers=headers)
+        res, content = self._request(path, "POST", headers=headers,
+            op="CancelJob")
         if res["status"] != "204":
             raise errors.MantaAPIError(res, content)
 
@@ -494,7 +1740,8 @@ class RawMantaClient(object):
         if marker:
             query["marker"] = marker
 
-        res, content = self._request(path, "GET", query=query)
+        res, content = self._request(path, "GET", query=query,
+            op="ListJobs")
         if res["status"] != "200":
             raise errors.MantaAPIError(res, content)
         lines = content.split('\r\n')
@@ -514,7 +1761,7 @@ class RawMantaClient(object):
         """
         log.debug("GetJob %r", job_id)
         path = "/%s/jobs/%s/live/status" % (self.account, job_id)
-        res, content = self._request(path, "GET")
+        res, content = self._request(path, "GET", op="GetJob")
         if res["status"] != "200":
             raise errors.MantaAPIError(res, content)
         try:
@@ -525,58 +1772,70 @@ class RawMantaClient(object):
     def get_job_output(self, job_id):
         """GetJobOutput
         http://apidocs.joyent.com/manta/manta/#GetJobOutput
+
+        See `iter_job_output` for a streaming version.
+        """
+        return list(self.iter_job_output(job_id))
+
+    def iter_job_output(self, job_id):
+        """A streaming version of `get_job_output`: generates the job's
+        output keys as they are read from the response.
         """
         log.debug("GetJobOutput %r", job_id)
         path = "/%s/jobs/%s/live/out" % (self.account, job_id)
-        res, content = self._request(path, "GET")
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        keys = content.splitlines(False)
-        return keys
+        return self._iter_stream_lines(path, op="GetJobOutput")
 
     def get_job_input(self, job_id):
         """GetJobInput
         http://apidocs.joyent.com/manta/manta/#GetJobInput
+
+        See `iter_job_input` for a streaming version.
+        """
+        return list(self.iter_job_input(job_id))
+
+    def iter_job_input(self, job_id):
+        """A streaming version of `get_job_input`: generates the job's
+        input keys as they are read from the response.
         """
-        log.debug("GetJobInput", job_id)
+        log.debug("GetJobInput %r", job_id)
         path = "/%s/jobs/%s/live/in" % (self.account, job_id)
-        res, content = self._request(path, "GET")
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        keys = content.splitlines(False)
-        return keys
+        return self._iter_stream_lines(path, op="GetJobInput")
 
     def get_job_failures(self, job_id):
         """GetJobFailures
         http://apidocs.joyent.com/manta/manta/#GetJobFailures
+
+        See `iter_job_failures` for a streaming version.
+        """
+        return list(self.iter_job_failures(job_id))
+
+    def iter_job_failures(self, job_id):
+        """A streaming version of `get_job_failures`: generates the keys
+        of the job's failed inputs as they are read from the response.
         """
         log.debug("GetJobFailures %r", job_id)
         path = "/%s/jobs/%s/live/fail" % (self.account, job_id)
-        res, content = self._request(path, "GET")
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        keys = content.splitlines(False)
-        return keys
+        return self._iter_stream_lines(path, op="GetJobFailures")
 
     def get_job_errors(self, job_id):
         """GetJobErrors
         http://apidocs.joyent.com/manta/manta/#GetJobErrors
+
+        See `iter_job_errors` for a streaming version.
+        """
+        return list(self.iter_job_errors(job_id))
+
+    def iter_job_errors(self, job_id):
+        """A streaming version of `get_job_errors`: generates the job's
+        error objects as they are read and parsed from the response.
         """
         log.debug("GetJobErrors %r", job_id)
         path = "/%s/jobs/%s/live/err" % (self.account, job_id)
-        res, content = self._request(path, "GET")
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        lines = content.split('\r\n')
-        errs = []
-        for line in lines:
-            if not line.strip():
-                continue
+        for line in self._iter_stream_lines(path, op="GetJobErrors"):
             try:
-                errs.append(json.loads(line))
+                yield json.loads(line)
             except ValueError:
                 raise errors.MantaError('invalid job error entry: %r' % line)
-        return errs
 
 
 class MantaClient(RawMantaClient):
@@ -732,7 +1991,7 @@ class MantaClient(RawMantaClient):
                     start = idx
 
             # Now need to create from (end-1, len(parts)].
-            for i in range(end - 1, len(parts)):
+            for i in range(end - 1, len(parts) + 1):
                 d = '/'.join(parts[:i])
                 self.put_directory(d)
 
@@ -744,6 +2003,83 @@ class MantaClient(RawMantaClient):
         """
         return self.mkdir(mdir, parents=True)
 
+    def put_tree(self, path, mdir, journal=None, concurrency=4,
+                 content_type=None):
+        """Upload a local directory tree to a Manta dir (created as
+        needed), a la `cp -r PATH/ MDIR`.
+
+        Directories are created first (parents first), then files are
+        uploaded concurrently.
+
+        @param path {str} Required. The local directory.
+        @param mdir {str} Required. The Manta directory.
+        @param journal {manta.journal.UploadJournal} Optional. If given,
+            created dirs and completed uploads are recorded in it, and
+            those already recorded (e.g. by an interrupted earlier run) are
+            skipped. The journal is removed if the upload is complete.
+        @param concurrency {int} Optional. Default 4. Number of concurrent
+            uploads.
+        @param content_type {str} Optional. Default is to guess from each
+            file name (falling back to 'application/octet-stream').
+        @returns {dict} Counts of "uploaded" and "skipped" files, and
+            "dirs" created.
+        """
+        counts = {"uploaded": 0, "skipped": 0, "dirs": 0}
+        complete = False
+        try:
+            uploads = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                reldir = os.path.relpath(dirpath, path).replace(os.sep, '/')
+                mdirpath = (reldir == '.' and mdir or ujoin(mdir, reldir))
+                if journal is None or not journal.has_dir(mdirpath):
+                    if mdirpath == mdir:
+                        self.mkdirp(mdirpath)
+                    else:
+                        self.put_directory(mdirpath)
+                    counts["dirs"] += 1
+                    if journal is not None:
+                        journal.record_mkdir(mdirpath)
+                for filename in sorted(filenames):
+                    uploads.append((os.path.join(dirpath, filename),
+                        ujoin(mdirpath, filename)))
+
+            stopping = threading.Event()
+            def upload(item):
+                if stopping.is_set():
+                    return None     # an upload failed: don't start more
+                src, mpath = item
+                st = os.stat(src)
+                if journal is not None and journal.is_done(mpath, src, st):
+                    return False
+                import mimetypes
+                self.put_object(mpath, path=src, content_type=(content_type
+                    or mimetypes.guess_type(src)[0]
+                    or "application/octet-stream"))
+                if journal is not None:
+                    journal.record_put(mpath, src, st)
+                return True
+
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(max(1, concurrency))
+            try:
+                for uploaded in pool.imap_unordered(upload, uploads):
+                    counts[uploaded and "uploaded" or "skipped"] += 1
+            finally:
+                # On an error, skip the queued uploads and wait for those in
+                # flight, so they are journaled before the journal closes.
+                # (`ThreadPool.terminate()` doesn't wait for them.)
+                stopping.set()
+                pool.close()
+                pool.join()
+            complete = True
+        finally:
+            if journal is not None:
+                if complete:
+                    journal.remove()
+                else:
+                    journal.close()
+        return counts
+
     def stat(self, mpath):
         """Return available dirent info for the given Manta path."""
         parts = mpath.split('/')
@@ -761,6 +2097,75 @@ class MantaClient(RawMantaClient):
             raise errors.MantaResourceNotFoundError(
                 "%s: no such object or directory" % mpath)
 
+    def stat_many(self, mpaths, md5=False, concurrency=8):
+        """Return available dirent info for many Manta paths.
+
+        Paths are grouped by parent dir. A group is answered from a single
+        listing of the parent if that takes fewer requests than a HEAD per
+        path (judged from a HEAD of the parent, which gives its size). Other
+        paths are HEADed. Requests are done concurrently.
+
+        @param mpaths {list} The Manta paths.
+        @param md5 {bool} Optional. Default false. If true, always HEAD
+            each path, because listings don't include 'content-md5'.
+        @param concurrency {int} Optional. Default 8. The max number of
+            concurrent requests.
+        @returns {dict} A mapping of each path to its dirent, or to None if
+            it doesn't exist. A dirent from a HEAD request also has the
+            'content-md5' and 'content-type' of an object.
+        """
+        groups = {}
+        for mpath in set(mpaths):
+            if len(mpath.split('/')) <= 3:
+                raise errors.MantaError(
+                    "cannot stat special manta path: %r" % mpath)
+            groups.setdefault(udirname(mpath), []).append(mpath)
+
+        def head(mpath):
+            try:
+                res = self.head_object(mpath)
+            except errors.MantaResourceNotFoundError:
+                return [(mpath, None)]
+            return [(mpath, _dirent_from_head(mpath, res))]
+
+        def plan(mdir):
+            """Return the tasks, as (func, arg), for a group."""
+            mpaths = groups[mdir]
+            if md5 or len(mpaths) == 1:
+                return [(head, p) for p in mpaths]
+            try:
+                res = self.head_directory(mdir)
+            except errors.MantaResourceNotFoundError:
+                return [(lambda p: [(p, None)], p) for p in mpaths]
+            pages = int(res.get("result-set-size", 0)) // 1000 + 1
+            if pages < len(mpaths):
+                return [(list_group, mdir)]
+            return [(head, p) for p in mpaths]
+
+        def list_group(mdir):
+            try:
+                dirents = self.ls(mdir)
+            except errors.MantaAPIError:
+                _, ex, _ = sys.exc_info()
+                if ex.code not in ('ResourceNotFound',
+                                   'DirectoryDoesNotExist'):
+                    raise
+                dirents = {}
+            return [(p, dirents.get(ubasename(p))) for p in groups[mdir]]
+
+        results = {}
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max(1, min(concurrency, len(mpaths) or 1)))
+        try:
+            tasks = []
+            for group_tasks in pool.imap_unordered(plan, groups):
+                tasks += group_tasks
+            for pairs in pool.imap_unordered(lambda t: t[0](t[1]), tasks):
+                results.update(pairs)
+        finally:
+            pool.close()
+        return results
+
     def type(self, mpath):
         """Return the manta type for the given manta path.
 
@@ -0,0 +1,284 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Pluggable crypto backends for request signing (and verification).
+
+Backends:
+- "cryptography": the `cryptography` package (OpenSSL). Faster, and
+  maintained. Supports RSA and ECDSA (P-256, P-384, P-521) keys. Used by
+  default if installed.
+- "pycrypto": PyCrypto's PKCS#1 v1.5 signatures. RSA keys only. The
+  fallback.
+
+Select a backend with the `backend` argument to the signers (e.g.
+`CLISigner(key_id, backend="pycrypto")`) or the MANTA_CRYPTO_BACKEND
+environment variable. See "bench/sign.py" for a comparison of signatures
+per second.
+
+A backend loads keys: `load_private_key(data, passphrase=None)` returns a
+key with a `sign(data, hash_name)` method, and `load_public_key(data)`
+(OpenSSH public key data) returns one with `verify(data, signature,
+hash_name)`. Hash names are those of http-signature algorithms, e.g.
+"sha256" for "rsa-sha256". Keys also have a `key_type` ("rsa" or "ecdsa")
+and the default http-signature `algorithm` for the key, e.g. "rsa-sha256"
+or "ecdsa-sha384" for a P-384 key. ECDSA signatures are ASN.1 DER encoded.
+"""
+
+import sys
+import os
+import re
+import logging
+
+from manta.errors import MantaError
+
+
+
+#---- globals
+
+log = logging.getLogger("manta.crypto")
+
+# In order of preference.
+BACKEND_NAMES = ("cryptography", "pycrypto")
+
+
+
+#---- exports
+
+class CryptoBackend(object):
+    """A virtual base class for crypto backends."""
+    name = None
+
+    def load_private_key(self, data, passphrase=None):
+        """Load a private key from PEM data.
+
+        @param data {bytes} Private key file content.
+        @param passphrase {str} Optional. For an encrypted key.
+        @raises {ValueError} If the key could not be loaded, including if it
+            is encrypted and the passphrase is missing or wrong.
+        @raises {MantaError} If the key type isn't supported by the backend.
+        @returns A key with a `sign(data, hash_name)` method, returning the
+            raw signature bytes.
+        """
+        raise NotImplementedError("this is a virtual base class")
+
+    def load_public_key(self, data):
+        """Load a public key from OpenSSH public key data ("ssh-rsa AAAA...").
+
+        @raises {ValueError} If the key could not be loaded.
+        @raises {MantaError} If the key type isn't supported by the backend.
+        @returns A key with a `verify(data, signature, hash_name)` method,
+            returning true if the raw `signature` verifies.
+        """
+        raise NotImplementedError("this is a virtual base class")
+
+class PyCryptoBackend(CryptoBackend):
+    name = "pycrypto"
+
+    def __init__(self):
+        from Crypto.PublicKey import RSA
+        from Crypto.Signature import PKCS1_v1_5
+        from Crypto.Hash import SHA, SHA256, SHA384, SHA512
+        self._RSA = RSA
+        self._PKCS1_v1_5 = PKCS1_v1_5
+        self._hashes = {"sha1": SHA, "sha256": SHA256, "sha384": SHA384,
+            "sha512": SHA512}
+
+    def load_private_key(self, data, passphrase=None):
+        if _NON_RSA_PEM_RE.search(data):
+            raise MantaError("the 'pycrypto' crypto backend only supports "
+                "RSA keys in PEM format: install 'cryptography' for other "
+                "keys (e.g. ECDSA)")
+        return _PyCryptoKey(self, self._RSA.importKey(data, passphrase))
+
+    def load_public_key(self, data):
+        if not data.strip().startswith("ssh-rsa "):
+            raise MantaError("the 'pycrypto' crypto backend only supports "
+                "RSA keys: install 'cryptography' for other keys (e.g. "
+                "ECDSA)")
+        return _PyCryptoKey(self, self._RSA.importKey(data.strip()))
+
+class CryptographyBackend(CryptoBackend):
+    name = "cryptography"
+
+    def __init__(self):
+        import warnings
+        with warnings.catch_warnings():
+            # Don't nag mantash users about e.g. Python 2 deprecation.
+            warnings.simplefilter("ignore")
+            from cryptography.hazmat.backends import default_backend
+            from cryptography.hazmat.primitives import hashes, serialization
+            from cryptography.hazmat.primitives.asymmetric import (padding,
+                rsa, ec)
+            from cryptography.exceptions import InvalidSignature
+        self._backend = default_backend()
+        self._serialization = serialization
+        self._padding = padding.PKCS1v15()
+        self._hashes = {"sha1": hashes.SHA1, "sha256": hashes.SHA256,
+            "sha384": hashes.SHA384, "sha512": hashes.SHA512}
+        self._rsa = rsa
+        self._ec = ec
+        self._InvalidSignature = InvalidSignature
+
+    def load_private_key(self, data, passphrase=None):
+        if not isinstance(data, bytes):
+            data = data.encode('ascii')
+        if passphrase is not None and not isinstance(passphrase, bytes):
+            passphrase = passphrase.encode('utf-8')
+        serialization = self._serialization
+        if (b"BEGIN OPENSSH PRIVATE KEY" in data
+            and hasattr(serialization, "load_ssh_private_key")):
+            load = serialization.load_ssh_private_key
+        else:
+            load = serialization.load_pem_private_key
+        try:
+            key = load(data, passphrase, self._backend)
+        except TypeError:
+            # Encrypted without a passphrase, or vice versa.
+            _, ex, _ = sys.exc_info()
+            raise ValueError(str(ex))
+        except Exception:
+            # E.g. `UnsupportedAlgorithm`.
+            _, ex, _ = sys.exc_info()
+            if isinstance(ex, ValueError):
+                raise
+            raise ValueError(str(ex))
+        return _CryptographyKey(self, key)
+
+    def load_public_key(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('ascii')
+        try:
+            key = self._serialization.load_ssh_public_key(data.strip(),
+                self._backend)
+        except Exception:
+            _, ex, _ = sys.exc_info()
+            if isinstance(ex, ValueError):
+                raise
+            raise ValueError(str(ex))
+        return _CryptographyKey(self, key)
+
+def available_backends():
+    """Return the names of the installed backends, in order of preference."""
+    names = []
+    for name in BACKEND_NAMES:
+        try:
+            get_backend(name)
+        except MantaError:
+            continue
+        names.append(name)
+    return names
+
+def get_backend(name=None):
+    """Get a crypto backend.
+
+    @param name {str} Optional. A backend name (see `BACKEND_NAMES`) or a
+        `CryptoBackend` instance (returned as is). If not given, the
+        MANTA_CRYPTO_BACKEND environment variable is used, else the first
+        installed backend.
+    @raises {MantaError} If the backend is unknown or not installed.
+    """
+    if isinstance(name, CryptoBackend):
+        return name
+    if not name:
+        name = os.environ.get("MANTA_CRYPTO_BACKEND")
+    if name:
+        return _load_backend(name)
+
+    for name in BACKEND_NAMES:
+        try:
+            return _load_backend(name)
+        except MantaError:
+            pass
+    raise MantaError("no crypto backend is installed: install "
+        "'cryptography' or PyCrypto (see <https://github.com/joyent/"
+        "python-manta#1-pycrypto-dependency>)")
+
+
+
+#---- internal support stuff
+
+_backend_classes = {
+    "cryptography": CryptographyBackend,
+    "pycrypto": PyCryptoBackend,
+}
+_backends = {}
+
+# The hash for ECDSA signatures with a key on a curve of the given size, as
+# for OpenSSH's "ecdsa-sha2-nistp*" keys.
+_ECDSA_HASH_FROM_CURVE_SIZE = {256: "sha256", 384: "sha384", 521: "sha512"}
+
+_NON_RSA_PEM_RE = re.compile(r'-----BEGIN (?:EC|DSA|OPENSSH) PRIVATE KEY')
+
+def _load_backend(name):
+    backend = _backends.get(name)
+    if backend is None:
+        cls = _backend_classes.get(name)
+        if cls is None:
+            raise MantaError("unknown crypto backend: %r (must be one of %s)"
+                % (name, ", ".join(BACKEND_NAMES)))
+        try:
+            backend = cls()
+        except ImportError:
+            _, ex, _ = sys.exc_info()
+            raise MantaError("crypto backend %r is not installed: %s"
+                % (name, ex))
+        log.debug("loaded crypto backend %r", name)
+        _backends[name] = backend
+    return backend
+
+class _PyCryptoKey(object):
+    key_type = "rsa"
+    algorithm = "rsa-sha256"
+
+    def __init__(self, backend, key):
+        self._backend = backend
+        self._key = key
+        self._pkcs1 = backend._PKCS1_v1_5.new(key)
+
+    def sign(self, data, hash_name):
+        return self._pkcs1.sign(self._backend._hashes[hash_name].new(data))
+
+    def verify(self, data, signature, hash_name):
+        hash_class = self._backend._hashes.get(hash_name)
+        if hash_class is None:
+            return False
+        return self._pkcs1.verify(hash_class.new(data), signature)
+
+class _CryptographyKey(object):
+    def __init__(self, backend, key):
+        self._backend = backend
+        self._key = key
+        rsa, ec = backend._rsa, backend._ec
+        if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+            self.key_type = "rsa"
+            self.algorithm = "rsa-sha256"
+        elif isinstance(key, (ec.EllipticCurvePrivateKey,
+                              ec.EllipticCurvePublicKey)):
+            hash_name = _ECDSA_HASH_FROM_CURVE_SIZE.get(key.curve.key_size)
+            if hash_name is None:
+                raise MantaError("unsupported ECDSA curve: %s"
+                    % key.curve.name)
+            self.key_type = "ecdsa"
+            self.algorithm = "ecdsa-" + hash_name
+        else:
+            raise MantaError("unsupported key type: %s"
+                % key.__class__.__name__)
+
+    def _signature_algorithm(self, hash_class):
+        if self.key_type == "ecdsa":
+            return (self._backend._ec.ECDSA(hash_class()),)
+        return (self._backend._padding, hash_class())
+
+    def sign(self, data, hash_name):
+        return self._key.sign(data, *self._signature_algorithm(
+            self._backend._hashes[hash_name]))
+
+    def verify(self, data, signature, hash_name):
+        hash_class = self._backend._hashes.get(hash_name)
+        if hash_class is None:
+            return False
+        try:
+            self._key.verify(signature, data,
+                *self._signature_algorithm(hash_class))
+        except self._backend._InvalidSignature:
+            return False
+        return True
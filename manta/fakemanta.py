@@ -0,0 +1,1115 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""A local stand-in ("fake") Manta server, for integration tests and
+benchmarks without a Manta account or network.
+
+Usage:
+
+    from manta.fakemanta import FakeManta
+    server = FakeManta()        # 127.0.0.1, on a free port
+    server.start()              # serves on a background thread
+    client = manta.MantaClient(server.url, "bob", signer)
+    ...
+    server.stop()
+
+or from the command line:
+
+    python -m manta.fakemanta [-p PORT] [-k PUBKEY-FILE] [--synthetic N]
+
+The state is all in memory. Any account is accepted: its top-level dirs
+("stor", "public", "jobs", "reports") are created on first use.
+
+Implemented:
+- Objects: PutObject (incl. chunked transfer-encoding, Content-MD5
+  checking, "m-*" metadata), GetObject (incl. Range, If-Range,
+  If-None-Match, If-Match), HeadObject, DeleteObject.
+- Directories: PutDirectory, ListDirectory (with "limit", "marker" and the
+  "Result-Set-Size" header; gzip-encoded if accepted), HEAD,
+  DeleteDirectory.
+- Snaplinks: PutSnapLink.
+- Jobs: CreateJob, AddJobInputs, EndJobInput, CancelJob, ListJobs, GetJob
+  and the job input/output/failures/errors streams. Jobs are run by a
+  simple local executor when their input is ended: each "map" phase runs
+  its "exec" command (with `sh -c`) once per input object, with the object
+  on stdin; a "reduce" phase runs once on all of the inputs concatenated.
+  Phase "assets", "init", "memory", etc. are ignored. Note that this runs
+  the commands as the user running the server: that's why the server only
+  listens on localhost by default, and `execute=False` (or '--no-exec')
+  makes every phase pass its input through instead.
+- Auth: requests are accepted as is, unless public keys are given, in
+  which case the http-signature "Authorization" header (RSA or ECDSA
+  keys) and the Date header's skew are checked, or, for a GET or HEAD
+  without one, the query string of a signed URL (see
+  `RawMantaClient.sign_url`).
+- Synthetic namespaces of any size (see `add_synthetic_tree`), whose
+  objects' content is generated when read.
+- Faults, to test how clients cope: slow responses, error statuses and
+  dropped connections (see `add_fault`).
+"""
+
+import sys
+import os
+import re
+import time
+import json
+import uuid
+import zlib
+import base64
+import hashlib
+import logging
+import socket
+import threading
+import subprocess
+from bisect import bisect_left
+from collections import deque
+from posixpath import dirname as udirname, basename as ubasename
+
+try:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs, quote, unquote
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+    from urllib import quote, unquote
+
+from . import errors
+
+
+
+#---- globals
+
+log = logging.getLogger("manta.fakemanta")
+
+# The top-level dirs of an account.
+ACCOUNT_DIRS = ("stor", "public", "jobs", "reports")
+DEFAULT_LIMIT = 256
+MAX_LIMIT = 1024
+MAX_CLOCK_SKEW = 300   # seconds
+
+_AUTH_RE = re.compile(r'^Signature keyId="/([^/"]+)/keys/([^"]+)",'
+    r'algorithm="([^"]+)",signature="([^"]+)"$')
+_KEY_ID_RE = re.compile(r'^/([^/]+)/keys/(.+)$')
+
+
+
+#---- exports
+
+class FakeManta(object):
+    """A local stand-in Manta server.
+
+    @param host {str} Optional. Default "127.0.0.1".
+    @param port {int} Optional. Default 0, i.e. any free port. See `url`.
+    @param keys {list} Optional. OpenSSH public keys (the content of
+        "id_rsa.pub" or "id_ecdsa.pub" files). If given, request signatures
+        must verify with one of them. Default is to accept any request.
+    @param execute {bool} Optional. Default true. Run job phase commands.
+        If false, each phase passes its input through.
+    @param latency {float} Optional. Seconds to wait before handling each
+        request, to simulate network latency.
+    """
+    def __init__(self, host="127.0.0.1", port=0, keys=None, execute=True,
+                 latency=0.0):
+        self.host = host
+        self.port = port
+        self.execute = execute
+        self.latency = latency
+        self.keys = None
+        if keys is not None:
+            self.keys = dict(_key_from_ssh_pub_key(k) for k in keys)
+        # Recent requests, as (method, path, status), for tests.
+        self.requests = deque(maxlen=1000)
+        self._nodes = {"/": _Dir()}   # path -> _Dir or _Object
+        self._jobs = {}    # (account, job id) -> _Job
+        self._faults = []  # see `add_fault`
+        self._lock = threading.RLock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://%s:%d" % (self.host, self.port)
+
+    def start(self):
+        """Start serving on a background thread."""
+        self.bind()
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+            name="fakemanta")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def serve_forever(self):
+        if self._httpd is None:
+            self.bind()
+        self._httpd.serve_forever()
+
+    def stop(self):
+        """Stop serving (after `start`), closing open connections."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd.close_connections()
+            self._httpd = None
+
+    def bind(self):
+        """Bind the server socket (e.g. to learn the port for `url` before
+        `serve_forever`).
+        """
+        self._httpd = _Server((self.host, self.port), _Handler)
+        self._httpd.manta = self
+        self.port = self._httpd.server_address[1]
+
+    def add_fault(self, method=None, path=None, delay=0.0, status=None,
+                  drop=False, count=1):
+        """Make the next `count` matching requests misbehave: wait `delay`
+        seconds, then close the connection without a response (`drop`),
+        respond with the error `status`, or (with neither) handle the
+        request as usual.
+
+        @param method {str} Optional. Only requests with this method.
+        @param path {str} Optional. Only requests for this Manta path (or
+            under it, if it ends with "/").
+        """
+        self._lock.acquire()
+        try:
+            self._faults.append({"method": method, "path": path,
+                "delay": delay, "status": status, "drop": drop,
+                "count": count})
+        finally:
+            self._lock.release()
+
+    def _take_fault(self, method, mpath):
+        """Return the first fault matching the given request, if any, and
+        count it.
+        """
+        self._lock.acquire()
+        try:
+            for fault in self._faults:
+                if fault["method"] not in (None, method):
+                    continue
+                path = fault["path"]
+                if path is not None and path != mpath and not (
+                        path.endswith("/") and mpath.startswith(path)):
+                    continue
+                fault["count"] -= 1
+                if fault["count"] <= 0:
+                    self._faults.remove(fault)
+                return fault
+        finally:
+            self._lock.release()
+
+    ## Namespace
+
+    def ensure_account(self, account):
+        self._lock.acquire()
+        try:
+            if "/" + account in self._nodes:
+                return
+            self._add("/" + account, _Dir())
+            for name in ACCOUNT_DIRS:
+                self._add("/%s/%s" % (account, name), _Dir())
+        finally:
+            self._lock.release()
+
+    def mkdir(self, mdir, parents=True):
+        """Create a directory (and its parents, by default)."""
+        self._lock.acquire()
+        try:
+            node = self._nodes.get(mdir)
+            if isinstance(node, _Dir):
+                return
+            elif node is not None:
+                raise errors.MantaError("%s is an object" % mdir)
+            parent = udirname(mdir)
+            if parents and parent != "/":
+                self.mkdir(parent)
+            elif not isinstance(self._nodes.get(parent), _Dir):
+                raise errors.MantaError("%s is not a directory" % parent)
+            self._add(mdir, _Dir())
+        finally:
+            self._lock.release()
+
+    def put(self, mpath, content, content_type="application/octet-stream"):
+        """Create an object (and its parent dirs)."""
+        obj = _Object(content_type=content_type)
+        obj.data = content
+        obj.size = len(content)
+        obj.md5 = _b64md5(content)
+        obj.etag = str(uuid.uuid4())
+        self._lock.acquire()
+        try:
+            self.mkdir(udirname(mpath))
+            self._add(mpath, obj)
+        finally:
+            self._lock.release()
+
+    def add_synthetic_tree(self, mdir, objects, fanout=None, size=1024,
+                           content_type="application/octet-stream"):
+        """Add `objects` objects of `size` bytes under `mdir`, whose
+        content is generated (deterministically, from the path) when read.
+
+        @param mdir {str} The dir in which to add them. It is created as
+            needed.
+        @param objects {int} The number of objects.
+        @param fanout {int} Optional. The max entries per dir. If given,
+            objects are spread over a tree of subdirs ("d0000/d0001/...")
+            with at most this many entries each. Default is to put them
+            all in `mdir`.
+        @param size {int} Optional. Default 1024. The size of each object.
+        """
+        width = len(str(max(objects - 1, 0)))
+        depth = 0
+        if fanout:
+            leaves = (objects + fanout - 1) // fanout
+            while leaves > 1:
+                depth += 1
+                leaves = (leaves + fanout - 1) // fanout
+        self._lock.acquire()
+        try:
+            self.mkdir(mdir)
+            for i in range(objects):
+                d = mdir
+                if depth:
+                    leaf = i // fanout
+                    parts = []
+                    for _ in range(depth):
+                        parts.append("d%04d" % (leaf % fanout))
+                        leaf //= fanout
+                    for part in reversed(parts):
+                        d = d + "/" + part
+                        if d not in self._nodes:
+                            self._add(d, _Dir())
+                obj = _Object(content_type=content_type)
+                obj.size = size
+                obj.synthetic = True
+                self._add("%s/o%0*d" % (d, width, i), obj)
+        finally:
+            self._lock.release()
+
+    def _add(self, mpath, node):
+        """Add or replace a node. The parent dir must exist."""
+        parent = self._nodes[udirname(mpath)]
+        parent.add(ubasename(mpath))
+        parent.mtime = time.time()
+        self._nodes[mpath] = node
+
+    def _remove(self, mpath):
+        parent = self._nodes[udirname(mpath)]
+        parent.remove(ubasename(mpath))
+        parent.mtime = time.time()
+        del self._nodes[mpath]
+
+    def _content(self, mpath, obj):
+        if obj.synthetic:
+            return _synthetic_content(mpath, obj.size)
+        return obj.data
+
+    def _md5(self, mpath, obj):
+        if obj.md5 is None:
+            obj.md5 = _b64md5(self._content(mpath, obj))
+        return obj.md5
+
+    def _etag(self, mpath, obj):
+        if obj.etag is None:
+            obj.etag = str(uuid.UUID(
+                bytes=hashlib.md5(mpath.encode('utf-8')).digest()))
+        return obj.etag
+
+    ## Jobs
+
+    def _run_job(self, job):
+        log.debug("run job %s", job.id)
+        keys = list(job.inputs)
+        for i, phase in enumerate(job.phases):
+            if job.cancelled:
+                break
+            if phase.get("type", "map") == "reduce":
+                tasks = [("reduce", keys)]
+            else:
+                tasks = [(key, [key]) for key in keys]
+            outputs = []
+            for name, inputs in tasks:
+                if job.cancelled:
+                    break
+                job.tasks += 1
+                output = self._run_task(job, i, phase, name, inputs)
+                job.tasks_done += 1
+                if output is not None:
+                    outputs.append(output)
+            keys = outputs
+        self._lock.acquire()
+        try:
+            job.outputs = keys
+            job.state = "done"
+            job.time_done = time.time()
+        finally:
+            self._lock.release()
+
+    def _run_task(self, job, i, phase, name, inputs):
+        """Run one map or reduce task. Returns the output key, or None if
+        it failed.
+        """
+        chunks = []
+        for key in inputs:
+            self._lock.acquire()
+            try:
+                obj = self._nodes.get(key)
+                content = (isinstance(obj, _Object)
+                    and self._content(key, obj) or None)
+            finally:
+                self._lock.release()
+            if content is None:
+                self._job_error(job, i, key, "ResourceNotFoundError",
+                    "no such object: %s" % key)
+                return None
+            chunks.append(content)
+        content = b''.join(chunks)
+
+        if self.execute and phase.get("exec"):
+            env = dict(os.environ, MANTA_JOB_ID=job.id,
+                MANTA_USER=job.account, MANTA_PHASE=str(i))
+            if len(inputs) == 1 and name != "reduce":
+                env["MANTA_INPUT_OBJECT"] = inputs[0]
+            p = subprocess.Popen(["sh", "-c", phase["exec"]],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE, env=env)
+            stdout, stderr = p.communicate(content)
+            if p.returncode != 0:
+                self._job_error(job, i, name != "reduce" and name or None,
+                    "UserTaskError", "user command exited with code %d: %s"
+                    % (p.returncode, stderr.strip()[-1024:]))
+                return None
+            content = stdout
+
+        output = "/%s/jobs/%s/stor%s.%d.%s" % (job.account, job.id,
+            name == "reduce" and "/reduce" or name, i, uuid.uuid4())
+        self.put(output, content, "application/octet-stream")
+        return output
+
+    def _job_error(self, job, i, key, code, message):
+        self._lock.acquire()
+        try:
+            error = {"phase": str(i), "what": "phase %d" % i, "code": code,
+                "message": message}
+            if key is not None:
+                error["input"] = key
+                job.failures.append(key)
+            job.errors.append(error)
+        finally:
+            self._lock.release()
+
+
+#---- internal support stuff
+
+class _Dir(object):
+    __slots__ = ("mtime", "_names", "_sorted")
+
+    def __init__(self):
+        self.mtime = time.time()
+        self._names = set()
+        self._sorted = None
+
+    def add(self, name):
+        if name not in self._names:
+            self._names.add(name)
+            self._sorted = None
+
+    def remove(self, name):
+        self._names.discard(name)
+        self._sorted = None
+
+    def __len__(self):
+        return len(self._names)
+
+    def sorted_names(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._names)
+        return self._sorted
+
+class _Object(object):
+    __slots__ = ("data", "size", "md5", "etag", "content_type",
+        "content_encoding", "durability", "metadata", "mtime", "synthetic")
+
+    def __init__(self, content_type):
+        self.data = None
+        self.size = 0
+        self.md5 = None
+        self.etag = None
+        self.content_type = content_type
+        self.content_encoding = None
+        self.durability = 2
+        self.metadata = {}
+        self.mtime = time.time()
+        self.synthetic = False
+
+class _Job(object):
+    def __init__(self, account, name, phases):
+        self.id = str(uuid.uuid4())
+        self.account = account
+        self.name = name
+        self.phases = phases
+        self.state = "running"
+        self.cancelled = False
+        self.input_done = False
+        self.inputs = []
+        self.outputs = []
+        self.failures = []
+        self.errors = []
+        self.tasks = 0
+        self.tasks_done = 0
+        self.time_created = time.time()
+        self.time_done = None
+
+    def status(self):
+        status = {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "cancelled": self.cancelled,
+            "inputDone": self.input_done,
+            "stats": {
+                "errors": len(self.errors),
+                "outputs": len(self.outputs),
+                "retries": 0,
+                "tasks": self.tasks,
+                "tasksDone": self.tasks_done,
+            },
+            "timeCreated": _iso_time(self.time_created),
+            "phases": self.phases,
+        }
+        if self.time_done is not None:
+            status["timeDone"] = _iso_time(self.time_done)
+        return status
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args):
+        HTTPServer.__init__(self, *args)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def process_request_thread(self, request, client_address):
+        self.connections_lock.acquire()
+        try:
+            self.connections.add(request)
+        finally:
+            self.connections_lock.release()
+        try:
+            ThreadingMixIn.process_request_thread(self, request,
+                client_address)
+        finally:
+            self.connections_lock.acquire()
+            try:
+                self.connections.discard(request)
+            finally:
+                self.connections_lock.release()
+
+    def close_connections(self, timeout=1.0):
+        """Close kept-alive connections, and wait (up to `timeout` seconds)
+        for their handler threads to end.
+        """
+        self.connections_lock.acquire()
+        try:
+            for request in self.connections:
+                try:
+                    request.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        finally:
+            self.connections_lock.release()
+        deadline = time.time() + timeout
+        while self.connections and time.time() < deadline:
+            time.sleep(0.01)
+
+    def handle_error(self, request, client_address):
+        log.debug("error handling request from %s:%s", *client_address,
+            exc_info=True)
+
+class _RequestError(Exception):
+    def __init__(self, status, code, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.code = code
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1   # one write per response, else Nagle adds ~40ms
+    server_version = "FakeManta/1.0"
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+    def do_GET(self):
+        self._dispatch()
+    do_HEAD = do_PUT = do_POST = do_DELETE = do_GET
+
+    def _dispatch(self):
+        manta = self.server.manta
+        self._status = None
+        parts = urlsplit(self.path)
+        self.mpath = unquote(parts.path).rstrip("/") or "/"
+        self.query = dict((k, v[-1]) for k, v in parse_qs(parts.query).items())
+        try:
+            body = self._read_body()
+            if manta.latency:
+                time.sleep(manta.latency)
+            fault = manta._take_fault(self.command, self.mpath)
+            if fault is not None:
+                time.sleep(fault["delay"])
+                if fault["drop"]:
+                    self.close_connection = True
+                    manta.requests.append((self.command, self.mpath, None))
+                    return
+                elif fault["status"]:
+                    raise _RequestError(fault["status"], "InjectedFault",
+                        "injected %s fault" % fault["status"])
+            segments = self.mpath.split("/")
+            if len(segments) < 2 or not segments[1]:
+                raise _RequestError(403, "AuthorizationFailed",
+                    "%s is not an account path" % self.mpath)
+            self.account = segments[1]
+            if manta.keys is not None:
+                self._check_auth()
+            manta.ensure_account(self.account)
+            if len(segments) > 2 and segments[2] == "jobs":
+                self._jobs_request(segments[3:], body)
+            else:
+                self._namespace_request(body)
+        except _RequestError:
+            _, ex, _ = sys.exc_info()
+            self._error(ex.status, ex.code, str(ex))
+        except Exception:
+            _, ex, _ = sys.exc_info()
+            log.exception("error handling %s %s", self.command, self.path)
+            self._error(500, "InternalError", str(ex))
+        manta.requests.append((self.command, self.mpath, self._status))
+
+    def _read_body(self):
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline().strip():
+                        pass   # trailers
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        length = int(self.headers.get("content-length") or 0)
+        return length and self.rfile.read(length) or b''
+
+    def _check_auth(self):
+        manta = self.server.manta
+        if "signature" in self.query and not self.headers.get("authorization"):
+            return self._check_signed_url()
+        match = _AUTH_RE.match(self.headers.get("authorization") or "")
+        date = self.headers.get("date")
+        if not match or not date:
+            raise _RequestError(401, "InvalidCredentials",
+                "missing or invalid Authorization or Date header")
+        account, fingerprint, algorithm, signature = match.groups()
+        key = manta.keys.get(fingerprint)
+        if key is None:
+            raise _RequestError(403, "KeyDoesNotExist",
+                "no such key: %s" % fingerprint)
+        if not _verify_signature(key, algorithm, "date: " + date, signature):
+            raise _RequestError(403, "InvalidSignature",
+                "the signature does not verify")
+        t = _parse_http_date(date)
+        if t is None or abs(time.time() - t) > MAX_CLOCK_SKEW:
+            raise _RequestError(403, "RequestTimeTooSkewed",
+                "the Date header is too far from the server time")
+        if account != self.account:
+            raise _RequestError(403, "AuthorizationFailed",
+                "%s is not allowed to access %s" % (account, self.mpath))
+
+    def _check_signed_url(self):
+        """Check the query string auth of a signed URL (as made by
+        `RawMantaClient.sign_url`).
+        """
+        def invalid(message):
+            return _RequestError(403, "InvalidQueryStringAuthentication",
+                message)
+        if self.command not in ("GET", "HEAD"):
+            raise invalid("signed URLs are only for GET and HEAD")
+        query = self.query
+        match = _KEY_ID_RE.match(query.get("keyId", ""))
+        if not match or "algorithm" not in query or "expires" not in query:
+            raise invalid("missing or invalid signed URL parameters")
+        account, fingerprint = match.groups()
+        try:
+            expired = int(query["expires"]) < time.time()
+        except ValueError:
+            raise invalid("invalid expires: %r" % query["expires"])
+        if expired:
+            raise invalid("the signed URL has expired")
+        key = self.server.manta.keys.get(fingerprint)
+        if key is None:
+            raise _RequestError(403, "KeyDoesNotExist",
+                "no such key: %s" % fingerprint)
+        params = "&".join("%s=%s" % (quote(k, safe=""), quote(v, safe=""))
+            for k, v in sorted(query.items()) if k != "signature")
+        sigstr = "%s\n%s\n%s\n%s" % (self.command,
+            self.headers.get("host", ""), urlsplit(self.path).path, params)
+        if not _verify_signature(key, query["algorithm"].lower(), sigstr,
+                query["signature"]):
+            raise _RequestError(403, "InvalidSignature",
+                "the signature does not verify")
+        if account != self.account:
+            raise _RequestError(403, "AuthorizationFailed",
+                "%s is not allowed to access %s" % (account, self.mpath))
+
+    def _send(self, status, headers=None, body=b'', stream=False):
+        """Send a response. If `stream` and the client accepts it, the body
+        is gzip-encoded.
+        """
+        headers = dict(headers or {})
+        if (stream and body and "gzip" in
+                self.headers.get("accept-encoding", "")):
+            compressor = zlib.compressobj(6, zlib.DEFLATED,
+                16 + zlib.MAX_WBITS)
+            body = compressor.compress(body) + compressor.flush()
+            headers["Content-Encoding"] = "gzip"
+        if status != 304 and "Content-Length" not in headers:
+            headers["Content-Length"] = str(len(body))
+        headers["Date"] = _http_date()
+        headers["x-request-id"] = str(uuid.uuid4())
+        self._status = status
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD" and body:
+            self.wfile.write(body)
+
+    def _error(self, status, code, message):
+        self._send(status, {"Content-Type": "application/json"},
+            json.dumps({"code": code, "message": message}).encode('utf-8'))
+
+    ## Namespace
+
+    def _namespace_request(self, body):
+        manta = self.server.manta
+        manta._lock.acquire()
+        try:
+            node = manta._nodes.get(self.mpath)
+            if self.command in ("GET", "HEAD"):
+                if isinstance(node, _Dir):
+                    self._list_directory(node)
+                elif node is not None:
+                    self._get_object(node)
+                else:
+                    raise _RequestError(404, "ResourceNotFound",
+                        "%s does not exist" % self.mpath)
+            elif self.command == "PUT":
+                content_type = self.headers.get("content-type", "")
+                if "type=directory" in content_type:
+                    self._put_directory(node)
+                elif "type=link" in content_type:
+                    self._put_snaplink(node)
+                else:
+                    self._put_object(node, body)
+            elif self.command == "DELETE":
+                self._delete(node)
+            else:
+                raise _RequestError(405, "BadMethod",
+                    "%s is not allowed on %s" % (self.command, self.mpath))
+        finally:
+            manta._lock.release()
+
+    def _check_parent(self):
+        manta = self.server.manta
+        parent = manta._nodes.get(udirname(self.mpath))
+        if parent is None:
+            raise _RequestError(404, "DirectoryDoesNotExist",
+                "%s does not exist" % udirname(self.mpath))
+        elif not isinstance(parent, _Dir):
+            raise _RequestError(400, "ParentNotDirectory",
+                "%s is not a directory" % udirname(self.mpath))
+        if self.mpath.count("/") < 3:
+            raise _RequestError(403, "OperationNotAllowedOnRootDirectory",
+                "%s is a top-level directory" % self.mpath)
+
+    def _list_directory(self, d):
+        manta = self.server.manta
+        names = d.sorted_names()
+        limit = min(int(self.query.get("limit") or DEFAULT_LIMIT), MAX_LIMIT)
+        start = 0
+        if "marker" in self.query:
+            start = bisect_left(names, self.query["marker"])
+        if self.command == "HEAD":
+            limit = 0
+        lines = []
+        for name in names[start:start+limit]:
+            mpath = self.mpath + "/" + name
+            node = manta._nodes[mpath]
+            if isinstance(node, _Dir):
+                entry = {"name": name, "type": "directory",
+                    "mtime": _iso_time(node.mtime)}
+            else:
+                entry = {"name": name, "etag": manta._etag(mpath, node),
+                    "size": node.size, "type": "object",
+                    "mtime": _iso_time(node.mtime),
+                    "durability": node.durability}
+            lines.append(json.dumps(entry))
+        body = "".join(line + "\n" for line in lines).encode('utf-8')
+        self._send(200, {
+            "Content-Type": "application/x-json-stream; type=directory",
+            "Result-Set-Size": str(len(names)),
+            "Last-Modified": _http_date(d.mtime),
+        }, body, stream=True)
+
+    def _check_conditions(self, obj):
+        etag = obj is not None and self.server.manta._etag(
+            self.mpath, obj) or None
+        if_match = self.headers.get("if-match")
+        if if_match and if_match.strip('"') != etag:
+            raise _RequestError(412, "PreconditionFailed",
+                "if-match %s didn't match etag %s" % (if_match, etag))
+        return etag
+
+    def _get_object(self, obj):
+        manta = self.server.manta
+        etag = self._check_conditions(obj)
+        headers = {
+            "Content-Type": obj.content_type,
+            "Content-MD5": manta._md5(self.mpath, obj),
+            "ETag": etag,
+            "Last-Modified": _http_date(obj.mtime),
+            "Durability-Level": str(obj.durability),
+            "Accept-Ranges": "bytes",
+        }
+        headers.update(obj.metadata)
+        if obj.content_encoding:
+            headers["Content-Encoding"] = obj.content_encoding
+        if self.headers.get("if-none-match", "").strip('"') == etag:
+            self._send(304, {"ETag": etag,
+                "Last-Modified": headers["Last-Modified"]})
+            return
+        if self.command == "HEAD":
+            headers["Content-Length"] = str(obj.size)
+            self._send(200, headers)
+            return
+
+        content = manta._content(self.mpath, obj)
+        byte_range = self.headers.get("range")
+        if_range = self.headers.get("if-range")
+        if byte_range and if_range and if_range.strip('"') != etag:
+            byte_range = None
+        if byte_range:
+            match = re.match(r'^bytes=(\d*)-(\d*)$', byte_range.strip())
+            if match and match.groups() != ('', ''):
+                first, last = match.groups()
+                if not first:
+                    first, last = max(obj.size - int(last), 0), obj.size - 1
+                else:
+                    first = int(first)
+                    last = last and min(int(last), obj.size - 1) \
+                        or obj.size - 1
+                if first >= obj.size or first > last:
+                    self._send(416, {"Content-Range": "bytes */%d" % obj.size})
+                    return
+                del headers["Content-MD5"]
+                headers["Content-Range"] = "bytes %d-%d/%d" % (first, last,
+                    obj.size)
+                self._send(206, headers, content[first:last+1])
+                return
+        self._send(200, headers, content)
+
+    def _put_directory(self, node):
+        manta = self.server.manta
+        if isinstance(node, _Object):
+            raise _RequestError(400, "ParentNotDirectory",
+                "%s is an object" % self.mpath)
+        if node is None:
+            self._check_parent()
+            manta._add(self.mpath, _Dir())
+        self._send(204, {"Last-Modified": _http_date()})
+
+    def _put_object(self, node, body):
+        manta = self.server.manta
+        self._check_parent()
+        if isinstance(node, _Dir):
+            raise _RequestError(400, "OperationNotAllowedOnDirectory",
+                "%s is a directory" % self.mpath)
+        self._check_conditions(node)
+        md5 = _b64md5(body)
+        content_md5 = self.headers.get("content-md5")
+        if content_md5 and content_md5 != md5:
+            raise _RequestError(469, "ChecksumError",
+                "Content-MD5 expected %s, but was %s" % (content_md5, md5))
+        obj = _Object(self.headers.get("content-type",
+            "application/octet-stream"))
+        obj.data = body
+        obj.size = len(body)
+        obj.md5 = md5
+        obj.etag = str(uuid.uuid4())
+        obj.content_encoding = self.headers.get("content-encoding")
+        obj.durability = int(self.headers.get("durability-level") or
+            self.headers.get("x-durability-level") or 2)
+        for name in self.headers.keys():
+            if name.lower().startswith("m-"):
+                obj.metadata[name.lower()] = self.headers[name]
+        manta._add(self.mpath, obj)
+        self._send(204, {"ETag": obj.etag, "Computed-MD5": md5,
+            "Last-Modified": _http_date(obj.mtime)})
+
+    def _put_snaplink(self, node):
+        manta = self.server.manta
+        self._check_parent()
+        if isinstance(node, _Dir):
+            raise _RequestError(400, "OperationNotAllowedOnDirectory",
+                "%s is a directory" % self.mpath)
+        source_path = self.headers.get("location", "")
+        source = manta._nodes.get(source_path)
+        if not isinstance(source, _Object):
+            raise _RequestError(404, "SourceObjectNotFound",
+                "%s does not exist" % source_path)
+        link = _Object(source.content_type)
+        for attr in _Object.__slots__:
+            setattr(link, attr, getattr(source, attr))
+        link.etag = manta._etag(source_path, source)
+        link.metadata = dict(source.metadata)
+        if source.synthetic:
+            # Content is generated from the path, so keep the source's.
+            link.synthetic = False
+            link.data = manta._content(source_path, source)
+        link.mtime = time.time()
+        manta._add(self.mpath, link)
+        self._send(204, {"Last-Modified": _http_date(link.mtime)})
+
+    def _delete(self, node):
+        manta = self.server.manta
+        if node is None:
+            raise _RequestError(404, "ResourceNotFound",
+                "%s does not exist" % self.mpath)
+        if self.mpath.count("/") < 3:
+            raise _RequestError(403, "OperationNotAllowedOnRootDirectory",
+                "%s is a top-level directory" % self.mpath)
+        if isinstance(node, _Dir):
+            if len(node):
+                raise _RequestError(400, "DirectoryNotEmpty",
+                    "%s is not empty" % self.mpath)
+        else:
+            self._check_conditions(node)
+        manta._remove(self.mpath)
+        self._send(204)
+
+    ## Jobs
+
+    def _jobs_request(self, segments, body):
+        manta = self.server.manta
+        if not segments:
+            if self.command == "POST":
+                self._create_job(body)
+            elif self.command in ("GET", "HEAD"):
+                self._list_jobs()
+            else:
+                raise _RequestError(405, "BadMethod",
+                    "%s is not allowed on %s" % (self.command, self.mpath))
+            return
+        if len(segments) < 3 or segments[1] != "live":
+            # e.g. job output objects under "/:account/jobs/:id/stor"
+            self._namespace_request(body)
+            return
+
+        job = manta._jobs.get((self.account, segments[0]))
+        if job is None:
+            raise _RequestError(404, "ResourceNotFound",
+                "job %s does not exist" % segments[0])
+        action = "/".join(segments[2:])
+        method = self.command == "HEAD" and "GET" or self.command
+        manta._lock.acquire()
+        try:
+            if (method, action) == ("GET", "status"):
+                self._send(200, {"Content-Type": "application/json"},
+                    json.dumps(job.status()).encode('utf-8'))
+            elif method == "GET" and action in ("in", "out", "fail", "err"):
+                if action == "err":
+                    lines = [json.dumps(e) for e in job.errors]
+                else:
+                    lines = {"in": job.inputs, "out": job.outputs,
+                        "fail": job.failures}[action]
+                body = "".join(line + "\r\n" for line in lines)
+                self._send(200, {"Content-Type": action == "err"
+                        and "application/x-json-stream" or "text/plain",
+                    "Result-Set-Size": str(len(lines))},
+                    body.encode('utf-8'), stream=True)
+            elif (method, action) == ("POST", "in"):
+                if job.input_done or job.cancelled:
+                    raise _RequestError(409, "InvalidJobState",
+                        "job %s input is done" % job.id)
+                text = body.decode('utf-8')
+                job.inputs += [k.strip() for k in text.splitlines()
+                    if k.strip()]
+                self._send(204)
+            elif (method, action) == ("POST", "in/end"):
+                if not job.input_done:
+                    job.input_done = True
+                    t = threading.Thread(target=manta._run_job, args=(job,),
+                        name="fakemanta-job-%s" % job.id)
+                    t.daemon = True
+                    t.start()
+                self._send(202)
+            elif (method, action) == ("POST", "cancel"):
+                if job.state == "done":
+                    raise _RequestError(409, "InvalidJobState",
+                        "job %s is done" % job.id)
+                job.cancelled = job.input_done = True
+                job.state = "done"
+                job.time_done = time.time()
+                self._send(204)
+            else:
+                raise _RequestError(404, "ResourceNotFound",
+                    "%s does not exist" % self.mpath)
+        finally:
+            manta._lock.release()
+
+    def _create_job(self, body):
+        manta = self.server.manta
+        try:
+            spec = json.loads(body.decode('utf-8'))
+            phases = spec["phases"]
+            assert isinstance(phases, list) and phases
+        except (ValueError, KeyError, AssertionError):
+            raise _RequestError(400, "InvalidArgument",
+                "invalid job: expected a JSON object with 'phases'")
+        job = _Job(self.account, spec.get("name", ""), phases)
+        manta._lock.acquire()
+        try:
+            manta._jobs[(self.account, job.id)] = job
+            manta.mkdir("/%s/jobs/%s/stor" % (self.account, job.id))
+        finally:
+            manta._lock.release()
+        self._send(201, {"Location": "/%s/jobs/%s" % (self.account, job.id)})
+
+    def _list_jobs(self):
+        manta = self.server.manta
+        state = self.query.get("state")
+        manta._lock.acquire()
+        try:
+            jobs = sorted((job for (account, _), job in manta._jobs.items()
+                if account == self.account
+                    and (not state or job.state == state)),
+                key=lambda job: job.id)
+        finally:
+            manta._lock.release()
+        total = len(jobs)
+        if "marker" in self.query:
+            jobs = [job for job in jobs if job.id >= self.query["marker"]]
+        limit = min(int(self.query.get("limit") or DEFAULT_LIMIT), MAX_LIMIT)
+        body = "".join(json.dumps({"name": job.id, "type": "directory",
+                "mtime": _iso_time(job.time_created)}) + "\r\n"
+            for job in jobs[:limit])
+        self._send(200, {"Content-Type": "application/x-json-stream",
+            "Result-Set-Size": str(total)}, body.encode('utf-8'))
+
+
+def _b64md5(content):
+    return base64.b64encode(hashlib.md5(content).digest()).decode('ascii')
+
+def _synthetic_content(mpath, size):
+    block = hashlib.sha1(mpath.encode('utf-8')).hexdigest().encode('ascii')
+    block = (block + b"\n") * 100
+    return (block * (size // len(block) + 1))[:size]
+
+def _iso_time(t):
+    return (time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t))
+        + ".%03dZ" % int((t % 1) * 1000))
+
+def _http_date(t=None):
+    return time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(t))
+
+def _parse_http_date(s):
+    import email.utils
+    parsed = email.utils.parsedate_tz(s)
+    return parsed and email.utils.mktime_tz(parsed) or None
+
+def _key_from_ssh_pub_key(data):
+    """Return (fingerprint, key) for the given OpenSSH public key."""
+    from .auth import fingerprint_from_ssh_pub_key
+    from .crypto import get_backend
+    return (fingerprint_from_ssh_pub_key(data),
+        get_backend().load_public_key(data))
+
+def _verify_signature(key, algorithm, sigstr, signature):
+    key_type, _, hash_name = algorithm.partition("-")
+    if key_type != key.key_type:
+        return False
+    try:
+        return key.verify(sigstr, base64.b64decode(signature), hash_name)
+    except (TypeError, ValueError):
+        return False
+
+
+
+#---- mainline
+
+def main(argv=sys.argv):
+    import optparse
+    logging.basicConfig(format="%(name)s: %(levelname)s: %(message)s")
+    parser = optparse.OptionParser(prog="python -m manta.fakemanta",
+        description="Run a local stand-in Manta server.")
+    parser.add_option("-v", "--verbose", action="store_true",
+        help="log each request")
+    parser.add_option("-H", "--host", default="127.0.0.1",
+        help="address to listen on (default 127.0.0.1)")
+    parser.add_option("-p", "--port", type="int", default=8080,
+        help="port to listen on (default 8080)")
+    parser.add_option("-k", "--key", dest="key_paths", action="append",
+        metavar="PUBKEY-FILE",
+        help="verify request signatures with this public key "
+            "(e.g. ~/.ssh/id_rsa.pub); can be given more than once")
+    parser.add_option("--no-exec", dest="execute", action="store_false",
+        default=True,
+        help="don't run job phase commands: phases pass input through")
+    parser.add_option("--latency", type="float", default=0.0,
+        metavar="SECONDS", help="delay each response")
+    parser.add_option("-a", "--account",
+        default=os.environ.get("MANTA_USER", "fake"),
+        help="account for '--synthetic' (default $MANTA_USER or 'fake')")
+    parser.add_option("--synthetic", type="int", default=0, metavar="N",
+        help="create N synthetic objects under "
+            "/ACCOUNT/stor/synthetic")
+    parser.add_option("--fanout", type="int", metavar="N",
+        help="max entries per synthetic dir (default: all in one dir)")
+    parser.add_option("--object-size", type="int", default=1024,
+        metavar="BYTES", help="size of synthetic objects (default 1024)")
+    opts, args = parser.parse_args(argv[1:])
+    if opts.verbose:
+        log.setLevel(logging.DEBUG)
+
+    keys = None
+    if opts.key_paths:
+        keys = []
+        for path in opts.key_paths:
+            f = open(os.path.expanduser(path))
+            try:
+                keys.append(f.read())
+            finally:
+                f.close()
+    server = FakeManta(opts.host, opts.port, keys=keys,
+        execute=opts.execute, latency=opts.latency)
+    if opts.synthetic:
+        server.ensure_account(opts.account)
+        start = time.time()
+        server.add_synthetic_tree("/%s/stor/synthetic" % opts.account,
+            opts.synthetic, fanout=opts.fanout, size=opts.object_size)
+        sys.stderr.write("created %d synthetic objects in %.1fs\n"
+            % (opts.synthetic, time.time() - start))
+    server.bind()
+    sys.stderr.write("fakemanta listening on %s\n" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,274 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""HTTP cache backends for the httplib2-based Manta client.
+
+httplib2 accepts any object with `get(key)`, `set(key, value)` and
+`delete(key)` as a cache (see `httplib2.FileCache`). The backends here add
+bounds to that:
+
+- `MemoryCache`: an in-process LRU, bounded by total bytes.
+- `DiskCache`: files sharded over subdirs, each shard bounded by bytes.
+
+plus "none" (no caching at all). See `http_cache_from_spec` for how
+`RawMantaClient(..., http_cache=...)` selects one.
+"""
+
+import os
+from os.path import exists, join
+import hashlib
+import threading
+
+from . import errors
+
+
+
+#---- exports
+
+class HttpCache(object):
+    """A virtual base class for python-manta HTTP cache backends."""
+    def get(self, key):
+        """Return the cached value (a str) for `key`, or None."""
+        raise NotImplementedError("this is a virtual base class")
+
+    def set(self, key, value):
+        raise NotImplementedError("this is a virtual base class")
+
+    def delete(self, key):
+        raise NotImplementedError("this is a virtual base class")
+
+    def stats(self):
+        """Return a dict of the cache counters."""
+        return {"hits": getattr(self, "hits", 0),
+            "misses": getattr(self, "misses", 0)}
+
+
+class MemoryCache(HttpCache):
+    """An in-memory LRU HTTP cache.
+
+    @param max_size {int} Optional. Default 32 MiB. Max total size (in
+        bytes) of cached values. A value larger than this isn't cached.
+    """
+    def __init__(self, max_size=32*1024*1024):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> [prev, next, key, value], in a circular doubly linked list
+        # rooted at `self._root`, most recently used last.
+        self._map = {}
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def _unlink(self, link):
+        prev, next = link[0], link[1]
+        prev[1] = next
+        next[0] = prev
+
+    def _append(self, link):
+        root = self._root
+        last = root[0]
+        link[0], link[1] = last, root
+        last[1] = root[0] = link
+
+    def get(self, key):
+        self._lock.acquire()
+        try:
+            link = self._map.get(key)
+            if link is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._unlink(link)
+            self._append(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        self._lock.acquire()
+        try:
+            link = self._map.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+                self.size -= len(link[3])
+            if len(value) > self.max_size:
+                return
+            link = [None, None, key, value]
+            self._append(link)
+            self._map[key] = link
+            self.size += len(value)
+            root = self._root
+            while self.size > self.max_size:
+                oldest = root[1]
+                self._unlink(oldest)
+                del self._map[oldest[2]]
+                self.size -= len(oldest[3])
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            link = self._map.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+                self.size -= len(link[3])
+        finally:
+            self._lock.release()
+
+
+class DiskCache(HttpCache):
+    """An on-disk HTTP cache, sharded over `shards` subdirs.
+
+    Unlike `httplib2.FileCache` (one file per URL, all in one dir, no
+    bounds) entries are spread over subdirs and each shard is kept under
+    `max_size / shards` bytes by dropping its least recently written
+    entries. Writes are write-to-temp-then-rename, so the cache can be
+    shared by concurrent processes.
+
+    @param cache_dir {str} Required. The cache directory.
+    @param max_size {int} Optional. Default 256 MiB. Approximate max total
+        size (in bytes) of cached values.
+    @param shards {int} Optional. Default 64. Number of subdirs.
+    """
+    def __init__(self, cache_dir, max_size=256*1024*1024, shards=64):
+        if not 1 <= shards <= 256:
+            raise errors.MantaError("invalid number of cache shards: %r"
+                % shards)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.shards = shards
+        self._shard_max_size = max_size // shards
+        self.hits = 0
+        self.misses = 0
+        # Estimated size of each shard, or None until first scanned.
+        self._shard_sizes = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        if not isinstance(key, bytes):
+            key = key.encode('utf-8')
+        h = hashlib.sha1(key).hexdigest()
+        shard = "%02x" % (int(h[:2], 16) % self.shards)
+        return shard, join(self.cache_dir, shard, h)
+
+    def get(self, key):
+        shard, path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def set(self, key, value):
+        if len(value) > self._shard_max_size:
+            return
+        shard, path = self._path(key)
+        d = join(self.cache_dir, shard)
+        if shard not in self._shard_sizes and not exists(d):
+            try:
+                os.makedirs(d)
+            except OSError:
+                if not exists(d):
+                    raise
+        tmp_path = "%s.tmp%d-%d" % (path, os.getpid(), _thread_id())
+        f = open(tmp_path, 'wb')
+        try:
+            f.write(value)
+        finally:
+            f.close()
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)  # e.g. Windows with an existing file
+            return
+
+        self._lock.acquire()
+        try:
+            size = self._shard_sizes.get(shard)
+            if size is None:
+                size = self._scan(d)[1]
+            else:
+                size += len(value)
+            if size > self._shard_max_size:
+                size = self._evict(d)
+            self._shard_sizes[shard] = size
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        shard, path = self._path(key)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _scan(self, d):
+        entries = []
+        total = 0
+        for name in os.listdir(d):
+            if ".tmp" in name:
+                continue
+            p = join(d, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue   # concurrently removed
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        return entries, total
+
+    def _evict(self, d):
+        """Evict oldest entries in shard dir `d` down to 90% of the shard
+        size limit. Returns the new shard size.
+        """
+        target = int(self._shard_max_size * 0.9)
+        entries, total = self._scan(d)
+        entries.sort()
+        for mtime, size, p in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            total -= size
+        return total
+
+
+def http_cache_from_spec(spec, cache_dir):
+    """Return an httplib2 cache for the given spec.
+
+    @param spec {str|HttpCache|None} One of:
+        - "none" or None: no HTTP caching
+        - "memory": a `MemoryCache`
+        - "disk": a `DiskCache` in `cache_dir`
+        - any object with httplib2's cache interface (get, set, delete),
+          which is used as is.
+    @param cache_dir {str} The cache dir for "disk".
+    @returns The cache object, or None for no caching.
+    """
+    if spec is None or spec == "none":
+        return None
+    elif spec == "memory":
+        return MemoryCache()
+    elif spec == "disk":
+        return DiskCache(cache_dir)
+    elif hasattr(spec, "get") and hasattr(spec, "set"):
+        return spec
+    else:
+        raise errors.MantaError("invalid HTTP cache: %r (expected 'none', "
+            "'memory', 'disk' or a cache object)" % spec)
+
+
+
+#---- internal support stuff
+
+def _thread_id():
+    return threading.current_thread().ident
@@ -0,0 +1,128 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""A checkpoint journal for resumable bulk uploads.
+
+Usage:
+
+    journal = manta.UploadJournal("upload of /data/photos to " + mdir)
+    client.put_tree("/data/photos", mdir, journal=journal)
+
+The journal is an append-only file (one JSON record per line) of the
+uploads completed and directories created. If the upload is interrupted,
+a rerun with the same journal key skips everything recorded, trusting an
+upload record only if the local file's size and mtime still match. The
+journal is removed when the whole upload succeeds.
+"""
+
+import os
+from os.path import exists, join, abspath
+import json
+import hashlib
+import threading
+import logging
+
+from . import appdirs
+
+
+
+#---- globals
+
+log = logging.getLogger("manta.journal")
+DEFAULT_JOURNAL_DIR = appdirs.user_cache_dir(
+    "python-manta", "Joyent", "journals")
+
+
+
+#---- exports
+
+class UploadJournal(object):
+    """A record of the completed steps of a bulk upload.
+
+    @param key {str} Required. Identifies the upload, e.g. the Manta URL,
+        local source dir and Manta destination dir. A rerun of the same
+        upload must use the same key.
+    @param journal_dir {str} Optional. The directory for journal files.
+        Default is a "python-manta/journals" dir in the user cache dir.
+    """
+    def __init__(self, key, journal_dir=None):
+        journal_dir = journal_dir or DEFAULT_JOURNAL_DIR
+        if not exists(journal_dir):
+            try:
+                os.makedirs(journal_dir)
+            except OSError:
+                if not exists(journal_dir):   # lost a race is fine
+                    raise
+        self.path = join(journal_dir, "%s.journal"
+            % hashlib.sha1(key.encode('utf-8')).hexdigest())
+        self._puts = {}
+        self._dirs = set()
+        self._lock = threading.Lock()
+        self._load()
+        self._f = open(self.path, 'a')
+
+    def _load(self):
+        if not exists(self.path):
+            return
+        f = open(self.path)
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue   # a torn last line from an interrupted run
+                if record.get("op") == "put":
+                    self._puts[record["mpath"]] = record
+                elif record.get("op") == "mkdir":
+                    self._dirs.add(record["mpath"])
+        finally:
+            f.close()
+        log.debug("loaded upload journal %s: %d puts, %d dirs", self.path,
+            len(self._puts), len(self._dirs))
+
+    def _append(self, record):
+        self._lock.acquire()
+        try:
+            self._f.write(json.dumps(record) + '\n')
+            self._f.flush()
+        finally:
+            self._lock.release()
+
+    def is_done(self, mpath, path, st=None):
+        """Return true if the upload of local `path` to `mpath` is recorded
+        and the local file's size and mtime haven't changed since.
+        """
+        record = self._puts.get(mpath)
+        if record is None or record["path"] != abspath(path):
+            return False
+        if st is None:
+            st = os.stat(path)
+        return record["size"] == st.st_size and record["mtime"] == st.st_mtime
+
+    def record_put(self, mpath, path, st):
+        """Record the completed upload of local `path` (which had stat `st`
+        when read) to `mpath`.
+        """
+        record = {"op": "put", "mpath": mpath, "path": abspath(path),
+            "size": st.st_size, "mtime": st.st_mtime}
+        self._puts[mpath] = record
+        self._append(record)
+
+    def has_dir(self, mdir):
+        return mdir in self._dirs
+
+    def record_mkdir(self, mdir):
+        self._dirs.add(mdir)
+        self._append({"op": "mkdir", "mpath": mdir})
+
+    def close(self):
+        """Close the journal, keeping it for a rerun."""
+        if not self._f.closed:
+            self._f.close()
+
+    def remove(self):
+        """Close and delete the journal, e.g. when the upload is complete."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,239 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""A persistent manifest of local file checksums, to avoid rehashing.
+
+Usage:
+
+    manifest = manta.ChecksumManifest("/data/photos")
+    client = manta.MantaClient(url, account, signer, manifest=manifest)
+    client.put_object("/trent/stor/photos/a.jpg", path="/data/photos/a.jpg")
+    ...
+    manifest.save()
+
+The manifest records (size, mtime, inode, content-md5) for files under
+`root`. A file whose size, mtime and inode are unchanged since it was last
+hashed isn't read again to compute its Content-MD5. Entries are updated as
+files are hashed; `save()` writes the manifest (to the user cache dir by
+default, one file per tree) if anything changed.
+
+A file modified within the same second that it was hashed could later look
+unchanged (mtime granularity), so such "racy" entries aren't recorded.
+Note that Manta verifies the Content-MD5 of an upload, so a stale entry
+results in a failed upload rather than a corrupt object.
+
+The content-md5 and size of an object stored with a Content-Encoding (e.g.
+gzip) are those of the encoded bytes, so can't be compared with a decoded
+local copy. For those, `set_decoded()` records the etag of the object that
+a file was downloaded from and the Content-MD5 of the decoded content.
+"""
+
+import sys
+import os
+from os.path import exists, join, dirname, abspath, realpath
+import time
+import json
+import hashlib
+import base64
+import tempfile
+import threading
+import logging
+
+from . import appdirs
+
+
+
+#---- globals
+
+log = logging.getLogger("manta.manifest")
+DEFAULT_MANIFEST_DIR = appdirs.user_cache_dir(
+    "python-manta", "Joyent", "manifests")
+
+
+
+#---- exports
+
+class ChecksumManifest(object):
+    """Cached Content-MD5 values for the files in a local tree.
+
+    @param root {str} Required. The local directory whose files to track.
+        Files outside it are hashed but not recorded.
+    @param cache_dir {str} Optional. The directory in which to keep the
+        manifest file. Default is a "python-manta/manifests" dir in the
+        user cache dir.
+    """
+    version = 1
+    chunk_size = 65536
+
+    def __init__(self, root, cache_dir=None):
+        self.root = realpath(root)
+        cache_dir = cache_dir or DEFAULT_MANIFEST_DIR
+        self.path = join(cache_dir, "%s.json"
+            % hashlib.sha1(self.root.encode('utf-8')).hexdigest())
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._decoded = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            f = open(self.path)
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return
+        if (data.get("version") == self.version
+                and data.get("root") == self.root):
+            self._entries = data["files"]
+            self._decoded = data.get("decoded", {})
+
+    def _relpath(self, path):
+        """Return the '/'-separated path relative to `root`, or None if the
+        path isn't under `root`.
+        """
+        path = abspath(path)
+        if not path.startswith(self.root + os.sep):
+            path = realpath(path)
+            if not path.startswith(self.root + os.sep):
+                return None
+        return path[len(self.root)+1:].replace(os.sep, '/')
+
+    def get(self, path, st=None):
+        """Return the recorded Content-MD5 (base64) for the given file, or
+        None if it isn't recorded or the file has changed since.
+
+        @param path {str} The local file path.
+        @param st {os.stat_result} Optional. The file's stat, if already
+            available.
+        """
+        relpath = self._relpath(path)
+        if relpath is None:
+            return None
+        if st is None:
+            st = os.stat(path)
+        entry = self._entries.get(relpath)
+        if (entry is not None and entry[0] == st.st_size
+                and entry[1] == st.st_mtime and entry[2] == st.st_ino):
+            self.hits += 1
+            return entry[3]
+        self.misses += 1
+        return None
+
+    def set(self, path, content_md5, st=None):
+        """Record the Content-MD5 (base64) of the given file, as computed
+        from content read when it had the given (or current) stat.
+        """
+        relpath = self._relpath(path)
+        if relpath is None:
+            return
+        if st is None:
+            st = os.stat(path)
+        if st.st_mtime >= int(time.time()) - 1:
+            return   # racy: could be modified again in the same second
+        self._lock.acquire()
+        try:
+            self._entries[relpath] = [st.st_size, st.st_mtime, st.st_ino,
+                content_md5]
+            self._dirty = True
+        finally:
+            self._lock.release()
+
+    def md5(self, path):
+        """Return the Content-MD5 (base64) of the given file, hashing it
+        only if it isn't recorded or has changed.
+        """
+        f = open(path, 'rb')
+        try:
+            st = os.fstat(f.fileno())
+            content_md5 = self.get(path, st)
+            if content_md5 is not None:
+                return content_md5
+            md5 = hashlib.md5()
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                md5.update(chunk)
+        finally:
+            f.close()
+        content_md5 = base64.b64encode(md5.digest())
+        self.set(path, content_md5, st)
+        return content_md5
+
+    def get_decoded(self, path):
+        """Return (etag, content_md5) as recorded by `set_decoded()` for
+        the given file, or None.
+        """
+        relpath = self._relpath(path)
+        if relpath is None:
+            return None
+        decoded = self._decoded.get(relpath)
+        return decoded and tuple(decoded)
+
+    def set_decoded(self, path, etag, content_md5):
+        """Record that the given file was downloaded from the object with
+        the given etag, stored with a Content-Encoding, and that the decoded
+        content has the given Content-MD5 (base64).
+        """
+        relpath = self._relpath(path)
+        if relpath is None:
+            return
+        self._lock.acquire()
+        try:
+            self._decoded[relpath] = [etag, content_md5]
+            self._dirty = True
+        finally:
+            self._lock.release()
+
+    def prune(self):
+        """Drop entries for files that no longer exist."""
+        self._lock.acquire()
+        try:
+            for entries in (self._entries, self._decoded):
+                for relpath in list(entries):
+                    if not exists(join(self.root, *relpath.split('/'))):
+                        del entries[relpath]
+                        self._dirty = True
+        finally:
+            self._lock.release()
+
+    def save(self):
+        """Write the manifest, if it has changed."""
+        self._lock.acquire()
+        try:
+            if not self._dirty:
+                return
+            data = {"version": self.version, "root": self.root,
+                "files": self._entries}
+            if self._decoded:
+                data["decoded"] = self._decoded
+            d = dirname(self.path)
+            if not exists(d):
+                try:
+                    os.makedirs(d)
+                except OSError:
+                    if not exists(d):   # lost a race is fine
+                        raise
+            fd, tmp_path = tempfile.mkstemp(dir=d)
+            f = os.fdopen(fd, 'w')
+            try:
+                json.dump(data, f, separators=(',', ':'))
+            finally:
+                f.close()
+            if sys.platform == "win32" and exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+            self._dirty = False
+            log.debug("saved manifest for %s (%d files) to %s", self.root,
+                len(self._entries), self.path)
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dict of the manifest counters."""
+        return {"hits": self.hits, "misses": self.misses,
+            "files": len(self._entries)}
@@ -0,0 +1,118 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""The httplib2 parts of the Manta client: `MantaHttp` and connection
+classes that time connect and time to first byte.
+
+This is imported on the client's first request, rather than by
+`manta.client`, so that `import manta` doesn't load httplib2.
+"""
+
+import time
+import logging
+from pprint import pformat
+
+import httplib2
+
+from .client import _timing, _indent
+
+
+
+#---- globals
+
+log = logging.getLogger("manta.client")
+
+
+
+#---- internal support stuff
+
+def _timed_connect(connect, conn):
+    record = getattr(_timing, "record", None)
+    if record is None:
+        return connect(conn)
+    start = time.time()
+    try:
+        return connect(conn)
+    finally:
+        record["connect"] = (record["connect"] or 0.0) + time.time() - start
+
+def _timed_getresponse(getresponse, conn, *args, **kwargs):
+    response = getresponse(conn, *args, **kwargs)
+    record = getattr(_timing, "record", None)
+    if record is not None and record["ttfb"] is None:
+        record["ttfb"] = time.time() - record["start"]
+    return response
+
+class _TimedHTTPConnection(httplib2.HTTPConnectionWithTimeout):
+    def connect(self):
+        _timed_connect(httplib2.HTTPConnectionWithTimeout.connect, self)
+
+    def getresponse(self, *args, **kwargs):
+        return _timed_getresponse(
+            httplib2.HTTPConnectionWithTimeout.getresponse, self,
+            *args, **kwargs)
+
+class _TimedHTTPSConnection(httplib2.HTTPSConnectionWithTimeout):
+    def connect(self):
+        _timed_connect(httplib2.HTTPSConnectionWithTimeout.connect, self)
+
+    def getresponse(self, *args, **kwargs):
+        return _timed_getresponse(
+            httplib2.HTTPSConnectionWithTimeout.getresponse, self,
+            *args, **kwargs)
+
+_TIMED_CONNECTION_TYPES = {
+    "http": _TimedHTTPConnection,
+    "https": _TimedHTTPSConnection,
+}
+
+
+
+#---- exports
+
+class MantaHttp(httplib2.Http):
+    def request(self, uri, method="GET", body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        # Use connection classes that can time connect and TTFB.
+        if connection_type is None:
+            connection_type = _TIMED_CONNECTION_TYPES.get(
+                uri.split(':', 1)[0].lower())
+        return httplib2.Http.request(self, uri, method, body, headers,
+            redirections, connection_type)
+
+    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey):
+        if log.isEnabledFor(logging.DEBUG):
+            body_str = body or '(none)'
+            if body and len(body) > 1024:
+                body_str = body[:1021] + '...'
+            log.debug("req: %s %s\n%s", method, request_uri,
+                '\n'.join([
+                    _indent("host: " + host),
+                    _indent("headers: " + pformat(headers)),
+                    #_indent("cachekey: " + pformat(cachekey)), #XXX
+                    _indent("body: " + body_str)
+                ]))
+        res, content = httplib2.Http._request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("res: %s %s\n%s\n%s", method, request_uri,
+                _indent(pformat(res)),
+                (len(content) < 1024 and _indent(content)
+                 or _indent(content[:1021]+'...')))
+        return (res, content)
+
+    def new_connection(self, scheme, authority):
+        """Return a new, unpooled httplib connection for the given scheme
+        and authority. This mirrors the connection setup in
+        `httplib2.Http.request` (proxy, timeout and SSL settings) and is
+        used for requests whose response body is read incrementally.
+        """
+        connection_type = _TIMED_CONNECTION_TYPES[scheme]
+        proxy_info = self._get_proxy_info(scheme, authority)
+        if scheme == 'https':
+            return connection_type(authority, timeout=self.timeout,
+                proxy_info=proxy_info, ca_certs=self.ca_certs,
+                disable_ssl_certificate_validation=
+                    self.disable_ssl_certificate_validation)
+        else:
+            return connection_type(authority, timeout=self.timeout,
+                proxy_info=proxy_info)
@@ -0,0 +1,245 @@
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""In-process, aggregated client metrics.
+
+Usage:
+
+    metrics = manta.ClientMetrics()
+    client = manta.MantaClient(url, account, signer, metrics=metrics)
+    ...
+    metrics.snapshot()                          # a dict
+    metrics.write_prometheus("/var/lib/node_exporter/manta.prom")
+    metrics.write_json("manta-metrics.json")
+
+The client feeds `ClientMetrics` each request's record (see
+`RawMantaClient.add_request_hook`). Kept per operation (PutObject,
+GetObject, ListDirectory, CreateJob, ...): a latency histogram, counts by
+status and bytes sent/received. Also kept: error counts by Manta error code
+(e.g. "ResourceNotFound", from the error response body, else "HTTP 503" or
+the exception, e.g. "socket.error", for a failed connection) and the hit
+rates of the client's caches.
+
+The Prometheus text format output is suitable for node_exporter's textfile
+collector, so batch hosts can be scraped without a live service.
+"""
+
+import sys
+import os
+from os.path import exists, dirname
+import time
+import json
+import tempfile
+import threading
+
+
+
+#---- globals
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+    5.0, 10.0, 30.0, 60.0)
+
+
+
+#---- exports
+
+class ClientMetrics(object):
+    """Aggregated request metrics for one or more Manta clients.
+
+    @param buckets {list} Optional. Upper bounds (in seconds) of the latency
+        histogram buckets. Default is `DEFAULT_BUCKETS`. An implicit "+Inf"
+        bucket is added.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.start = time.time()
+        self._ops = {}
+        self._errors = {}
+        self._caches = []
+        self._lock = threading.Lock()
+
+    def add_cache(self, name, cache):
+        """Include the hit rate of the given cache (anything with a
+        `stats()` method returning "hits" and "misses") in the metrics.
+        """
+        if cache is not None and hasattr(cache, "stats"):
+            self._caches.append((name, cache))
+
+    def record_request(self, record):
+        """Add a request record. This is a request hook for
+        `RawMantaClient.add_request_hook`.
+        """
+        op = record["op"] or record["method"]
+        if record["status"] is not None:
+            status = str(record["status"])
+        else:
+            status = "error"
+        latency = record["total"]
+        i = 0
+        for bound in self.buckets:
+            if latency <= bound:
+                break
+            i += 1
+
+        self._lock.acquire()
+        try:
+            stats = self._ops.get(op)
+            if stats is None:
+                stats = self._ops[op] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * (len(self.buckets) + 1),
+                    "statuses": {},
+                    "bytes_in": 0,
+                    "bytes_out": 0,
+                }
+            stats["count"] += 1
+            stats["sum"] += latency
+            stats["buckets"][i] += 1
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            stats["bytes_in"] += record["bytes_in"]
+            stats["bytes_out"] += record["bytes_out"]
+
+            if record["error"] is not None:
+                code = _exception_name(record["error"])
+            elif record["status"] >= 400:
+                code = record.get("error_code") or "HTTP %s" % status
+            else:
+                code = None
+            if code is not None:
+                self._errors[code] = self._errors.get(code, 0) + 1
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        """Return the current metrics as a dict:
+
+            {"start": <time metrics started>,
+             "time": <time of the snapshot>,
+             "ops": {<op>: {"count": ..., "sum": <total seconds>,
+                            "buckets": [[<upper bound>, <cumulative count>],
+                                        ..., ["+Inf", <count>]],
+                            "statuses": {<status>: <count>, ...},
+                            "bytes_in": ..., "bytes_out": ...}, ...},
+             "errors": {<code>: <count>, ...},
+             "caches": {<name>: {"hits": ..., "misses": ...,
+                                 "hit_rate": <0..1, or None>}, ...}}
+        """
+        self._lock.acquire()
+        try:
+            ops = {}
+            for op, stats in self._ops.items():
+                stats = dict(stats, statuses=dict(stats["statuses"]))
+                cumulative = []
+                n = 0
+                for bound, count in zip(self.buckets + ("+Inf",),
+                                        stats["buckets"]):
+                    n += count
+                    cumulative.append([bound, n])
+                stats["buckets"] = cumulative
+                ops[op] = stats
+            errors = dict(self._errors)
+        finally:
+            self._lock.release()
+
+        caches = {}
+        for name, cache in self._caches:
+            stats = cache.stats()
+            hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+            caches[name] = {"hits": hits, "misses": misses,
+                "hit_rate": (hits + misses) and float(hits) / (hits + misses)
+                    or None}
+        return {"start": self.start, "time": time.time(), "ops": ops,
+            "errors": errors, "caches": caches}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+        def metric(name, mtype, help):
+            lines.append("# HELP %s %s" % (name, help))
+            lines.append("# TYPE %s %s" % (name, mtype))
+
+        metric("manta_request_duration_seconds", "histogram",
+            "Manta request latency, by operation.")
+        for op, stats in sorted(snap["ops"].items()):
+            for bound, count in stats["buckets"]:
+                lines.append("manta_request_duration_seconds_bucket%s %d"
+                    % (_labels(("op", op), ("le", bound)), count))
+            lines.append("manta_request_duration_seconds_sum%s %r"
+                % (_labels(("op", op)), stats["sum"]))
+            lines.append("manta_request_duration_seconds_count%s %d"
+                % (_labels(("op", op)), stats["count"]))
+        metric("manta_requests_total", "counter",
+            "Manta requests, by operation and response status.")
+        for op, stats in sorted(snap["ops"].items()):
+            for status, count in sorted(stats["statuses"].items()):
+                lines.append("manta_requests_total%s %d"
+                    % (_labels(("op", op), ("status", status)), count))
+        metric("manta_request_bytes_total", "counter",
+            "Request and response body bytes, by operation.")
+        for op, stats in sorted(snap["ops"].items()):
+            for direction in ("in", "out"):
+                lines.append("manta_request_bytes_total%s %d"
+                    % (_labels(("op", op), ("direction", direction)),
+                       stats["bytes_" + direction]))
+        metric("manta_request_errors_total", "counter",
+            "Failed Manta requests, by Manta error code.")
+        for code, count in sorted(snap["errors"].items()):
+            lines.append("manta_request_errors_total%s %d"
+                % (_labels(("code", code)), count))
+        for name, what in (("hits", "hits"), ("misses", "misses")):
+            metric("manta_cache_%s_total" % name, "counter",
+                "Client cache %s, by cache." % what)
+            for cache, stats in sorted(snap["caches"].items()):
+                lines.append("manta_cache_%s_total%s %d"
+                    % (name, _labels(("cache", cache)), stats[name]))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Write the metrics to the given file in the Prometheus text
+        format. The file is replaced atomically.
+        """
+        _write_atomic(path, self.to_prometheus())
+
+    def write_json(self, path):
+        """Write a JSON snapshot of the metrics to the given file. The file
+        is replaced atomically.
+        """
+        _write_atomic(path, self.to_json() + '\n')
+
+
+
+#---- internal support stuff
+
+def _labels(*labels):
+    """Format the given (name, value) label pairs, e.g.
+    '{op="GetObject",le="0.5"}'.
+    """
+    def escape(value):
+        return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+    return '{%s}' % ','.join('%s="%s"' % (k, escape(v)) for k, v in labels)
+
+def _exception_name(ex):
+    """Return the exception class name, e.g. "socket.error" or "IOError"."""
+    cls = ex.__class__
+    if cls.__module__ in ("exceptions", "builtins"):
+        return cls.__name__
+    return "%s.%s" % (cls.__module__, cls.__name__)
+
+def _write_atomic(path, content):
+    d = dirname(path) or os.curdir
+    fd, tmp_path = tempfile.mkstemp(dir=d, prefix=".metrics-")
+    f = os.fdopen(fd, 'w')
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    os.chmod(tmp_path, 0o644)
+    if sys.platform == "win32" and exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
@@ -3,20 +3,36 @@
 
 """Shared code for test case files."""
 
-__all__ = ["stor", "MantaTestCase"]
+__all__ = ["stor", "generate_key", "MantaTestCase", "FakeMantaTestCase"]
 
 import sys
 import os
+import atexit
 from posixpath import join as ujoin
 from pprint import pprint
 import unittest
 import subprocess
 from subprocess import PIPE
 
+from testlib import TestSkipped
+
 import manta
 
 
 
+#---- globals
+
+# With MANTA_URL=fake, run against a local stand-in Manta server (see
+# manta/fakemanta.py) instead. MANTA_USER and MANTA_KEY_ID are still used.
+if os.environ.get("MANTA_URL") == "fake":
+    from manta.fakemanta import FakeManta
+    _fake_manta = FakeManta()
+    _fake_manta.start()
+    atexit.register(_fake_manta.stop)
+    os.environ["MANTA_URL"] = _fake_manta.url
+
+
+
 #---- exports
 
 def stor(*subpaths):
@@ -28,6 +44,19 @@ def stor(*subpaths):
         subpath = subpath[1:]
     return "/%s/stor/%s" % (MANTA_USER, subpath)
 
+def generate_key(key_dir, key_type="rsa", bits=2048, passphrase=""):
+    """Generate an ssh key (in PEM format). Returns the private key path.
+    Raises TestSkipped if 'ssh-keygen' isn't available.
+    """
+    key_path = os.path.join(key_dir, "id_%s_%d" % (key_type, bits))
+    try:
+        subprocess.check_call(["ssh-keygen", "-q", "-t", key_type,
+            "-b", str(bits), "-N", passphrase, "-m", "PEM", "-f", key_path])
+    except (OSError, subprocess.CalledProcessError):
+        raise TestSkipped("could not generate a %s key with ssh-keygen"
+            % key_type)
+    return key_path
+
 class MantaTestCase(unittest.TestCase):
     def __init__(self, *args):
         self.account = os.environ["MANTA_USER"]
@@ -48,7 +77,10 @@ class MantaTestCase(unittest.TestCase):
                 disable_ssl_certificate_validation=MANTA_TLS_INSECURE)
         return self._client
 
-    def mantash(self, args):
+    def mantash(self, args, env=None):
+        """Run mantash with the given args (and, optionally, extra
+        environment variables). Returns (code, stdout, stderr).
+        """
         mantash = os.path.realpath(
             os.path.join(os.path.dirname(__file__), "..", "bin", "mantash"))
         argv = [sys.executable, mantash]
@@ -56,10 +88,40 @@ class MantaTestCase(unittest.TestCase):
         if MANTA_INSECURE:
             argv.append('-k')
         argv += args
+        if env is not None:
+            env = dict(os.environ, **env)
         p = subprocess.Popen(argv, shell=False, stdout=PIPE, stderr=PIPE,
-                             close_fds=True)
+                             close_fds=True, env=env)
         p.wait()
         stdout = p.stdout.read()
         stderr = p.stderr.read()
         code = p.returncode
         return code, stdout, stderr
+
+class FakeMantaTestCase(MantaTestCase):
+    """A test case with its own local stand-in Manta server, `self.server`
+    (see manta/fakemanta.py), for tests that need to control the server,
+    e.g. to inject faults. Use `new_client()` for a client for it.
+    """
+    def setUp(self):
+        from manta.fakemanta import FakeManta
+        self.server = FakeManta()
+        self.server.start()
+        self.server.ensure_account(self.account)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def new_client(self, **kwargs):
+        """A client for `self.server`, with the given extra MantaClient
+        arguments. The HTTP cache is off by default.
+        """
+        kwargs.setdefault("http_cache", "none")
+        signer = manta.SSHAgentSigner(key_id=os.environ['MANTA_KEY_ID'])
+        return manta.MantaClient(url=self.server.url, account=self.account,
+            signer=signer, **kwargs)
+
+    def mantash(self, args, env=None):
+        """Run mantash against `self.server`, without the HTTP cache."""
+        return MantaTestCase.mantash(self,
+            ["-u", self.server.url, "--http-cache", "none"] + args, env)
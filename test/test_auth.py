@@ -0,0 +1,509 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Test request signing (manta.auth) and the crypto backends
+(manta.crypto).
+"""
+
+import os
+import sys
+import re
+import json
+import time
+import logging
+import signal
+import threading
+import subprocess
+import urllib2
+import unittest
+import shutil
+import tempfile
+
+from testlib import TestError, TestSkipped, tag
+
+from common import *
+import manta
+from manta import auth, crypto
+from manta.auth import ssh_key_info_from_key_data, ecdsa_signature_to_der
+from manta.fakemanta import FakeManta
+
+
+
+#---- internal support stuff
+
+def _start_agent():
+    """Start an ssh-agent, and point SSH_AUTH_SOCK at it.
+
+    @returns {dict} The agent's environment and the saved environment, to
+        give to `_stop_agent`.
+    """
+    try:
+        output = subprocess.check_output(["ssh-agent", "-s"])
+    except (OSError, subprocess.CalledProcessError):
+        raise TestSkipped("could not start an ssh-agent")
+    agent_env = dict(re.findall(r"(SSH_AUTH_SOCK|SSH_AGENT_PID)=([^;]+);",
+        output))
+    saved_env = dict((k, os.environ.get(k)) for k in agent_env)
+    os.environ.update(agent_env)
+    return {"agent_env": agent_env, "saved_env": saved_env}
+
+def _stop_agent(agent):
+    os.kill(int(agent["agent_env"]["SSH_AGENT_PID"]), signal.SIGTERM)
+    for k, v in agent["saved_env"].items():
+        if v is None:
+            del os.environ[k]
+        else:
+            os.environ[k] = v
+
+def _ssh_add(key_path):
+    subprocess.check_call(["ssh-add", "-q", key_path],
+        stderr=open(os.devnull, "w"))
+
+
+
+#---- test cases
+
+class CryptoBackendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_auth-")
+        self.key_path = generate_key(self.tmp)
+        self.priv_key = open(self.key_path).read()
+        self.pub_key = open(self.key_path + ".pub").read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_sign_verify(self):
+        for name in crypto.available_backends():
+            backend = crypto.get_backend(name)
+            key = backend.load_private_key(self.priv_key)
+            self.assertEqual((key.key_type, key.algorithm),
+                ("rsa", "rsa-sha256"))
+            pub = backend.load_public_key(self.pub_key)
+            for hash_name in ("sha1", "sha256", "sha512"):
+                sig = key.sign("data", hash_name)
+                self.assertTrue(pub.verify("data", sig, hash_name), name)
+                self.assertFalse(pub.verify("other", sig, hash_name), name)
+            self.assertFalse(pub.verify("data", sig, "md5"), name)
+
+    def test_same_signatures(self):
+        # RSA PKCS#1 v1.5 signatures are deterministic, so the backends
+        # must agree.
+        names = crypto.available_backends()
+        if len(names) < 2:
+            raise TestSkipped("only one crypto backend is installed")
+        sigs = set(crypto.get_backend(name).load_private_key(self.priv_key)
+            .sign("data", "sha256") for name in names)
+        self.assertEqual(len(sigs), 1)
+
+    def test_get_backend(self):
+        self.assertRaises(manta.MantaError, crypto.get_backend, "bogus")
+        name = crypto.available_backends()[-1]
+        os.environ["MANTA_CRYPTO_BACKEND"] = name
+        try:
+            self.assertEqual(crypto.get_backend().name, name)
+        finally:
+            del os.environ["MANTA_CRYPTO_BACKEND"]
+        backend = crypto.get_backend(name)
+        self.assertTrue(crypto.get_backend(backend) is backend)
+
+    def test_pycrypto_rsa_only(self):
+        if "pycrypto" not in crypto.available_backends():
+            raise TestSkipped("the 'pycrypto' backend isn't installed")
+        key_path = generate_key(self.tmp, "ecdsa", 256)
+        backend = crypto.get_backend("pycrypto")
+        self.assertRaises(manta.MantaError, backend.load_private_key,
+            open(key_path).read())
+        self.assertRaises(manta.MantaError, backend.load_public_key,
+            open(key_path + ".pub").read())
+
+    def test_encrypted(self):
+        key_dir = os.path.join(self.tmp, "encrypted")
+        os.mkdir(key_dir)
+        key_path = generate_key(key_dir, passphrase="sekrit")
+        priv_key = open(key_path).read()
+        for name in crypto.available_backends():
+            backend = crypto.get_backend(name)
+            self.assertRaises(ValueError, backend.load_private_key, priv_key)
+            self.assertRaises(ValueError, backend.load_private_key, priv_key,
+                "wrong")
+        # PyCrypto can't decrypt ssh-keygen's (AES) encrypted PEM keys.
+        if "cryptography" in crypto.available_backends():
+            key = crypto.get_backend("cryptography").load_private_key(
+                priv_key, "sekrit")
+            self.assertEqual(key.key_type, "rsa")
+        self.assertRaises(manta.MantaError, ssh_key_info_from_key_data,
+            key_path, prompt=False)
+
+class BackendSigningTestCase(MantaTestCase):
+    """Requests signed with each crypto backend, checked by a server that
+    knows the key.
+    """
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_auth-")
+        self.key_path = generate_key(self.tmp)
+        self.server = FakeManta(keys=[open(self.key_path + ".pub").read()])
+        self.server.start()
+        self.server.ensure_account(self.account)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_backends(self):
+        for name in crypto.available_backends():
+            signer = manta.PrivateKeySigner(self.key_path, backend=name)
+            client = manta.MantaClient(self.server.url, self.account, signer,
+                http_cache="none")
+            client.put_object(stor(name), content=name)
+            self.assertEqual(client.get_object(stor(name)), name)
+
+class ECDSATestCase(MantaTestCase):
+    """Requests signed with ECDSA keys of each curve, from a key file and
+    from an ssh-agent.
+    """
+    curves = {256: "ecdsa-sha256", 384: "ecdsa-sha384", 521: "ecdsa-sha512"}
+
+    def setUp(self):
+        if "cryptography" not in crypto.available_backends():
+            raise TestSkipped("ECDSA keys need the 'cryptography' backend")
+        self.tmp = tempfile.mkdtemp(prefix="test_auth-")
+        self.key_paths = dict((bits, generate_key(self.tmp, "ecdsa", bits))
+            for bits in self.curves)
+        self.server = FakeManta(keys=[open(p + ".pub").read()
+            for p in self.key_paths.values()])
+        self.server.start()
+        self.server.ensure_account(self.account)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def check_signer(self, signer, algorithm):
+        self.assertEqual(signer.sign("data")[0], algorithm)
+        client = manta.MantaClient(self.server.url, self.account, signer,
+            http_cache="none")
+        client.put_object(stor(algorithm), content="content")
+        self.assertEqual(client.get_object(stor(algorithm)), "content")
+
+    def test_key_file(self):
+        for bits, algorithm in sorted(self.curves.items()):
+            self.check_signer(manta.PrivateKeySigner(self.key_paths[bits]),
+                algorithm)
+
+    def test_agent(self):
+        agent = _start_agent()
+        try:
+            for bits, algorithm in sorted(self.curves.items()):
+                _ssh_add(self.key_paths[bits])
+                self.check_signer(
+                    manta.SSHAgentSigner(self.key_paths[bits]), algorithm)
+        finally:
+            _stop_agent(agent)
+
+    def test_der(self):
+        # SSH mpints (r=1, s=128) to a DER SEQUENCE of two INTEGERs.
+        sig = "\0\0\0\x01\x01\0\0\0\x02\0\x80"
+        self.assertEqual(ecdsa_signature_to_der(sig),
+            "\x30\x07\x02\x01\x01\x02\x02\x00\x80")
+
+class KeyIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_auth-")
+        self.ssh_dir = os.path.join(self.tmp, ".ssh")
+        os.mkdir(self.ssh_dir)
+        self.key_paths = [generate_key(self.ssh_dir, bits=bits)
+            for bits in (1024, 2048)]
+        self.fingerprints = [
+            auth.fingerprint_from_ssh_pub_key(open(p + ".pub").read())
+            for p in self.key_paths]
+        self.saved = (os.environ.get("HOME"), os.environ.get("SSH_AUTH_SOCK"),
+            auth.KEY_INDEX_PATH, auth.fingerprint_from_ssh_pub_key)
+        os.environ["HOME"] = self.tmp
+        os.environ.pop("SSH_AUTH_SOCK", None)
+        auth.KEY_INDEX_PATH = os.path.join(self.tmp, "key-index.json")
+        # Count the key files fingerprinted.
+        self.fingerprinted = []
+        def fingerprint(data):
+            self.fingerprinted.append(data)
+            return self.saved[3](data)
+        auth.fingerprint_from_ssh_pub_key = fingerprint
+
+    def tearDown(self):
+        home, sock, auth.KEY_INDEX_PATH, auth.fingerprint_from_ssh_pub_key \
+            = self.saved
+        os.environ["HOME"] = home
+        if sock is not None:
+            os.environ["SSH_AUTH_SOCK"] = sock
+        shutil.rmtree(self.tmp)
+
+    def index(self):
+        return json.load(open(auth.KEY_INDEX_PATH))
+
+    def test_find(self):
+        path = auth.find_pub_key_path(self.fingerprints[1])
+        self.assertEqual(path, self.key_paths[1] + ".pub")
+        self.assertEqual(len(self.fingerprinted), 2)
+        self.assertEqual(sorted(self.index()["pub_keys"]),
+            sorted(p + ".pub" for p in self.key_paths))
+        # Now from the index, without reading the keys.
+        path = auth.find_pub_key_path(self.fingerprints[0])
+        self.assertEqual(path, self.key_paths[0] + ".pub")
+        self.assertEqual(len(self.fingerprinted), 2)
+        self.assertEqual(auth.find_pub_key_path("00" + ":00" * 15), None)
+
+    def test_changed(self):
+        auth.find_pub_key_path(self.fingerprints[0])
+        # Replace the first key, and remove the second.
+        for ext in ("", ".pub"):
+            os.remove(self.key_paths[0] + ext)
+            os.remove(self.key_paths[1] + ext)
+        new_path = generate_key(self.ssh_dir, bits=1024)
+        fingerprint = self.saved[3](open(new_path + ".pub").read())
+        self.assertEqual(auth.find_pub_key_path(self.fingerprints[0]), None)
+        self.assertEqual(auth.find_pub_key_path(fingerprint),
+            new_path + ".pub")
+        self.assertEqual(self.index()["pub_keys"].keys(), [new_path + ".pub"])
+
+    def test_bad_index(self):
+        open(auth.KEY_INDEX_PATH, "w").write("{bogus")
+        self.assertEqual(auth.find_pub_key_path(self.fingerprints[0]),
+            self.key_paths[0] + ".pub")
+        self.assertEqual(self.index()["version"], 1)
+
+    def test_no_index(self):
+        auth.KEY_INDEX_PATH = None
+        self.assertEqual(auth.find_pub_key_path(self.fingerprints[0]),
+            self.key_paths[0] + ".pub")
+        self.assertFalse(os.path.exists(
+            os.path.join(self.tmp, "key-index.json")))
+
+    def test_key_source(self):
+        # With no agent, the key file is used, and remembered.
+        signer = manta.CLISigner(self.fingerprints[0])
+        self.assertEqual(signer.sign("data")[1], self.fingerprints[0])
+        self.assertEqual(self.index()["sources"],
+            {self.fingerprints[0]: "ssh_key"})
+        self.assertEqual(auth._get_key_source(self.fingerprints[0]),
+            "ssh_key")
+
+class ProcessPoolSignerTestCase(MantaTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_auth-")
+        self.key_path = generate_key(self.tmp)
+        self.pub_key = open(self.key_path + ".pub").read()
+        self.signer = manta.ProcessPoolSigner(self.key_path, processes=2)
+
+    def tearDown(self):
+        self.signer.close()
+        shutil.rmtree(self.tmp)
+
+    def verify(self, s, signature):
+        algorithm, fingerprint, sig = signature
+        self.assertEqual(algorithm, "rsa-sha256")
+        self.assertEqual(fingerprint,
+            auth.fingerprint_from_ssh_pub_key(self.pub_key))
+        pub = crypto.get_backend().load_public_key(self.pub_key)
+        return pub.verify(s, sig.decode("base64"), "sha256")
+
+    def test_sign(self):
+        self.assertTrue(self.verify("data", self.signer.sign("data")))
+        strings = ["data%d" % i for i in range(100)]
+        signatures = self.signer.sign_many(strings)
+        self.assertEqual(len(signatures), 100)
+        for s, signature in zip(strings, signatures):
+            self.assertTrue(self.verify(s, signature))
+        self.assertFalse(self.verify("other", signatures[0]))
+
+    def test_close(self):
+        self.signer.close()
+        self.assertRaises(manta.MantaError, self.signer.sign, "data")
+        self.signer.start()
+        self.assertTrue(self.verify("data", self.signer.sign("data")))
+
+    def test_dead_worker(self):
+        os.kill(list(self.signer._pids)[0], signal.SIGKILL)
+        # The pool replaces the worker.
+        for i in range(50):
+            if auth._pool_pids(self.signer._pool) != self.signer._pids:
+                break
+            time.sleep(0.1)
+        level = auth.log.level
+        auth.log.setLevel(logging.ERROR)
+        try:
+            self.signer._check_workers()
+        finally:
+            auth.log.setLevel(level)
+        try:
+            self.signer.sign("data")
+        except manta.MantaError:
+            _, ex, _ = sys.exc_info()
+            self.assertTrue("closed" in str(ex), str(ex))
+        else:
+            self.fail("signing with a closed ProcessPoolSigner succeeded")
+
+    def test_timeout(self):
+        self.signer.close()
+        signer = manta.ProcessPoolSigner(self.key_path, processes=1,
+            timeout=0.5)
+        pid = list(signer._pids)[0]
+        os.kill(pid, signal.SIGSTOP)
+        try:
+            try:
+                signer.sign("data")
+            except manta.MantaError:
+                _, ex, _ = sys.exc_info()
+                self.assertTrue("timed out" in str(ex), str(ex))
+            else:
+                self.fail("signing with a stopped worker succeeded")
+        finally:
+            os.kill(pid, signal.SIGCONT)
+            signer.close()
+
+    def test_requests(self):
+        server = FakeManta(keys=[self.pub_key])
+        server.start()
+        try:
+            server.ensure_account(self.account)
+            client = manta.MantaClient(server.url, self.account, self.signer,
+                http_cache="none")
+            client.put_object(stor("obj"), content="content")
+            self.assertEqual(client.get_object(stor("obj")), "content")
+        finally:
+            server.stop()
+
+class SignedURLTestCase(MantaTestCase):
+    """Signed URLs, fetched without credentials from a server that
+    checks them.
+    """
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_auth-")
+        self.key_path = generate_key(self.tmp)
+        self.server = FakeManta(keys=[open(self.key_path + ".pub").read()])
+        self.server.start()
+        self.server.ensure_account(self.account)
+        self.server.put(stor("obj"), "content", "text/plain")
+        self.server.put(stor("a b"), "a b", "text/plain")
+        self.client = manta.MantaClient(self.server.url, self.account,
+            manta.PrivateKeySigner(self.key_path), http_cache="none")
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def fetch(self, url, method="GET"):
+        """Return (status, content) for a request without credentials."""
+        request = urllib2.Request(url)
+        request.get_method = lambda: method
+        try:
+            return 200, urllib2.urlopen(request).read()
+        except urllib2.HTTPError:
+            _, ex, _ = sys.exc_info()
+            return ex.code, None
+
+    def test_get(self):
+        url = self.client.sign_url(stor("obj"))
+        self.assertEqual(self.fetch(url), (200, "content"))
+        self.assertEqual(self.fetch(url, "HEAD")[0], 403)
+        self.assertEqual(self.fetch(url.replace("/obj?", "/a%20b?"))[0], 403)
+
+    def test_head(self):
+        url = self.client.sign_url(stor("obj"), method="HEAD")
+        self.assertEqual(self.fetch(url, "HEAD"), (200, ""))
+        self.assertEqual(self.fetch(url)[0], 403)
+        self.assertRaises(manta.MantaError, self.client.sign_url, stor("obj"),
+            "PUT")
+
+    def test_expires(self):
+        url = self.client.sign_url(stor("obj"),
+            expires=int(time.time()) - 10)
+        self.assertEqual(self.fetch(url)[0], 403)
+        url = self.client.sign_url(stor("obj"))
+        expires = int(re.search(r"expires=(\d+)", url).group(1))
+        self.assertTrue(0 < expires - time.time()
+            <= manta.client.DEFAULT_SIGNED_URL_EXPIRY)
+
+    def test_sign_urls(self):
+        urls = self.client.sign_urls([stor("a b"), stor("obj")])
+        self.assertEqual([self.fetch(url) for url in urls],
+            [(200, "a b"), (200, "content")])
+
+class ConcurrentAgentSigningTestCase(MantaTestCase):
+    """Signing from many threads through one ssh-agent connection, as
+    e.g. `stat_many`, 'mantash sync' and 'mantash jobinfo' do.
+    """
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_auth-")
+        self.key_path = generate_key(self.tmp)
+        self.pub_key = open(self.key_path + ".pub").read()
+        self.saved_index_path = auth.KEY_INDEX_PATH
+        auth.KEY_INDEX_PATH = None
+        self.agent = _start_agent()
+        _ssh_add(self.key_path)
+
+    def tearDown(self):
+        _stop_agent(self.agent)
+        auth.KEY_INDEX_PATH = self.saved_index_path
+        shutil.rmtree(self.tmp)
+
+    def sign_in_threads(self, signer, num_threads=5, num_signs=100):
+        """Sign from many threads at once, switching threads as often as
+        possible. Returns the errors and the (string, signature) pairs.
+        """
+        errors = []
+        signed = []
+        def sign():
+            try:
+                for i in range(num_signs):
+                    s = "%s data%d" % (threading.current_thread().name, i)
+                    signed.append((s, signer.sign(s)))
+            except Exception:
+                _, ex, _ = sys.exc_info()
+                errors.append(ex)
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            threads = [threading.Thread(target=sign)
+                for i in range(num_threads)]
+            for t in threads:
+                t.daemon = True
+                t.start()
+            for t in threads:
+                t.join(60)
+                self.assertFalse(t.is_alive(), "signing hung")
+        finally:
+            sys.setcheckinterval(interval)
+        return errors, signed
+
+    def check_signer(self, signer):
+        errors, signed = self.sign_in_threads(signer)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(signed), 500)
+        pub = crypto.get_backend().load_public_key(self.pub_key)
+        for s, (algorithm, fingerprint, sig) in signed:
+            self.assertEqual(algorithm, "rsa-sha1")
+            self.assertTrue(pub.verify(s, sig.decode("base64"), "sha1"))
+
+    def test_agent_signer(self):
+        self.check_signer(manta.SSHAgentSigner(self.key_path))
+
+    def test_cli_signer(self):
+        signer = manta.CLISigner(self.key_path)
+        self.check_signer(signer)
+        self.assertEqual(signer._get_key_info()["type"], "agent")
+
+    def test_stat_many(self):
+        server = FakeManta(keys=[self.pub_key])
+        server.start()
+        try:
+            server.ensure_account(self.account)
+            mpaths = [stor("d%d" % (i % 4), "obj%d" % i) for i in range(40)]
+            for mpath in mpaths:
+                server.put(mpath, "content")
+            client = manta.MantaClient(server.url, self.account,
+                manta.SSHAgentSigner(self.key_path), http_cache="none")
+            dirents = client.stat_many(mpaths, md5=True)
+            self.assertEqual(sorted(dirents), sorted(mpaths))
+            self.assertTrue(all(d is not None for d in dirents.values()))
+        finally:
+            server.stop()
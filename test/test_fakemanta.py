@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Test the local stand-in Manta server (manta.fakemanta)."""
+
+import os
+import sys
+from posixpath import join as ujoin
+from pprint import pprint
+import unittest
+import shutil
+import tempfile
+
+from testlib import TestError, TestSkipped, tag
+
+from common import *
+import manta
+from manta.client import RETRYABLE_ERRORS
+from manta.fakemanta import FakeManta
+
+
+
+#---- test cases
+
+class NamespaceTestCase(FakeMantaTestCase):
+    def test_put_get(self):
+        client = self.new_client()
+        client.mkdirp(stor("a/b"))
+        client.put_object(stor("a/b/obj.txt"), content="hi there")
+        self.assertEqual(client.get_object(stor("a/b/obj.txt")), "hi there")
+        self.assertEqual(client.ls(stor("a/b")).keys(), ["obj.txt"])
+        self.assertEqual(self.server.requests[-1],
+            ("GET", stor("a/b"), 200))
+
+    def test_missing(self):
+        client = self.new_client()
+        try:
+            client.get_object(stor("nope"))
+        except manta.MantaAPIError, ex:
+            self.assertEqual(ex.code, "ResourceNotFound")
+        else:
+            self.fail("no error getting a missing object")
+
+    def test_synthetic_tree(self):
+        self.server.add_synthetic_tree(stor("syn"), 10, fanout=4, size=100)
+        client = self.new_client()
+        objs = []
+        for dirpath, dirents, objents in client.walk(stor("syn")):
+            objs += [ujoin(dirpath, o["name"]) for o in objents]
+        self.assertEqual(len(objs), 10)
+        self.assertEqual(len(client.get_object(objs[0])), 100)
+
+class FaultTestCase(FakeMantaTestCase):
+    def test_status(self):
+        client = self.new_client()
+        self.server.put(stor("obj"), "content")
+        self.server.add_fault(method="GET", path=stor("obj"), status=503)
+        try:
+            client.get_object(stor("obj"))
+        except manta.MantaAPIError, ex:
+            self.assertEqual(ex.res.status, 503)
+        else:
+            self.fail("no injected error")
+        # Only `count` (1) request is failed.
+        self.assertEqual(client.get_object(stor("obj")), "content")
+
+    def test_path_prefix(self):
+        client = self.new_client()
+        self.server.put(stor("d/obj"), "content")
+        self.server.add_fault(path=stor("d") + "/", status=500, count=2)
+        self.assertRaises(manta.MantaAPIError, client.get_object,
+            stor("d/obj"))
+        self.assertRaises(manta.MantaAPIError, client.get_object,
+            stor("d/obj"))
+        self.assertEqual(client.get_object(stor("d/obj")), "content")
+
+    def test_drop(self):
+        client = self.new_client()
+        self.server.put(stor("obj"), "content")
+        # A single dropped connection is retried by httplib2.
+        self.server.add_fault(path=stor("obj"), drop=True, count=2)
+        self.assertRaises(RETRYABLE_ERRORS, client.get_object, stor("obj"))
+        self.assertEqual(self.server.requests[-1], ("GET", stor("obj"), None))
+
+class AuthTestCase(MantaTestCase):
+    """Signature checking, by a server that knows one generated key."""
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_fakemanta-")
+        self.key_path = generate_key(self.tmp)
+        self.server = FakeManta(
+            keys=[open(self.key_path + ".pub").read()])
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def client(self, key_path):
+        return manta.MantaClient(self.server.url, self.account,
+            manta.PrivateKeySigner(key_path), http_cache="none")
+
+    def test_good_key(self):
+        client = self.client(self.key_path)
+        client.put_object(stor("obj"), content="content")
+        self.assertEqual(client.get_object(stor("obj")), "content")
+
+    def test_unknown_key(self):
+        other_dir = os.path.join(self.tmp, "other")
+        os.mkdir(other_dir)
+        client = self.client(generate_key(other_dir))
+        try:
+            client.ls(stor())
+        except manta.MantaAPIError, ex:
+            self.assertEqual(ex.code, "KeyDoesNotExist")
+        else:
+            self.fail("an unknown key was accepted")
+
+    def test_other_account(self):
+        client = self.client(self.key_path)
+        try:
+            client.ls("/somebody-else/stor")
+        except manta.MantaAPIError, ex:
+            self.assertEqual(ex.code, "AuthorizationFailed")
+        else:
+            self.fail("could access another account")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Test the HTTP cache backends (manta.httpcache)."""
+
+import os
+import sys
+from os.path import join
+import unittest
+import shutil
+import tempfile
+
+from testlib import TestError, TestSkipped, tag
+
+from common import *
+import manta
+from manta.httpcache import http_cache_from_spec
+
+
+
+#---- test cases
+
+class MemoryCacheTestCase(unittest.TestCase):
+    def test_get_set_delete(self):
+        cache = manta.MemoryCache()
+        self.assertEqual(cache.get("a"), None)
+        cache.set("a", "aaa")
+        self.assertEqual(cache.get("a"), "aaa")
+        cache.set("a", "AAAA")
+        self.assertEqual(cache.get("a"), "AAAA")
+        self.assertEqual(cache.size, 4)
+        cache.delete("a")
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.size, 0)
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 2})
+
+    def test_lru(self):
+        cache = manta.MemoryCache(max_size=30)
+        for key in "abc":
+            cache.set(key, key * 10)
+        cache.get("a")      # now "b" is least recently used
+        cache.set("d", "d" * 10)
+        self.assertEqual(cache.get("b"), None)
+        for key in "acd":
+            self.assertEqual(cache.get(key), key * 10)
+        self.assertEqual(cache.size, 30)
+
+    def test_too_big(self):
+        cache = manta.MemoryCache(max_size=10)
+        cache.set("a", "a" * 11)
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.size, 0)
+
+class DiskCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_httpcache-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_get_set_delete(self):
+        cache = manta.DiskCache(self.tmp, shards=4)
+        self.assertEqual(cache.get("a"), None)
+        cache.set("a", "aaa")
+        self.assertEqual(cache.get("a"), "aaa")
+        # Shared with another instance (e.g. in another process).
+        self.assertEqual(manta.DiskCache(self.tmp, shards=4).get("a"), "aaa")
+        cache.delete("a")
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2})
+        self.assertTrue(set(os.listdir(self.tmp))
+            <= set(["00", "01", "02", "03"]))
+
+    def test_evict(self):
+        cache = manta.DiskCache(self.tmp, max_size=1000, shards=1)
+        for i in range(20):
+            cache.set("key%d" % i, "x" * 100)
+        entries, size = cache._scan(join(self.tmp, "00"))
+        self.assertTrue(size <= 1000)
+        self.assertEqual(cache.get("key19"), "x" * 100)
+        self.assertEqual(cache.get("key0"), None)
+
+    def test_bad_shards(self):
+        self.assertRaises(manta.MantaError, manta.DiskCache, self.tmp,
+            shards=0)
+        self.assertRaises(manta.MantaError, manta.DiskCache, self.tmp,
+            shards=257)
+
+class SpecTestCase(unittest.TestCase):
+    def test_specs(self):
+        self.assertEqual(http_cache_from_spec("none", "/nope"), None)
+        self.assertEqual(http_cache_from_spec(None, "/nope"), None)
+        self.assertTrue(isinstance(http_cache_from_spec("memory", "/nope"),
+            manta.MemoryCache))
+        cache = http_cache_from_spec("disk", "/nope")
+        self.assertTrue(isinstance(cache, manta.DiskCache))
+        self.assertEqual(cache.cache_dir, "/nope")
+        cache = manta.MemoryCache()
+        self.assertTrue(http_cache_from_spec(cache, "/nope") is cache)
+        self.assertRaises(manta.MantaError, http_cache_from_spec, "bogus",
+            "/nope")
+
+class ClientTestCase(FakeMantaTestCase):
+    def test_revalidate(self):
+        cache = manta.MemoryCache()
+        client = self.new_client(http_cache=cache)
+        self.server.put(stor("obj"), "content")
+        self.assertEqual(client.get_object(stor("obj")), "content")
+        self.assertEqual(client.get_object(stor("obj")), "content")
+        self.assertEqual(self.server.requests[-1], ("GET", stor("obj"), 304))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_none(self):
+        client = self.new_client(http_cache="none")
+        self.server.put(stor("obj"), "content")
+        client.get_object(stor("obj"))
+        client.get_object(stor("obj"))
+        self.assertEqual(self.server.requests[-1], ("GET", stor("obj"), 200))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Joyent, Inc.  All rights reserved.
+
+"""Test the checksum manifest (manta.manifest)."""
+
+import os
+import sys
+from os.path import join
+import unittest
+import shutil
+import tempfile
+import hashlib
+import base64
+import time
+
+from testlib import TestError, TestSkipped, tag
+
+from common import *
+import manta
+
+
+
+#---- internal support stuff
+
+def _write(path, content, age=60):
+    """Write a file, with an mtime `age` seconds ago (so that it isn't
+    "racy" for the manifest).
+    """
+    f = open(path, "wb")
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+def _md5(content):
+    return base64.b64encode(hashlib.md5(content).digest())
+
+
+
+#---- test cases
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_manifest-")
+        self.root = join(self.tmp, "root")
+        self.cache_dir = join(self.tmp, "cache")
+        os.mkdir(self.root)
+        self.path = join(self.root, "a.txt")
+        _write(self.path, "this is a\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def new_manifest(self):
+        return manta.ChecksumManifest(self.root, cache_dir=self.cache_dir)
+
+    def test_md5(self):
+        manifest = self.new_manifest()
+        self.assertEqual(manifest.md5(self.path), _md5("this is a\n"))
+        self.assertEqual(manifest.md5(self.path), _md5("this is a\n"))
+        self.assertEqual(manifest.stats(),
+            {"hits": 1, "misses": 1, "files": 1})
+
+    def test_save_load(self):
+        manifest = self.new_manifest()
+        manifest.md5(self.path)
+        manifest.save()
+        manifest = self.new_manifest()
+        self.assertEqual(manifest.get(self.path), _md5("this is a\n"))
+
+    def test_changed(self):
+        manifest = self.new_manifest()
+        manifest.md5(self.path)
+        _write(self.path, "this is A\n", age=30)
+        self.assertEqual(manifest.get(self.path), None)
+        self.assertEqual(manifest.md5(self.path), _md5("this is A\n"))
+
+    def test_racy(self):
+        # A file modified just now may change again within the same
+        # (mtime) second, so isn't recorded.
+        manifest = self.new_manifest()
+        _write(self.path, "this is a\n", age=0)
+        manifest.md5(self.path)
+        self.assertEqual(manifest.stats()["files"], 0)
+
+    def test_outside_root(self):
+        manifest = self.new_manifest()
+        path = join(self.tmp, "b.txt")
+        _write(path, "this is b\n")
+        self.assertEqual(manifest.md5(path), _md5("this is b\n"))
+        self.assertEqual(manifest.stats()["files"], 0)
+
+    def test_prune(self):
+        manifest = self.new_manifest()
+        manifest.md5(self.path)
+        os.remove(self.path)
+        manifest.prune()
+        self.assertEqual(manifest.stats()["files"], 0)
+
+    def test_decoded(self):
+        manifest = self.new_manifest()
+        self.assertEqual(manifest.get_decoded(self.path), None)
+        manifest.set_decoded(self.path, "etag", _md5("this is a\n"))
+        manifest.save()
+        manifest = self.new_manifest()
+        self.assertEqual(manifest.get_decoded(self.path),
+            ("etag", _md5("this is a\n")))
+        os.remove(self.path)
+        manifest.prune()
+        self.assertEqual(manifest.get_decoded(self.path), None)
+
+class ClientTestCase(FakeMantaTestCase):
+    def test_put_object(self):
+        tmp = tempfile.mkdtemp(prefix="test_manifest-")
+        try:
+            path = join(tmp, "a.txt")
+            _write(path, "this is a\n")
+            manifest = manta.ChecksumManifest(tmp,
+                cache_dir=join(tmp, "cache"))
+            client = self.new_client(manifest=manifest)
+            client.put_object(stor("a.txt"), path=path)
+            client.put_object(stor("b.txt"), path=path)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(manifest.stats(),
+            {"hits": 1, "misses": 1, "files": 1})
+        self.assertEqual(client.get_object(stor("b.txt")), "this is a\n")
@@ -10,11 +10,21 @@ from posixpath import dirname as udirname, basename as ubasename, join as ujoin
 from pprint import pprint
 import unittest
 import codecs
+import logging
+import time
+import json
+import shutil
+import tempfile
+import threading
+import socket
+import errno
+from io import BytesIO
 
 from testlib import TestError, TestSkipped, tag
 
 from common import *
 import manta
+from manta.client import RETRYABLE_ERRORS
 
 
 
@@ -149,3 +159,644 @@ class ManyFilesTestCase(MantaTestCase):
     def test_count(self):
         ls = self.client.ls(stor(self.base))
         self.assertEqual(len(ls), 1100)
+
+
+class JobStreamsTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.client = self.new_client()
+        self.inputs = [stor("in%02d.txt" % i) for i in range(20)]
+        for i, key in enumerate(self.inputs):
+            self.server.put(key, "input %d\n" % i)
+        self.job_id = self.client.create_job([{"exec": "wc -l"}])
+        self.client.add_job_inputs(self.job_id, self.inputs)
+        self.client.end_job_input(self.job_id)
+        deadline = time.time() + 30
+        while self.client.get_job(self.job_id)["state"] != "done":
+            if time.time() > deadline:
+                raise TestError("job %s didn't finish" % self.job_id)
+            time.sleep(0.1)
+
+    def test_iter_input(self):
+        it = self.client.iter_job_input(self.job_id)
+        self.assertFalse(isinstance(it, list))
+        self.assertEqual(list(it), self.inputs)
+        self.assertEqual(self.client.get_job_input(self.job_id), self.inputs)
+
+    def test_iter_output(self):
+        outputs = list(self.client.iter_job_output(self.job_id))
+        self.assertEqual(len(outputs), len(self.inputs))
+        self.assertEqual(outputs, self.client.get_job_output(self.job_id))
+        self.assertEqual(self.client.get_object(outputs[0]).strip(), "1")
+
+    def test_partial_read(self):
+        # Stop reading part way: the response is closed and the client
+        # still works.
+        it = self.client.iter_job_input(self.job_id)
+        self.assertEqual(next(it), self.inputs[0])
+        it.close()
+        self.assertEqual(len(self.client.get_job_input(self.job_id)), 20)
+
+    def test_errors_and_failures(self):
+        job_id = self.client.create_job([{"exec": "exit 3"}])
+        self.client.add_job_inputs(job_id, self.inputs[:2] + [stor("nope")])
+        self.client.end_job_input(job_id)
+        while self.client.get_job(job_id)["state"] != "done":
+            time.sleep(0.1)
+        errs = list(self.client.iter_job_errors(job_id))
+        self.assertEqual(len(errs), 3)
+        self.assertEqual(sorted(e["code"] for e in errs),
+            ["ResourceNotFoundError", "UserTaskError", "UserTaskError"])
+        self.assertEqual(sorted(self.client.iter_job_failures(job_id)),
+            sorted(self.inputs[:2] + [stor("nope")]))
+
+class HedgeTestCase(FakeMantaTestCase):
+    def test_hedge_wins(self):
+        policy = manta.HedgePolicy(min_samples=3, min_delay=0.05,
+            max_delay=0.1)
+        client = self.new_client(hedge_policy=policy)
+        self.server.put(stor("obj"), "content")
+        for i in range(3):
+            self.assertEqual(client.get_object(stor("obj")), "content")
+        self.assertEqual(policy.stats()["hedges_issued"], 0)
+
+        # The first attempt stalls, so the hedge answers.
+        self.server.add_fault(method="GET", path=stor("obj"), delay=2.0)
+        start = time.time()
+        self.assertEqual(client.get_object(stor("obj")), "content")
+        self.assertTrue(time.time() - start < 1.0)
+        stats = policy.stats()
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["hedges_issued"], 1)
+        self.assertEqual(stats["hedges_won"], 1)
+
+    def test_no_samples(self):
+        policy = manta.HedgePolicy()
+        client = self.new_client(hedge_policy=policy)
+        self.server.put(stor("obj"), "content")
+        self.server.add_fault(method="GET", path=stor("obj"), delay=0.2)
+        self.assertEqual(client.get_object(stor("obj")), "content")
+        self.assertEqual(policy.stats()["hedges_issued"], 0)
+
+class RetryTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.policy = manta.RetryPolicy(base_delay=0.01)
+        self.client = self.new_client(retry_policy=self.policy)
+        self.server.put(stor("obj"), "content")
+
+    def test_status(self):
+        self.server.add_fault(path=stor("obj"), status=503, count=2)
+        self.assertEqual(self.client.get_object(stor("obj")), "content")
+        self.assertEqual(self.policy.stats()["retries"], 2)
+
+    def test_drop(self):
+        self.server.add_fault(path=stor("obj"), drop=True, count=2)
+        self.assertEqual(self.client.get_object(stor("obj")), "content")
+        self.assertEqual(self.policy.stats()["retries"], 1)
+
+    def test_max_attempts(self):
+        self.server.add_fault(path=stor("obj"), status=503, count=10)
+        self.assertRaises(manta.MantaAPIError, self.client.get_object,
+            stor("obj"))
+        self.assertEqual(self.policy.stats()["retries"], 3)
+
+    def test_not_idempotent(self):
+        # A retried CreateJob could create a second job.
+        self.server.add_fault(method="POST",
+            path="/%s/jobs" % self.account, status=503)
+        self.assertRaises(manta.MantaAPIError, self.client.create_job,
+            [{"exec": "wc"}])
+        self.assertEqual(self.policy.stats()["retries"], 0)
+
+    def test_budget(self):
+        policy = manta.RetryPolicy(base_delay=0.01, budget_reserve=1)
+        client = self.new_client(retry_policy=policy)
+        self.server.add_fault(path=stor("obj"), status=503, count=3)
+        self.assertRaises(manta.MantaAPIError, client.get_object,
+            stor("obj"))
+        self.assertEqual(policy.stats(),
+            {"retries": 1, "budget_exhausted": 1})
+
+class GzipListingTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        for i in range(100):
+            self.server.put(stor("d/obj%03d.txt" % i), "content")
+
+    def test_gzip(self):
+        client = self.new_client()
+        self.assertEqual(len(client.ls(stor("d"))), 100)
+        stats = client.transfer_stats()
+        self.assertEqual(stats["responses"], stats["gzip_responses"])
+        self.assertTrue(stats["gzip_responses"] >= 1)
+        self.assertTrue(stats["wire_bytes"] < stats["bytes"])
+
+    def test_no_gzip(self):
+        client = self.new_client(gzip=False)
+        self.assertEqual(len(client.ls(stor("d"))), 100)
+        stats = client.transfer_stats()
+        self.assertEqual(stats["gzip_responses"], 0)
+        self.assertEqual(stats["wire_bytes"], stats["bytes"])
+
+class CompressedPutTestCase(FakeMantaTestCase):
+    content = "a line of a compressible log file\n" * 10000
+
+    def test_content(self):
+        client = self.new_client()
+        client.put_object(stor("log.txt"), content=self.content,
+            content_type="text/plain", compress=True)
+        res = client.head_object(stor("log.txt"))
+        self.assertEqual(res["content-encoding"], "gzip")
+        self.assertEqual(res["content-type"], "text/plain")
+        self.assertTrue(int(res["content-length"]) < len(self.content) / 10)
+        self.assertEqual(client.get_object(stor("log.txt")), self.content)
+
+    def test_path(self):
+        tmp = tempfile.mkdtemp(prefix="test_mantaclient-")
+        try:
+            path = os.path.join(tmp, "log.txt")
+            f = open(path, "wb")
+            f.write(self.content)
+            f.close()
+            client = self.new_client()
+            client.put_object(stor("log.txt"), path=path, compress=True)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(client.get_object(stor("log.txt")), self.content)
+
+    def test_retry(self):
+        # A retry restarts the compressed stream from the beginning.
+        client = self.new_client(
+            retry_policy=manta.RetryPolicy(base_delay=0.01))
+        self.server.add_fault(method="PUT", path=stor("log.txt"), status=503)
+        client.put_object(stor("log.txt"), content=self.content,
+            compress=True)
+        self.assertEqual(client.get_object(stor("log.txt")), self.content)
+        self.assertEqual(client.retry_policy.stats()["retries"], 1)
+        # Each attempt's compression thread is done with the source.
+        self.assertEqual([t for t in threading.enumerate()
+            if t.name == "manta-gzip"], [])
+
+    def test_retry_file(self):
+        # The first attempt's compression thread is stopped before the
+        # file is rewound for the retry.
+        readers = []
+        class File(object):
+            def __init__(self, content):
+                self.f = BytesIO(content)
+                self.tell = self.f.tell
+            def read(self, size):
+                readers.append(threading.current_thread())
+                time.sleep(0.05)
+                return self.f.read(size)
+            def seek(self, offset):
+                alive = [t for t in set(readers) if t.is_alive()]
+                assert not alive, "seek while the file is being read"
+                self.f.seek(offset)
+        client = self.new_client(
+            retry_policy=manta.RetryPolicy(base_delay=0.01))
+        # Break the first attempt's connection partway through the body.
+        get_connection = client._get_connection
+        def broken_connection(scheme, authority):
+            conn, reused = get_connection(scheme, authority)
+            client._get_connection = get_connection
+            sends = []
+            def send(data):
+                sends.append(data)
+                if len(sends) > 2:
+                    raise socket.error(errno.ECONNRESET, "injected reset")
+                conn.__class__.send(conn, data)
+            conn.send = send
+            return conn, reused
+        client._get_connection = broken_connection
+        content = os.urandom(1024 * 1024) * 8
+        # The server logs the truncated request body.
+        server_log = logging.getLogger("manta.fakemanta")
+        level = server_log.level
+        server_log.setLevel(logging.CRITICAL)
+        try:
+            client.put_object(stor("data"), file=File(content),
+                compress=True)
+        finally:
+            server_log.setLevel(level)
+        self.assertEqual(client.get_object(stor("data")), content)
+        self.assertEqual(client.retry_policy.stats()["retries"], 1)
+
+class BlobCacheTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.tmp = tempfile.mkdtemp(prefix="test_mantaclient-")
+        self.server.put(stor("a.dat"), "a" * 10000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def new_cache(self, **kwargs):
+        return manta.BlobCache(os.path.join(self.tmp, "cache"), **kwargs)
+
+    def test_hit(self):
+        cache = self.new_cache()
+        client = self.new_client(blob_cache=cache)
+        self.assertEqual(client.get_object(stor("a.dat")), "a" * 10000)
+        self.assertEqual(client.get_object(stor("a.dat")), "a" * 10000)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+        self.assertEqual(self.server.requests[-1],
+            ("GET", stor("a.dat"), 304))
+
+    def test_changed(self):
+        cache = self.new_cache()
+        client = self.new_client(blob_cache=cache)
+        client.get_object(stor("a.dat"))
+        self.server.put(stor("a.dat"), "changed")
+        self.assertEqual(client.get_object(stor("a.dat")), "changed")
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 2})
+
+    def test_copy(self):
+        client = self.new_client(blob_cache=self.new_cache())
+        path = os.path.join(self.tmp, "a.dat")
+        for i in range(2):
+            client.get_object(stor("a.dat"), path=path)
+            self.assertEqual(os.stat(path).st_nlink, 1)
+        # Changing the local file mustn't change the cached blob.
+        f = open(path, "wb")
+        f.write("local edit")
+        f.close()
+        self.assertEqual(client.get_object(stor("a.dat")), "a" * 10000)
+
+    def test_copy_threads(self):
+        # Threads copying to the same path don't share a temp file.
+        cache = self.new_cache()
+        client = self.new_client(blob_cache=cache)
+        client.get_object(stor("a.dat"))
+        entry = cache.lookup(self.server.url + stor("a.dat"))
+        path = os.path.join(self.tmp, "a.dat")
+        errors = []
+        def copy():
+            try:
+                for i in range(20):
+                    cache.copy_to(entry, path)
+            except EnvironmentError:
+                _, ex, _ = sys.exc_info()
+                errors.append(ex)
+        threads = [threading.Thread(target=copy) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(open(path, "rb").read(), "a" * 10000)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["a.dat", "cache"])
+
+    def test_link(self):
+        if not hasattr(os, "link"):
+            raise TestSkipped("no hard links on this platform")
+        client = self.new_client(blob_cache=self.new_cache(link=True))
+        path = os.path.join(self.tmp, "a.dat")
+        client.get_object(stor("a.dat"), path=path)
+        client.get_object(stor("a.dat"), path=path)
+        self.assertEqual(os.stat(path).st_nlink, 2)
+        self.assertEqual(open(path, "rb").read(), "a" * 10000)
+
+    def test_shared_blob(self):
+        cache = self.new_cache()
+        client = self.new_client(blob_cache=cache)
+        self.server.put(stor("b.dat"), "a" * 10000)
+        client.get_object(stor("a.dat"))
+        client.get_object(stor("b.dat"))
+        blobs, size = cache._scan()
+        self.assertEqual((len(blobs), size), (1, 10000))
+
+    def test_evict(self):
+        cache = self.new_cache(max_size=25000)
+        client = self.new_client(blob_cache=cache)
+        for name in "bcd":
+            self.server.put(stor(name + ".dat"), name * 10000)
+        for name in "abcd":
+            client.get_object(stor(name + ".dat"))
+        self.assertTrue(cache._scan()[1] <= 25000)
+        # An evicted object is fetched again.
+        self.assertEqual(client.get_object(stor("a.dat")), "a" * 10000)
+        self.assertEqual(cache.stats()["misses"], 5)
+
+class StatManyTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.client = self.new_client()
+        for i in range(10):
+            self.server.put(stor("d/obj%d.txt" % i), "content %d" % i)
+        self.server.mkdir(stor("d/sub"))
+
+    def requests(self, method):
+        return len([r for r in self.server.requests if r[0] == method])
+
+    def test_listed(self):
+        # Many paths in one dir: one listing instead of a HEAD each.
+        mpaths = [stor("d/obj%d.txt" % i) for i in range(10)]
+        mpaths += [stor("d/sub"), stor("d/nope")]
+        self.server.requests.clear()
+        info = self.client.stat_many(mpaths)
+        self.assertEqual(sorted(info), sorted(mpaths))
+        self.assertEqual(info[stor("d/obj3.txt")]["type"], "object")
+        self.assertEqual(info[stor("d/obj3.txt")]["size"], 9)
+        self.assertEqual(info[stor("d/sub")]["type"], "directory")
+        self.assertEqual(info[stor("d/nope")], None)
+        self.assertEqual(self.requests("GET"), 1)
+        self.assertEqual(self.requests("HEAD"), 1)
+
+    def test_md5(self):
+        mpaths = [stor("d/obj%d.txt" % i) for i in range(3)]
+        self.server.requests.clear()
+        info = self.client.stat_many(mpaths, md5=True)
+        self.assertEqual(self.requests("GET"), 0)
+        self.assertEqual(self.requests("HEAD"), 3)
+        self.assertEqual(info[stor("d/obj0.txt")]["content-md5"],
+            self.client.head_object(stor("d/obj0.txt"))["content-md5"])
+
+    def test_missing_dir(self):
+        mpaths = [stor("nope/a"), stor("nope/b"), stor("d/obj0.txt")]
+        info = self.client.stat_many(mpaths)
+        self.assertEqual(info[stor("nope/a")], None)
+        self.assertEqual(info[stor("nope/b")], None)
+        self.assertEqual(info[stor("d/obj0.txt")]["name"], "obj0.txt")
+
+    def test_special_path(self):
+        self.assertRaises(manta.MantaError, self.client.stat_many,
+            [stor()])
+
+class ResumableGetTestCase(FakeMantaTestCase):
+    content = "".join("%05d\n" % i for i in range(20000))
+
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.client = self.new_client()
+        self.server.put(stor("obj"), self.content)
+        self.tmp = tempfile.mkdtemp(prefix="test_mantaclient-")
+        self.path = os.path.join(self.tmp, "obj")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def write_part(self, content, etag=None):
+        """Leave a part file as from an interrupted download."""
+        if etag is None:
+            etag = self.client.head_object(stor("obj"))["etag"]
+        f = open(self.path + ".part", "wb")
+        f.write(content)
+        f.close()
+        f = open(self.path + ".part.json", "w")
+        json.dump({"etag": etag, "content-md5": None, "encoded": False}, f)
+        f.close()
+
+    def check_result(self):
+        self.assertEqual(open(self.path, "rb").read(), self.content)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["obj"])
+
+    def test_fresh(self):
+        res = self.client.get_object_resumable(stor("obj"), self.path)
+        self.assertEqual(res["status"], "200")
+        self.check_result()
+
+    def test_resume(self):
+        self.write_part(self.content[:5000])
+        res = self.client.get_object_resumable(stor("obj"), self.path)
+        self.assertEqual(res["status"], "206")
+        self.check_result()
+
+    def test_changed(self):
+        # The part file is of an older version: start over.
+        self.write_part("old content", etag="old-etag")
+        res = self.client.get_object_resumable(stor("obj"), self.path)
+        self.assertEqual(res["status"], "200")
+        self.check_result()
+
+    def test_complete_part(self):
+        self.write_part(self.content)
+        self.client.get_object_resumable(stor("obj"), self.path)
+        self.check_result()
+        self.assertEqual([r[2] for r in self.server.requests][-2:],
+            [416, 200])
+
+    def test_bad_content_range(self):
+        # A 206 for another range than asked for isn't appended.
+        self.write_part(self.content[:5000])
+        read_stream_request = self.client._read_stream_request
+        def wrong_range(*args, **kwargs):
+            res, stream = read_stream_request(*args, **kwargs)
+            if res.get("content-range"):
+                res["content-range"] = "bytes 0-%d/%d" % (
+                    len(self.content) - 5001, len(self.content))
+            return res, stream
+        self.client._read_stream_request = wrong_range
+        res = self.client.get_object_resumable(stor("obj"), self.path)
+        self.assertEqual(res["status"], "200")
+        self.check_result()
+
+class PutTreeTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.client = self.new_client()
+        self.tmp = tempfile.mkdtemp(prefix="test_mantaclient-")
+        self.src = os.path.join(self.tmp, "src")
+        self.journal_dir = os.path.join(self.tmp, "journals")
+        os.makedirs(os.path.join(self.src, "sub"))
+        for name in ("a.txt", "sub/b.txt", "sub/c.txt"):
+            f = open(os.path.join(self.src, *name.split("/")), "wb")
+            f.write("this is %s\n" % name)
+            f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def new_journal(self):
+        return manta.UploadJournal("key", journal_dir=self.journal_dir)
+
+    def test_put_tree(self):
+        counts = self.client.put_tree(self.src, stor("dst"))
+        self.assertEqual(counts, {"uploaded": 3, "skipped": 0, "dirs": 2})
+        self.assertEqual(self.client.get(stor("dst/sub/c.txt")),
+            "this is sub/c.txt\n")
+
+    def test_resume(self):
+        self.server.add_fault(method="PUT", path=stor("dst/sub/c.txt"),
+            status=500)
+        self.assertRaises(manta.MantaAPIError, self.client.put_tree,
+            self.src, stor("dst"), journal=self.new_journal(), concurrency=1)
+        self.assertEqual(len(os.listdir(self.journal_dir)), 1)
+
+        # The rerun only uploads what failed (and what's changed since).
+        f = open(os.path.join(self.src, "a.txt"), "ab")
+        f.write("more\n")
+        f.close()
+        counts = self.client.put_tree(self.src, stor("dst"),
+            journal=self.new_journal())
+        self.assertEqual(counts, {"uploaded": 2, "skipped": 1, "dirs": 0})
+        self.assertEqual(self.client.get(stor("dst/a.txt")),
+            "this is a.txt\nmore\n")
+        # A complete upload removes its journal.
+        self.assertEqual(os.listdir(self.journal_dir), [])
+
+    def test_in_flight(self):
+        # Uploads still in flight when another fails are journaled.
+        self.server.add_fault(method="PUT", path=stor("dst/a.txt"),
+            status=500)
+        self.server.add_fault(method="PUT", path=stor("dst/sub/b.txt"),
+            delay=0.5)
+        self.assertRaises(manta.MantaAPIError, self.client.put_tree,
+            self.src, stor("dst"), journal=self.new_journal(), concurrency=2)
+        files = [stor("dst", name) for name in ("a.txt", "sub/b.txt",
+            "sub/c.txt")]
+        done = set(mpath for method, mpath, status in self.server.requests
+            if method == "PUT" and status == 204 and mpath in files)
+        self.assertTrue(stor("dst/sub/b.txt") in done, done)
+        counts = self.client.put_tree(self.src, stor("dst"),
+            journal=self.new_journal())
+        self.assertEqual(counts, {"uploaded": 3 - len(done),
+            "skipped": len(done), "dirs": 0})
+
+    def test_torn_journal(self):
+        journal = self.new_journal()
+        journal.record_mkdir(stor("dst"))
+        journal.close()
+        f = open(journal.path, "a")
+        f.write('{"op": "put", "mpa')
+        f.close()
+        journal = self.new_journal()
+        self.assertTrue(journal.has_dir(stor("dst")))
+        journal.remove()
+        self.assertFalse(os.path.exists(journal.path))
+
+class RequestHookTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.records = []
+        self.client = self.new_client()
+        self.client.add_request_hook(self.records.append)
+        self.server.put(stor("obj"), "content")
+
+    def test_get(self):
+        self.client.get_object(stor("obj"))
+        self.assertEqual(len(self.records), 1)
+        r = self.records[0]
+        self.assertEqual((r["method"], r["op"], r["path"], r["path_class"]),
+            ("GET", "GetObject", stor("obj"), "stor"))
+        self.assertEqual((r["status"], r["error"], r["error_code"]),
+            (200, None, None))
+        self.assertEqual((r["bytes_out"], r["bytes_in"]), (0, 7))
+        self.assertFalse(r["from_cache"])
+        self.assertTrue(0 <= r["sign"] <= r["ttfb"] <= r["total"])
+
+    def test_put(self):
+        self.client.put_object(stor("obj2"), content="more content")
+        r = self.records[-1]
+        self.assertEqual((r["op"], r["status"], r["bytes_out"]),
+            ("PutObject", 204, 12))
+
+    def test_streamed(self):
+        # A listing's record is emitted when its stream is closed.
+        self.client.ls(stor())
+        r = self.records[-1]
+        self.assertEqual((r["op"], r["status"]), ("ListDirectory", 200))
+        self.assertTrue(r["bytes_in"] > 0)
+
+    def test_error_status(self):
+        self.assertRaises(manta.MantaAPIError, self.client.get_object,
+            stor("nope"))
+        r = self.records[-1]
+        self.assertEqual((r["status"], r["error_code"]),
+            (404, "ResourceNotFound"))
+
+    def test_connection_error(self):
+        self.server.add_fault(path=stor("obj"), drop=True, count=2)
+        self.assertRaises(RETRYABLE_ERRORS, self.client.get_object,
+            stor("obj"))
+        r = self.records[-1]
+        self.assertEqual(r["status"], None)
+        self.assertTrue(isinstance(r["error"], RETRYABLE_ERRORS))
+
+    def test_retried(self):
+        # Each attempt gets a record.
+        client = self.new_client(
+            retry_policy=manta.RetryPolicy(base_delay=0.01))
+        records = []
+        client.add_request_hook(records.append)
+        self.server.add_fault(path=stor("obj"), status=503)
+        client.get_object(stor("obj"))
+        self.assertEqual([r["status"] for r in records], [503, 200])
+
+    def test_bad_hook(self):
+        def bad_hook(record):
+            raise ValueError("bad hook")
+        self.client.add_request_hook(bad_hook)
+        log = logging.getLogger("manta.client")
+        level = log.level
+        log.setLevel(logging.ERROR)   # quiet the expected warning
+        try:
+            self.assertEqual(self.client.get_object(stor("obj")), "content")
+        finally:
+            log.setLevel(level)
+        self.assertEqual(len(self.records), 1)
+        self.client.remove_request_hook(bad_hook)
+        self.client.remove_request_hook(self.records.append)
+        self.client.get_object(stor("obj"))
+        self.assertEqual(len(self.records), 1)
+
+class MetricsTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.metrics = manta.ClientMetrics(buckets=[0.5, 60])
+        self.client = self.new_client(http_cache="memory",
+            metrics=self.metrics)
+        self.server.put(stor("obj"), "content")
+
+    def test_snapshot(self):
+        self.client.get_object(stor("obj"))
+        self.client.get_object(stor("obj"))
+        self.assertRaises(manta.MantaAPIError, self.client.get_object,
+            stor("nope"))
+        self.server.add_fault(method="PUT", delay=0.6)
+        self.client.put_object(stor("obj2"), content="more content")
+
+        snap = self.metrics.snapshot()
+        get = snap["ops"]["GetObject"]
+        self.assertEqual(get["count"], 3)
+        # A 304 revalidation is a (cached) 200.
+        self.assertEqual(get["statuses"], {"200": 2, "404": 1})
+        self.assertEqual(get["buckets"], [[0.5, 3], [60, 3], ["+Inf", 3]])
+        put = snap["ops"]["PutObject"]
+        self.assertEqual((put["count"], put["bytes_out"]), (1, 12))
+        self.assertEqual(put["buckets"], [[0.5, 0], [60, 1], ["+Inf", 1]])
+        self.assertEqual(snap["errors"], {"ResourceNotFound": 1})
+        self.assertEqual(snap["caches"]["http"]["hits"], 1)
+
+    def test_prometheus(self):
+        self.client.get_object(stor("obj"))
+        text = self.metrics.to_prometheus()
+        for line in [
+                '# TYPE manta_request_duration_seconds histogram',
+                'manta_request_duration_seconds_bucket'
+                    '{op="GetObject",le="+Inf"} 1',
+                'manta_request_duration_seconds_count{op="GetObject"} 1',
+                'manta_requests_total{op="GetObject",status="200"} 1',
+                'manta_request_bytes_total{op="GetObject",direction="in"} 7',
+                'manta_cache_misses_total{cache="http"} 1']:
+            self.assertTrue(line in text.splitlines(), line)
+
+    def test_write(self):
+        tmp = tempfile.mkdtemp(prefix="test_mantaclient-")
+        try:
+            self.client.get_object(stor("obj"))
+            path = os.path.join(tmp, "metrics.json")
+            self.metrics.write_json(path)
+            snap = json.load(open(path))
+            self.assertEqual(snap["ops"]["GetObject"]["count"], 1)
+            path = os.path.join(tmp, "metrics.prom")
+            self.metrics.write_prometheus(path)
+            self.assertEqual(open(path).read(), self.metrics.to_prometheus())
+            self.assertEqual(sorted(os.listdir(tmp)),
+                ["metrics.json", "metrics.prom"])
+        finally:
+            shutil.rmtree(tmp)
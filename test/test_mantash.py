@@ -6,13 +6,18 @@
 import os
 import sys
 import re
+import json
 from posixpath import join as ujoin
 from pprint import pprint
+import time
+import shutil
+import tempfile
 import unittest
+import urllib2
 
 from testlib import TestError, TestSkipped, tag
 
-from common import MantaTestCase, stor
+from common import MantaTestCase, FakeMantaTestCase, stor
 import manta
 
 
@@ -23,6 +28,20 @@ TDIR = "tmp/test_mantash"
 
 
 
+#---- internal support stuff
+
+def _write(path, content):
+    d = os.path.dirname(path)
+    if not os.path.exists(d):
+        os.makedirs(d)
+    f = open(path, "wb")
+    try:
+        f.write(content)
+    finally:
+        f.close()
+
+
+
 #---- test cases
 
 class OptionsTestCase(MantaTestCase):
@@ -111,3 +130,385 @@ class LsTestCase(MantaTestCase):
         code, stdout, stderr = self.mantash(['-C', self.base, 'ls', 'a1/*'])
         self.assertEqual(stdout, 'a1/a2.txt\n\na1/b2:\na3.txt\n')
         self.assertEqual(code, 0)
+
+class JobinfoTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        client = self.new_client()
+        inputs = [stor("in%d.txt" % i) for i in range(5)]
+        for key in inputs:
+            self.server.put(key, "input\n")
+        self.job_id = client.create_job([{"exec": "cat"}])
+        client.add_job_inputs(self.job_id, inputs)
+        client.end_job_input(self.job_id)
+        while client.get_job(self.job_id)["state"] != "done":
+            time.sleep(0.1)
+
+    def test_lists(self):
+        code, stdout, stderr = self.mantash(['jobinfo', self.job_id])
+        self.assertEqual(code, 0)
+        info = json.loads(stdout)
+        self.assertEqual(info["job"]["id"], self.job_id)
+        self.assertEqual(len(info["in"]), 5)
+        self.assertEqual(len(info["out"]), 5)
+        self.assertEqual(info["err"], [])
+        self.assertEqual(info["fail"], [])
+
+    def test_summary_limit(self):
+        code, stdout, stderr = self.mantash(
+            ['jobinfo', '-s', '-n', '3', self.job_id])
+        self.assertEqual(code, 0)
+        info = json.loads(stdout)
+        self.assertEqual((info["in"], info["out"], info["err"], info["fail"]),
+            (3, 3, 0, 0))
+
+class CompressTestCase(FakeMantaTestCase):
+    def test_put_zcat(self):
+        content = "a line of a compressible log file\n" * 1000
+        tmp = tempfile.mkdtemp(prefix="test_mantash-")
+        try:
+            path = os.path.join(tmp, "log.txt")
+            f = open(path, "wb")
+            f.write(content)
+            f.close()
+            code, stdout, stderr = self.mantash(['put', '-z', path,
+                stor("log.txt")])
+            self.assertEqual(code, 0)
+        finally:
+            shutil.rmtree(tmp)
+        code, stdout, stderr = self.mantash(['zcat', stor("log.txt")])
+        self.assertEqual(code, 0)
+        self.assertEqual(stdout, content)
+
+class HttpCacheTestCase(FakeMantaTestCase):
+    def test_specs(self):
+        self.server.put(stor("obj.txt"), "content")
+        for spec in ("none", "memory", "disk"):
+            code, stdout, stderr = self.mantash(
+                ['--http-cache', spec, 'ls', stor()])
+            self.assertEqual(code, 0)
+            self.assertEqual(stdout, "obj.txt\n")
+        code, stdout, stderr = self.mantash(
+            ['--http-cache', 'bogus', 'ls', stor()])
+        self.assertNotEqual(code, 0)
+        self.assertTrue("invalid choice" in stderr)
+
+class SyncTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.client = self.new_client()
+        self.tmp = tempfile.mkdtemp(prefix="test_mantash-")
+        self.ldir = os.path.join(self.tmp, "src")
+        _write(os.path.join(self.ldir, "a.txt"), "this is a\n")
+        _write(os.path.join(self.ldir, "sub", "b.txt"), "this is b\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def sync(self, *args):
+        code, stdout, stderr = self.mantash(['sync'] + list(args))
+        self.assertEqual(code, 0, stderr)
+        return stderr
+
+    def test_put(self):
+        stderr = self.sync(self.ldir, stor("dst"))
+        self.assertTrue("sync: 2 transferred" in stderr)
+        self.assertEqual(self.client.get(stor("dst/sub/b.txt")),
+            "this is b\n")
+        self.assertTrue("sync: 0 transferred (0B), 2 unchanged"
+            in self.sync(self.ldir, stor("dst")))
+
+    def test_touched(self):
+        self.sync(self.ldir, stor("dst"))
+        # A newer file with the same content isn't sent again...
+        later = time.time() + 10
+        a_path = os.path.join(self.ldir, "a.txt")
+        os.utime(a_path, (later, later))
+        self.assertTrue("0 transferred" in self.sync(self.ldir, stor("dst")))
+        # ... but one with new content (of the same size) is.
+        _write(a_path, "this is A\n")
+        os.utime(a_path, (later + 10, later + 10))
+        self.assertTrue("1 transferred" in self.sync(self.ldir, stor("dst")))
+        self.assertEqual(self.client.get(stor("dst/a.txt")), "this is A\n")
+
+    def test_delete(self):
+        self.sync(self.ldir, stor("dst"))
+        self.server.put(stor("dst/extra/c.txt"), "this is c\n")
+        stderr = self.sync('--delete', '--dry-run', self.ldir, stor("dst"))
+        self.assertTrue("2 deleted" in stderr)
+        self.assertEqual(self.client.type(stor("dst/extra")), "directory")
+        self.assertTrue("2 deleted" in
+            self.sync('--delete', self.ldir, stor("dst")))
+        self.assertEqual(self.client.type(stor("dst/extra")), None)
+
+    def test_get(self):
+        self.server.put(stor("src/c.txt"), "this is c\n")
+        self.server.put(stor("src/sub/d.txt"), "this is d\n")
+        dst = os.path.join(self.tmp, "dst")
+        self.assertTrue("2 transferred" in self.sync('-g', stor("src"), dst))
+        self.assertEqual(open(os.path.join(dst, "sub", "d.txt")).read(),
+            "this is d\n")
+        self.assertTrue("0 transferred" in self.sync('-g', stor("src"), dst))
+
+class DiffTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.tmp = tempfile.mkdtemp(prefix="test_mantash-")
+        for name in ("a.txt", "sub/b.txt"):
+            content = "this is %s\n" % name
+            _write(os.path.join(self.tmp, *name.split("/")), content)
+            self.server.put(stor("d", name), content, "text/plain")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def test_same(self):
+        code, stdout, stderr = self.mantash(['diff', self.tmp, stor("d")])
+        self.assertEqual((code, stdout), (0, ""))
+        code, stdout, stderr = self.mantash(['diff',
+            os.path.join(self.tmp, "a.txt"), stor("d/a.txt")])
+        self.assertEqual((code, stdout), (0, ""))
+
+    def test_differ(self):
+        self.server.put(stor("d/sub/b.txt"), "this is B\n", "text/plain")
+        self.server.put(stor("d/c.txt"), "this is c\n", "text/plain")
+        code, stdout, stderr = self.mantash(['diff', self.tmp, stor("d")])
+        self.assertEqual(code, 1)
+        self.assertTrue("Only in %s: c.txt" % stor("d") in stdout)
+        self.assertTrue("-this is sub/b.txt\n+this is B\n" in stdout)
+
+        code, stdout, stderr = self.mantash(['diff', '-q', self.tmp,
+            stor("d")])
+        self.assertEqual(code, 1)
+        self.assertTrue("Files %s and %s differ" % (
+            os.path.join(self.tmp, "sub", "b.txt"), stor("d/sub/b.txt"))
+            in stdout)
+
+class PutRecursiveTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.tmp = tempfile.mkdtemp(prefix="test_mantash-")
+        self.src = os.path.join(self.tmp, "src")
+        for name in ("a.txt", "sub/b.txt", "sub/c.txt"):
+            _write(os.path.join(self.src, *name.split("/")),
+                "this is %s\n" % name)
+        # Keep the journal out of the user's cache dir.
+        self.env = {"XDG_CACHE_HOME": os.path.join(self.tmp, "cache")}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def puts(self):
+        return sorted(r[1] for r in self.server.requests if r[0] == "PUT"
+            and r[2] == 204)
+
+    def test_resume(self):
+        self.server.add_fault(method="PUT", path=stor("dst/sub/b.txt"),
+            status=500)
+        code, stdout, stderr = self.mantash(['--retries', '0', 'put', '-r',
+            self.src, stor("dst")], env=self.env)
+        self.assertNotEqual(code, 0)
+        self.assertFalse(stor("dst/sub/b.txt") in self.puts())
+
+        self.server.requests.clear()
+        code, stdout, stderr = self.mantash(['put', '-r', self.src,
+            stor("dst")], env=self.env)
+        self.assertEqual(code, 0, stderr)
+        self.assertTrue(stor("dst/sub/b.txt") in self.puts())
+        self.assertFalse(stor("dst/a.txt") in self.puts())
+
+class TimingTestCase(FakeMantaTestCase):
+    def test_timing(self):
+        self.server.put(stor("obj.txt"), "content")
+        code, stdout, stderr = self.mantash(['--timing', 'cat',
+            stor("obj.txt")])
+        self.assertEqual(code, 0)
+        self.assertEqual(stdout, "content\n")
+        self.assertTrue(re.search(r"GET %s: 200, 0 bytes out, 7 in; "
+            r"sign [\d.]+ms, connect [\d.]+ms" % re.escape(stor("obj.txt")),
+            stderr), stderr)
+
+class MetricsTestCase(FakeMantaTestCase):
+    def test_metrics(self):
+        self.server.put(stor("obj.txt"), "content")
+        tmp = tempfile.mkdtemp(prefix="test_mantash-")
+        try:
+            path = os.path.join(tmp, "metrics.json")
+            code, stdout, stderr = self.mantash(['--metrics', path, 'cat',
+                stor("obj.txt")])
+            self.assertEqual(code, 0)
+            snap = json.load(open(path))
+            self.assertEqual(snap["ops"]["GetObject"]["statuses"],
+                {"200": 1})
+            path = os.path.join(tmp, "metrics.prom")
+            code, stdout, stderr = self.mantash(['--metrics', path, 'cat',
+                stor("obj.txt")])
+            self.assertEqual(code, 0)
+            self.assertTrue('manta_requests_total{op="GetObject",'
+                'status="200"} 1' in open(path).read())
+        finally:
+            shutil.rmtree(tmp)
+
+class DaemonTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.server.put(stor("obj.txt"), "content")
+        self.tmp = tempfile.mkdtemp(prefix="test_mantash-")
+        self.env = {
+            "MANTASH_DAEMON_SOCKET": os.path.join(self.tmp, "mantash.sock"),
+            "XDG_CACHE_HOME": os.path.join(self.tmp, "cache"),
+        }
+        code, stdout, stderr = self.mantash(['daemon', 'start'], env=self.env)
+        self.assertEqual(code, 0, stderr)
+
+    def tearDown(self):
+        self.mantash(['daemon', 'stop'], env=self.env)
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def commands(self):
+        """The number of commands the daemon has run."""
+        code, stdout, stderr = self.mantash(['daemon', 'status'],
+            env=self.env)
+        self.assertEqual(code, 0, stderr)
+        return int(re.search(r"commands: (\d+)", stdout).group(1))
+
+    def test_forwarded(self):
+        self.assertEqual(self.commands(), 0)
+        code, stdout, stderr = self.mantash(['ls', stor()], env=self.env)
+        self.assertEqual((code, stdout), (0, "obj.txt\n"))
+        code, stdout, stderr = self.mantash(['cat', stor("nope")],
+            env=self.env)
+        self.assertNotEqual(code, 0)
+        self.assertTrue("nope" in stderr)
+        self.assertEqual(self.commands(), 2)
+
+    def test_local(self):
+        # These are run in-process.
+        env = dict(self.env, MANTASH_NO_DAEMON="1")
+        self.assertEqual(self.mantash(['ls', stor()], env=env)[0], 0)
+        self.assertEqual(self.mantash(['--timing', 'ls', stor()],
+            env=self.env)[0], 0)
+        self.assertEqual(self.mantash(['help', 'ls'], env=self.env)[0], 0)
+        self.assertEqual(self.commands(), 0)
+
+    def test_stop(self):
+        code, stdout, stderr = self.mantash(['daemon', 'stop'], env=self.env)
+        self.assertEqual(code, 0)
+        self.assertTrue("mantash daemon stopped" in stderr)
+        code, stdout, stderr = self.mantash(['daemon', 'status'],
+            env=self.env)
+        self.assertEqual(code, 1)
+        self.assertTrue("not running" in stdout)
+        # Commands are then run in-process.
+        code, stdout, stderr = self.mantash(['ls', stor()], env=self.env)
+        self.assertEqual((code, stdout), (0, "obj.txt\n"))
+
+class SignTestCase(FakeMantaTestCase):
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        for name in ("a.txt", "b.log", "sub/c.txt"):
+            self.server.put(stor("d", name), "this is %s\n" % name,
+                "text/plain")
+
+    def urls(self, args):
+        code, stdout, stderr = self.mantash(['sign'] + args)
+        self.assertEqual(code, 0, stderr)
+        return stdout.splitlines()
+
+    def test_sign(self):
+        urls = self.urls([stor("d/a.txt")])
+        self.assertEqual(len(urls), 1)
+        self.assertTrue(urls[0].startswith(
+            self.server.url + stor("d/a.txt") + "?"), urls[0])
+        self.assertEqual(urllib2.urlopen(urls[0]).read(), "this is a.txt\n")
+        expires = int(re.search(r"expires=(\d+)", urls[0]).group(1))
+        self.assertTrue(3500 < expires - time.time() <= 3600)
+
+        urls = self.urls(['-e', '60', '-m', 'HEAD', stor("d/*.txt")])
+        self.assertEqual(len(urls), 1)
+        expires = int(re.search(r"expires=(\d+)", urls[0]).group(1))
+        self.assertTrue(0 < expires - time.time() <= 60)
+
+    def test_recursive(self):
+        code, stdout, stderr = self.mantash(['sign', stor("d")])
+        self.assertEqual(code, 1)
+        self.assertTrue("is a directory" in stderr, stderr)
+        urls = self.urls(['-r', stor("d")])
+        self.assertEqual([url.split("?")[0] for url in urls],
+            [self.server.url + stor("d", name)
+             for name in ("a.txt", "b.log", "sub/c.txt")])
+        urls = self.urls(['-r', '-n', '*.txt', stor("d")])
+        self.assertEqual([url.split("?")[0] for url in urls],
+            [self.server.url + stor("d", name)
+             for name in ("a.txt", "sub/c.txt")])
+
+    def test_bad_args(self):
+        code, stdout, stderr = self.mantash(['sign'])
+        self.assertEqual((code, stdout), (1, ""))
+        code, stdout, stderr = self.mantash(['sign', '-n', '*.txt',
+            stor("d")])
+        self.assertEqual((code, stdout), (1, ""))
+        self.assertTrue("only valid with '-r'" in stderr, stderr)
+
+class GetTestCase(FakeMantaTestCase):
+    content = "a line of a compressible log file\n" * 1000
+
+    def setUp(self):
+        FakeMantaTestCase.setUp(self)
+        self.tmp = tempfile.mkdtemp(prefix="test_mantash-")
+        self.env = {"XDG_CACHE_HOME": os.path.join(self.tmp, "cache")}
+        self.src = os.path.join(self.tmp, "src")
+        self.dst = os.path.join(self.tmp, "dst")
+        _write(os.path.join(self.src, "log.txt"), self.content)
+        os.mkdir(self.dst)
+        self.server.put(stor("d/plain.txt"), self.content, "text/plain")
+        self.put_compressed()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        FakeMantaTestCase.tearDown(self)
+
+    def put_compressed(self):
+        code, stdout, stderr = self.mantash(['put', '-z',
+            os.path.join(self.src, "log.txt"), stor("d/log.txt")])
+        self.assertEqual(code, 0, stderr)
+
+    def get(self, args):
+        """Run 'mantash get -v ...'. Returns the objects fetched."""
+        self.server.requests.clear()
+        code, stdout, stderr = self.mantash(['get', '-v'] + args, self.env)
+        self.assertEqual(code, 0, stderr)
+        objects = (stor("d/log.txt"), stor("d/plain.txt"))
+        return sorted(mpath for method, mpath, status in self.server.requests
+            if method == "GET" and mpath in objects)
+
+    def test_unchanged(self):
+        self.assertEqual(self.get(['-r', stor("d"), self.dst]),
+            [stor("d/log.txt"), stor("d/plain.txt")])
+        self.assertEqual(open(os.path.join(self.dst, "d", "log.txt")).read(),
+            self.content)
+        # Neither is fetched again: the gzip-encoded one is compared with
+        # the decoded content.
+        self.assertEqual(self.get(['-r', stor("d"), self.dst]), [])
+
+    def test_unchanged_objects(self):
+        args = [stor("d/log.txt"), stor("d/plain.txt"), self.dst]
+        self.assertEqual(self.get(args),
+            [stor("d/log.txt"), stor("d/plain.txt")])
+        self.assertEqual(self.get(args), [])
+
+    def test_changed(self):
+        self.get(['-r', stor("d"), self.dst])
+        # Re-uploaded (same content, new etag) and edited locally.
+        self.put_compressed()
+        self.assertEqual(self.get(['-r', stor("d"), self.dst]),
+            [stor("d/log.txt")])
+        _write(os.path.join(self.dst, "d", "log.txt"), "edited\n")
+        self.assertEqual(self.get([stor("d/log.txt"),
+            os.path.join(self.dst, "d")]), [stor("d/log.txt")])
+        self.assertEqual(open(os.path.join(self.dst, "d", "log.txt")).read(),
+            self.content)